@@ -5,13 +5,23 @@
 #originally the get_artworks method was a multi-step method. I keep having issues with 
 #testing, I'm now breaking it up. 
 #changed the filtering from client side to API side
-import requests
+#the century filter now travels in the search body as an Elasticsearch range query
+import asyncio
 import random
-from flask import flash
-from models import Favorite, NotFavorite, Century
-from artwork import SaveArtwork
+import copy
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from centuries import CenturyCache
+from artwork import SaveArtwork, flash_or_log
+from http_client import AICClient
+from async_client import AsyncAICClient
+from page_cache import PageCache
+from single_flight import SingleFlight
+from rate_limit import RateLimiter, CircuitBreaker
+from exclusions import ExcludedArtworks
+from instrumentation import Instrumentation
 
-save_artwork = SaveArtwork.save_artwork
+save_artworks = SaveArtwork.save_artworks
 
 
 class APIRequests:
@@ -25,6 +35,18 @@ class APIRequests:
         '19th Century': ('1800', '1899'),
         '20th Century': ('1900', '1999'),
     }
+    FIELDS = ['id', 'title', 'artist_title', 'image_id', 'dimensions', 'medium_display',
+              'date_display', 'date_start', 'date_end', 'artist_display']
+    PAGE_LIMIT = 100
+    #how many pages may be in flight at once while collecting artworks; 1 fetches sequentially
+    PAGE_WORKERS = 4
+    #the search endpoint stops paging after 10,000 results
+    MAX_PAGES = 100
+
+    @classmethod
+    def init_app(cls, app):
+        """Use the search endpoint in AIC_API_URL, if set (e.g. the fake AIC server in bench/)"""
+        cls.API_URL = app.config.get("AIC_API_URL") or cls.API_URL
 
     @classmethod
     def filter_dates(cls, artwork, user_century):
@@ -44,108 +66,249 @@ class APIRequests:
     
    
     @classmethod
-    def fetch_artworks_from_api(cls, query_params):
-        """Fetch artwork data from the API"""
-        try:
-            response = requests.get(cls.API_URL, headers=cls.HEADER, params=query_params)
-            if response.status_code == 200:
-                return response.json()['data'], None
+    def build_century_query(cls, century_name, excluded_ids=(), page=1):
+        """Build the search body that only matches artworks from `century_name`.
+        Mirrors `filter_dates`: an artwork matches if it starts or ends inside the century.
+        Returns None if the century has no known date range"""
+        date_range = cls.century_dates.get(century_name)
+        if not date_range:
+            return None
+        date_range_start, date_range_end = map(int, date_range)
+
+        bool_query = {
+            'should': [
+                {'range': {'date_start': {'gte': date_range_start, 'lte': date_range_end}}},
+                {'range': {'date_end': {'gte': date_range_start, 'lte': date_range_end}}},
+            ],
+            'minimum_should_match': 1,
+        }
+        if excluded_ids:
+            #the user's already-rated artworks are left out by the API
+            bool_query['must_not'] = [{'terms': {'id': list(excluded_ids)}}]
+
+        return {
+            'query': {'bool': bool_query},
+            'fields': cls.FIELDS,
+            'limit': cls.PAGE_LIMIT,
+            'page': page,
+        }
+
+    @classmethod
+    def count_results(cls, century_name):
+        """How many artworks the search API has for `century_name` (one call that returns no artworks),
+        or None if it couldn't be asked"""
+        query = cls.build_century_query(century_name)
+        if query is None:
+            return None
+        query.update(limit=0, fields=['id'])
+        with CircuitBreaker.attempt() as allowed:
+            if not allowed or not RateLimiter.acquire():
+                return None
+            try:
+                response = AICClient.post(cls.API_URL, headers=cls.HEADER, json=query)
+            except AICClient.errors():
+                CircuitBreaker.record_failure()
+                return None
+            if response.status_code in AICClient.RETRY_STATUSES:
+                CircuitBreaker.record_failure()
             else:
-            # Properly handle non-200 responses
-                flash(f"Failed to fetch artworks from API: {response.status_code}", "danger")
-                return None, f"Failed with status code {response.status_code}"
-        except requests.RequestException as e:
-            # Handle connection errors
-            flash(f"Error connecting to the Art Institute of Chicago API: {e}", "danger") 
-            return None, str(e)
+                CircuitBreaker.record_success()
+            if response.status_code != 200:
+                return None
+            return response.json().get('pagination', {}).get('total')
+
+    @classmethod
+    def split_exclusions(cls, query):
+        """Split a search body into the part every user shares and the set of ids this user excludes"""
+        shared_query = copy.deepcopy(query)
+        excluded_ids = set()
+        for clause in shared_query['query']['bool'].pop('must_not', []):
+            excluded_ids.update(clause.get('terms', {}).get('id', []))
+        return shared_query, excluded_ids
+
+    @classmethod
+    def request_page(cls, query):
+        """Request one search page without touching the Flask context, so it can run on a worker thread.
+        Pages are served from the PageCache when possible, so `query` shouldn't carry per-user exclusions,
+        and concurrent requests for the same page share one API call.
+        Returns (data, error, message); `message` is what the user should be flashed on failure"""
+        data = PageCache.get(query)
+        if data is not None:
+            return data, None, None
+        return SingleFlight.do(PageCache.key(query), lambda: cls._fetch_page(query))
+
+    @classmethod
+    def _fetch_page(cls, query):
+        #whoever held the page's flight before us (maybe in another worker) may have cached it
+        data = PageCache.get(query)
+        if data is not None:
+            return data, None, None
+        with CircuitBreaker.attempt() as allowed:
+            if not allowed:
+                return cls.unavailable_page(query)
+            if not RateLimiter.acquire():
+                return None, "Rate limited", "Too many requests to the Art Institute of Chicago API, please try again shortly."
+            try:
+                response = AICClient.post(cls.API_URL, headers=cls.HEADER, json=query)
+                return cls.page_result(query, response)
+            except AICClient.errors() as e:
+                # Handle connection errors
+                CircuitBreaker.record_failure()
+                return None, str(e), f"Error connecting to the Art Institute of Chicago API: {e}"
+
+    @classmethod
+    async def request_page_async(cls, query):
+        """`request_page` for the AsyncAICClient event loop.
+        The page cache's SQLite file is read and written on the loop's default executor, never on the loop itself"""
+        data = await cls._off_loop(PageCache.get, query)
+        if data is not None:
+            return data, None, None
+        return await SingleFlight.do_async(PageCache.key(query), lambda: cls._fetch_page_async(query))
+
+    @classmethod
+    async def _fetch_page_async(cls, query):
+        #another worker may have cached the page while we waited for the flight
+        data = await cls._off_loop(PageCache.get, query)
+        if data is not None:
+            return data, None, None
+        with CircuitBreaker.attempt() as allowed:
+            if not allowed:
+                return await cls._off_loop(cls.unavailable_page, query)
+            if not await RateLimiter.acquire_async():
+                return None, "Rate limited", "Too many requests to the Art Institute of Chicago API, please try again shortly."
+            try:
+                response = await AsyncAICClient.post(cls.API_URL, headers=cls.HEADER, json=query)
+                return await cls._off_loop(cls.page_result, query, response)
+            except AsyncAICClient.errors() as e:
+                CircuitBreaker.record_failure()
+                return None, str(e), f"Error connecting to the Art Institute of Chicago API: {e}"
+
+    @classmethod
+    async def _off_loop(cls, fn, *args):
+        """Run blocking `fn(*args)` (SQLite reads and writes) on the event loop's default executor"""
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    @classmethod
+    def unavailable_page(cls, query):
+        """What to return while the circuit breaker keeps us off the API: the last copy of the page, if any"""
+        data = PageCache.get(query, stale_ok=True)
+        if data is not None:
+            return data, None, None
+        return (None, "AIC API unavailable",
+                "The Art Institute of Chicago API is unavailable right now, please try again shortly.")
+
+    @classmethod
+    def page_result(cls, query, response):
+        """Turn a search response into (data, error, message), caching successful pages.
+        Throttling and server errors count against the circuit breaker"""
+        if response.status_code in AICClient.RETRY_STATUSES:
+            CircuitBreaker.record_failure()
+        else:
+            CircuitBreaker.record_success()
+        if response.status_code == 200:
+            data = response.json()['data']
+            PageCache.set(query, data)
+            return data, None, None
+        else:
+        # Properly handle non-200 responses
+            return (None, f"Failed with status code {response.status_code}",
+                    f"Failed to fetch artworks from API: {response.status_code}")
+
+    @classmethod
+    def fetch_artworks_from_api(cls, query):
+        """Fetch artwork data from the API
+        Exclusions in `query` are applied locally so the page itself can come from the shared cache"""
+        shared_query, excluded_ids = cls.split_exclusions(query)
+        data, error, message = cls.request_page(shared_query)
+        if message:
+            flash_or_log(message, "danger")
+        if data:
+            data = [artwork for artwork in data if artwork['id'] not in excluded_ids]
+        return data, error
         
     @classmethod
-    def fetch_favorite_and_not_favorite_ids(cls, user_id):
-        """Utility method to fetch favorite and not favorite IDs"""
-        favorite_artwork_ids = [fav.artwork_id for fav in Favorite.query.filter_by(user_id=user_id).all()]
-        not_favorite_artwork_ids = [not_fav.artwork_id for not_fav in NotFavorite.query.filter_by(user_id=user_id).all()]
-        return favorite_artwork_ids, not_favorite_artwork_ids
+    def collect_artworks(cls, century_name, total, excluded_ids=(), century_id=None, start_page=1):
+        """Page through the API from `start_page`, saving artworks from `century_name` until `total` are collected.
+        Returns (saved_artworks, error); error is None when the API simply ran out of pages"""
+        saved_artworks = []
+
+        #the API does the century filtering; the user's exclusions are applied here so
+        #the pages themselves are the same for everyone and can be cached
+        if cls.build_century_query(century_name) is None:
+            return saved_artworks, f"No date range for {century_name}"
+
+        #pages are requested ahead (on the async client's event loop if it's enabled, otherwise on
+        #a thread pool) but consumed strictly in page order; saving stays on this thread since the
+        #db session belongs to it
+        if AsyncAICClient.ENABLED:
+            pool = None
+            submit = lambda query: AsyncAICClient.submit(cls.request_page_async(query))
+        else:
+            pool = ThreadPoolExecutor(max_workers=cls.PAGE_WORKERS)
+            submit = lambda query: pool.submit(Instrumentation.bind(cls.request_page), query)
+        in_flight = deque()
+        next_page = start_page
+
+        def fill_window():
+            nonlocal next_page
+            #only speculate as far as the pages still needed to reach `total`
+            while (len(in_flight) < cls.PAGE_WORKERS and next_page <= cls.MAX_PAGES
+                   and len(in_flight) * cls.PAGE_LIMIT < total - len(saved_artworks)):
+                query = cls.build_century_query(century_name, page=next_page)
+                in_flight.append(submit(query))
+                next_page += 1
+
+        try:
+            #fetch data until enough artworks are collected
+            fill_window()
+            while len(saved_artworks) < total and in_flight:
+                artworks_details, error, message = in_flight.popleft().result()
+                if message:
+                    flash_or_log(message, "danger")
+                if error or not artworks_details:
+                    return saved_artworks, error
+                usable = [artwork for artwork in artworks_details if artwork['id'] not in excluded_ids]
+                #each page is saved in a single transaction
+                needed = total - len(saved_artworks)
+                saved_artworks.extend(save_artworks(usable[:needed], century_id=century_id))
+                fill_window()
+            return saved_artworks, None
+        finally:
+            #pages nobody needs any more are dropped rather than waited on
+            for future in in_flight:
+                future.cancel()
+            if pool:
+                pool.shutdown(wait=False)
     
     @classmethod
     def get_artworks(cls, user):
         """Method to get artwork from the API"""
-        user_century = Century.query.get(user.century_id).century_name
-        
+        user_century = CenturyCache.name(user.century_id)
         total_art_for_app = 50
-        saved_artworks = []
-        page = 1
-
-        favorite_artwork_ids, not_favorite_artwork_ids = cls.fetch_favorite_and_not_favorite_ids(user.id)
 
-        #define API parameters with filtering
-        query_params = {
-            'limit': 100,
-            'page' : page,
-            'fields': 'id,title,artist_title,image_id,dimensions,medium_display,date_display,date_start,date_end, artist_display',
-            'excluded_ids': ','.join(map(str, favorite_artwork_ids + not_favorite_artwork_ids))
-        }
-
-        #fetch data until enough artworks are collected
-        while len(saved_artworks) < total_art_for_app:
-            artworks_details, error = cls.fetch_artworks_from_api(query_params)
-            # print("Artworks Data:", artworks)
-            if error or not artworks_details:
-                return saved_artworks, error
-            for artwork in artworks_details:
-                newart = cls.filter_dates(artwork, user_century)
-                if newart:
-                    saved_artwork = save_artwork(artwork_detail=newart)
-                    if saved_artwork:
-                        saved_artworks.append(saved_artwork) 
-                    if len(saved_artworks) >= total_art_for_app:
-                        break
-
-            page += 1
-            query_params['page'] = page
+        saved_artworks, error = cls.collect_artworks(user_century, total_art_for_app,
+                                                     excluded_ids=ExcludedArtworks.load(user.id))
+        if len(saved_artworks) < total_art_for_app:
+            return saved_artworks, error
         return saved_artworks
 
     @classmethod
     def surprise_me(cls, user):
         """Fetches artworks from a randomly selected unchosen century."""
         
-        user_century = Century.query.get(user.century_id).century_name
+        user_century = CenturyCache.name(user.century_id)
         unchosen_centuries = [c for c in cls.century_dates if c != user_century]
         
         if not unchosen_centuries:
-            flash("API_REQUESTS-No unchosen centuries found.", "danger")
+            flash_or_log("API_REQUESTS-No unchosen centuries found.", "danger")
             return None, "No unchosen centuries found."
 
         random_century = random.choice(unchosen_centuries)
         total_surprise = 50
 
-        page = 1
-        favorite_artwork_ids, not_favorite_artwork_ids = cls.fetch_favorite_and_not_favorite_ids(user.id)
-        saved_artworks = []
-
-        #define API parameters with filtering
-        query_params = {
-            'limit': 100,
-            'page' : page,
-            'fields': 'id,title,artist_title,image_id, dimensions,medium_display,date_display,date_start,date_end, artist_display',
-            'excluded_ids': ','.join(map(str, favorite_artwork_ids + not_favorite_artwork_ids))
-        }
+        saved_artworks, error = cls.collect_artworks(random_century, total_surprise,
+                                                     excluded_ids=ExcludedArtworks.load(user.id))
+        if len(saved_artworks) < total_surprise:
+            return saved_artworks, error
 
-        #fetch data until enough artworks are collected
-        while len(saved_artworks) < total_surprise:
-            artworks, error = cls.fetch_artworks_from_api(query_params)
-            if error or not artworks:
-                return saved_artworks, error  
-            for artwork in artworks:
-                sopresa = cls.filter_dates(artwork, random_century)
-                if sopresa:
-                    saved_artwork_surprise = save_artwork(artwork_detail=sopresa)
-                    if saved_artwork_surprise:
-                        saved_artworks.append(saved_artwork_surprise)
-                    if len(saved_artworks) >= total_surprise:
-                        break
-                
-                
-            page += 1
-            query_params['page'] = page
-
-        return saved_artworks, random_century
\ No newline at end of file
+        return saved_artworks, random_century
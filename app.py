@@ -1,31 +1,35 @@
-from flask import Flask, render_template, redirect, session, flash, g, request
-from flask_debugtoolbar import DebugToolbarExtension
-from  models import db, User, Favorite, Artwork, Century
+from flask import Flask, Blueprint, current_app, render_template, redirect, session, flash, g, request, send_file, url_for, abort, jsonify, Response
+from flask_wtf.csrf import validate_csrf
+from wtforms import ValidationError
+from  models import db, bcrypt, User
 from  forms import UserEditForm, UserForm, LoginForm, FavoriteForm
-from  api_requests import APIRequests
+from  catalog import ArtworkCatalog
+from  http_client import AICClient
+from  async_client import AsyncAICClient
+from  page_cache import PageCache
+from  single_flight import SingleFlight
+from  rate_limit import RateLimiter, CircuitBreaker
+from  image_jobs import ImageDownloads
+from  image_store import ImageStore
 from  favoriting_Art import ArtworkFavorites
+from  recommendations import Recommendations
+from  surprise_pools import SurprisePools
+from  user_loader import UserCache, CURR_USER_KEY
+from  centuries import CenturyCache
+from  api_requests import APIRequests
+from  config import config_for
+from  instrumentation import Instrumentation
 import random
 import os
-from dotenv import load_dotenv
-
 
-load_dotenv()
-
-CURR_USER_KEY = "curr_user"
+IMAGE_MAX_AGE = 60 * 60 * 24 * 365
 API_URL = "https://api.artic.edu/api/v1/artworks/search"
 HEADER = {
     'AIC-User-Agent': 'AIC Discovery (emsager7@gmail.com)'
 }
 
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("SQLALCHEMY_DATABASE_URI")
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ECHO"] = True
-app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
-print(repr(app.config))
-print(app.config)
-toolbar = DebugToolbarExtension(app)
+#every route lives on this blueprint; create_app registers it on each app it builds
+main = Blueprint("main", __name__, cli_group=None)
 
 fav_artwork = ArtworkFavorites.fav_artwork
 dislike_artwork = ArtworkFavorites.dislike_artwork
@@ -33,49 +37,38 @@ unfavorite_artwork = ArtworkFavorites.unfavorite_artwork
 ##############################################################################
 # User signup/login/logout
 
-with app.app_context():
-        db.app = app
-        db.init_app(app)
-        db.create_all()
-
+@main.cli.command("import-images")
+def import_images():
+    """Move favorited images saved straight into static/images by older versions into the image store"""
+    imported = ImageStore.import_legacy(os.path.join(current_app.static_folder, 'images'))
+    print(f"{imported} images moved into the image store")
 
-@app.before_request
-def initialize_app():
-    """initiailiaze application & create necessary directories"""
-    create_directories()
-    add_user_to_g()
-    
+@main.cli.command("sync-catalog")
+def sync_catalog():
+    """Pull artworks for every century into the local catalog"""
+    for century_name, count in ArtworkCatalog.sync_all().items():
+        print(f"{century_name}: {count} artworks synced")
 
 
+@main.before_app_request
 def add_user_to_g():
-    """If we're logged in, add curr user to Flask global."""
+    """Forget any user left on g by an outer app context; g.user is loaded from the session
+    the first time it's read (see user_loader.py)"""
+    if request.endpoint != 'static':
+        g.pop('user', None)
 
-    if CURR_USER_KEY in session:
-        g.user = User.query.get(session[CURR_USER_KEY])
-    else:
-        g.user = None
 
-def create_directories():
+def create_directories(app):
     """Create the necessary directories to save favorited images"""
     IMAGES_DIR_PATH = os.path.join(app.static_folder, 'images')
-    if not os.path.exists(IMAGES_DIR_PATH):
-        os.makedirs(IMAGES_DIR_PATH)
+    os.makedirs(IMAGES_DIR_PATH, exist_ok=True)
 
 def login_user(user):
     """Log in user."""
     session[CURR_USER_KEY] = user.id
 
 
-def initialize_centuries():
-    if not Century.query.first():
-        centuries = ['18th Century', '19th Century', '20th Century']
-        for name in centuries:
-            if not Century.query.filter_by(century_name=name).first():
-                century = Century(century_name=name)
-                db.session.add(century)
-        db.session.commit()
-
-@app.context_processor
+@main.app_context_processor
 def inject_user():
     """This function will run before templates 
     are rendered and will inject the user variable 
@@ -86,7 +79,22 @@ def inject_user():
 """
     return dict(user=g.user)
 
-@app.route('/signup', methods=["GET", "POST"])
+@main.app_template_global()
+def image_src(image_id, size="hero", fallback=None):
+    """URL for an artwork image at the size the page shows it, e.g. "thumb" for the favorites grid.
+    Stored copies are served locally through artwork_image; anything else loads straight from IIIF"""
+    if not image_id:
+        return fallback
+    width = ImageStore.SIZES[size]
+    try:
+        stored = ImageStore.has(image_id, width)
+    except ValueError:
+        return fallback
+    if stored:
+        return url_for('main.artwork_image', image_id=image_id, size=size)
+    return ImageStore.iiif_url(image_id, width)
+
+@main.route('/signup', methods=["GET", "POST"])
 def signup():
     """Handle user signup.
 
@@ -97,9 +105,8 @@ def signup():
     If the there already is a user with that username: flash message
     and re-present form.
     """
-    initialize_centuries()
     form = UserForm()
-    form.century_id.choices = [(c.id, c.century_name)for c in Century.query.order_by('id')]
+    form.century_id.choices = CenturyCache.choices()
     if form.validate_on_submit():
         try:
             user = User.signup(
@@ -122,7 +129,7 @@ def signup():
     
     return render_template('/users/signup.html', form=form)
             
-@app.route('/login', methods=["GET", "POST"])
+@main.route('/login', methods=["GET", "POST"])
 def login():
     """Handle user login."""
 
@@ -142,7 +149,7 @@ def login():
     return render_template('users/login.html', form=form)
 
 
-@app.route('/logout')
+@main.route('/logout')
 def logout():
     """Handle logout of user."""
     if CURR_USER_KEY in session:
@@ -154,10 +161,10 @@ def logout():
 ##############################################################################
 # User focused routes
 
-@app.route('/users/profile', methods=["GET", "POST"])
+@main.route('/users/profile', methods=["GET", "POST"])
 def user_profile():
     """Returns the user's profile page
-    This route will also communicate with the API server to pull an image filtered by the century picked"""
+    The artwork shown is the next one in the user's queue, prefetched from the catalog partition for their century"""
 
     if not g.user:
         flash("Access unauthorized.", "danger")
@@ -177,12 +184,11 @@ def user_profile():
         return redirect('/users/profile')
 
     form = FavoriteForm()
-    user_century = Century.query.get(user.century_id).century_name
-    saved_artworks = APIRequests.get_artworks(user)
-    selected_artwork = random.choice(saved_artworks) if saved_artworks else None
+    user_century = CenturyCache.name(user.century_id)
+    selected_artwork = Recommendations.next_artwork(user)
     return render_template('/users/profile.html', selected_artwork=selected_artwork, user=user, century = user_century, form=form)
 
-@app.route('/users/profile/edit', methods=["GET", "POST"])
+@main.route('/users/profile/edit', methods=["GET", "POST"])
 def edit_profile():
     """Update profile for current user."""
     if not g.user:
@@ -191,14 +197,18 @@ def edit_profile():
     
     user = g.user
     form = UserEditForm(obj=user)
-    form.century_id.choices = [(c.id, c.century_name) for c in Century.query.order_by('century_name')]
+    form.century_id.choices = CenturyCache.choices(order_by='century_name')
     if form.validate_on_submit():
         auth_user = User.authenticate(user.username, form.password.data)
         if auth_user:
             user.username = form.username.data
             user.email = form.email.data
+            if user.century_id != form.century_id.data:
+                #the queued artworks belong to the old century
+                Recommendations.clear(user.id)
             user.century_id = form.century_id.data
             db.session.commit()
+            UserCache.invalidate(user.id)
             # flash("User Updated!", "success")
             return redirect(f"/users/profile")
         else:
@@ -212,15 +222,15 @@ def edit_profile():
 ##############################################################################
 # Art focused routes
 
-@app.route('/users/favorites', methods=["GET", "POST"])
+@main.route('/users/favorites', methods=["GET", "POST"])
 def all_favorites():
-    """Retrieves all of the current user's favorited works"""
+    """Retrieves the current user's favorited works, a page at a time"""
     if not g.user:
         flash("Access unauthorized.", "danger")
         return redirect("/")
     
     
-    # Retrieve all favorites for the current user and join with Artwork to get details
+    # Favorites are listed a page at a time, the first page with the full layout
     user = g.user
     form = FavoriteForm()
 
@@ -236,31 +246,45 @@ def all_favorites():
         return redirect('/users/favorites')
 
 
-    favorites = (db.session.query(Favorite, Artwork)
-                 .join(Artwork, Favorite.artwork_id == Artwork.id)
-                 .filter(Favorite.user_id == g.user.id)
-                 .all())
-    
-    seen = set()
-    favorite_artworks = []
-    
-    for fav in favorites:
-        if fav.Artwork.image_id not in seen:
-            seen.add(fav.Artwork.image_id)
-            favorite_artworks.append({'id': fav.Artwork.id,
-                          'title': fav.Artwork.title,
-                          'image_id': fav.Artwork.image_id,
-                          'artist_title': fav.Artwork.artist_title,
-                          'date_start': fav.Artwork.date_start,
-                          'date_end': fav.Artwork.date_end,
-                          'image_url': f"https://www.artic.edu/iiif/2/{fav.Artwork.image_id}/full/843,/0/default.jpg"})
-            
-    return render_template('/users/favorites.html', favorites=favorite_artworks, form=form)
+    after = request.args.get('after', type=int)
+    favorites, cursor = ArtworkFavorites.favorites_page(user.id, after=after)
+    next_page = url_for('main.all_favorites', after=cursor) if cursor else None
+
+    #infinite scroll asks for just the cards of the next page
+    if request.args.get('partial'):
+        return render_template('/users/_favorite_cards.html', favorites=favorites, form=form, next_page=next_page)
+    return render_template('/users/favorites.html', favorites=favorites, form=form, next_page=next_page)
+
+@main.route('/images/<image_id>/<size>')
+def artwork_image(image_id, size):
+    """Serves an artwork image from the local store, or sends the browser to the
+    IIIF server for the same size when it hasn't been downloaded"""
+    width = ImageStore.SIZES.get(size)
+    if width is None:
+        abort(404)
+    try:
+        stored = ImageStore.has(image_id, width)
+    except ValueError:
+        abort(404)
+
+    if stored:
+        #an image_id never changes its pixels, so browsers can keep it for good
+        res = send_file(ImageStore.path_for(image_id, width), mimetype="image/jpeg",
+                        etag=True, conditional=True, max_age=IMAGE_MAX_AGE)
+        res.cache_control.public = True
+        res.cache_control.immutable = True
+        return res
+
+    res = redirect(ImageStore.iiif_url(image_id, width))
+    #short lived, so the local copy is picked up once it has been downloaded
+    res.cache_control.public = True
+    res.cache_control.max_age = 300
+    return res
 
 # Surprise Me Routes
 """the purpose of these routes is to 
 show users artwork from the centuries they didn't chose."""
-@app.route('/users/surprise', methods=['POST', 'GET'])
+@main.route('/users/surprise', methods=['POST', 'GET'])
 def surprise_home():
     """Route that shows the surprise page and showcases artwork from unchosen centuries"""
     if not g.user:
@@ -279,13 +303,13 @@ def surprise_home():
             if res == 201:
                 db.session.commit()
         elif action == 'not_favorite':
-            unfavorite_artwork(user, artwork_id)
+            dislike_artwork(user, artwork_id)
             db.session.commit()
 
         #redirect to avoid resubmission 
         return redirect('/users/surprise')
 
-    artworks_details, random_century = APIRequests.surprise_me(user)
+    artworks_details, random_century = ArtworkCatalog.surprise_me(user)
 
     if artworks_details:
         artwork = random.choice(artworks_details)
@@ -296,11 +320,198 @@ def surprise_home():
         return redirect('/users/profile')
     
     
+##############################################################################
+# JSON API
+"""the profile, surprise and favorites pages rate artworks through these routes
+without reloading; rating responses carry the next artwork to show"""
+
+RATING_ERRORS = {ArtworkFavorites.NO_USER: "Access unauthorized.",
+                 ArtworkFavorites.NO_ARTWORK: "Artwork not found.",
+                 ArtworkFavorites.NO_ARTIST_ID: "Artwork has no artist."}
+
+def api_error(message, status):
+    return jsonify(error=message), status
+
+def artwork_id_from(value):
+    """`value` (from a JSON body or the URL) as an artwork id, or None if it isn't a whole number"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+def check_api_request():
+    """An error response if the caller isn't logged in or, for writes, didn't send the CSRF token
+    from the page in an X-CSRFToken header. None if the request may go ahead"""
+    if not g.user:
+        return api_error("Access unauthorized.", 401)
+    if request.method != 'GET' and current_app.config.get('WTF_CSRF_ENABLED', True):
+        try:
+            validate_csrf(request.headers.get('X-CSRFToken'))
+        except ValidationError:
+            return api_error("Missing or invalid CSRF token.", 400)
+    return None
+
+def artwork_json(artwork):
+    """The artwork fields the profile and surprise pages show"""
+    if not artwork:
+        return None
+    return {'id': artwork.id,
+            'title': artwork.title,
+            'artist_title': artwork.artist_title,
+            'artist_display': artwork.artist_display,
+            'date_start': artwork.date_start,
+            'date_end': artwork.date_end,
+            'medium_display': artwork.medium_display,
+            'dimensions': artwork.dimensions,
+            'image_src': image_src(artwork.image_id, 'hero', artwork.image_url)}
+
+def next_in_feed(user, feed):
+    """The next artwork for the profile feed, or for the surprise feed with its century"""
+    if feed == 'surprise':
+        artworks, century = ArtworkCatalog.surprise_me(user)
+        return {'artwork': artwork_json(artworks[0] if artworks else None), 'century': century}
+    return {'artwork': artwork_json(Recommendations.next_artwork(user)),
+            'century': CenturyCache.name(user.century_id)}
+
+def rate_artwork(rate):
+    """Shared handling for POST /api/favorites and /api/dislikes"""
+    error = check_api_request()
+    if error:
+        return error
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return api_error("Expected a JSON object.", 400)
+    artwork_id = artwork_id_from(data.get('artwork_id'))
+    if artwork_id is None:
+        return api_error("artwork_id must be a whole number.", 400)
+    res = rate(g.user, artwork_id)
+    if res in RATING_ERRORS:
+        return api_error(RATING_ERRORS[res], res)
+    #201 for a new rating, 200 if the artwork was already rated this way
+    return jsonify(next=next_in_feed(g.user, data.get('feed'))), res
+
+@main.route('/api/feed/next')
+def api_feed_next():
+    """The next artwork for ?feed=profile (the default) or ?feed=surprise"""
+    error = check_api_request()
+    if error:
+        return error
+    return jsonify(next_in_feed(g.user, request.args.get('feed')))
+
+@main.route('/api/favorites', methods=['POST'])
+def api_favorite():
+    """Favorite {"artwork_id": ..., "feed": ...} and return the feed's next artwork"""
+    return rate_artwork(fav_artwork)
+
+@main.route('/api/favorites/<artwork_id>', methods=['DELETE'])
+def api_unfavorite(artwork_id):
+    """Remove an artwork from the user's favorites"""
+    error = check_api_request()
+    if error:
+        return error
+    artwork_id = artwork_id_from(artwork_id)
+    if artwork_id is None:
+        return api_error("artwork_id must be a whole number.", 400)
+    res = unfavorite_artwork(g.user, artwork_id)
+    if res in RATING_ERRORS:
+        return api_error(RATING_ERRORS[res], res)
+    return jsonify(removed=artwork_id)
+
+@main.route('/api/dislikes', methods=['POST'])
+def api_dislike():
+    """Dislike {"artwork_id": ..., "feed": ...} and return the feed's next artwork"""
+    return rate_artwork(dislike_artwork)
+
+##############################################################################
+# Metrics
+
+@main.route('/metrics')
+def metrics():
+    """Prometheus metrics for this process: per-endpoint request, db, AIC API and template totals,
+    plus the caches and guards in front of the AIC API"""
+    pools = SurprisePools.metrics()
+    flights = SingleFlight.metrics()
+    client = AICClient.metrics()
+    extra = [
+        ("aic_surprise_pool_lookups_total", "counter", "Surprise pool lookups",
+         [({"result": "hit"}, pools["hits"]), ({"result": "miss"}, pools["misses"])]),
+        ("aic_surprise_pool_exhausted_total", "counter", "Times a pool had nothing left for a user", pools["exhausted"]),
+        ("aic_surprise_pool_size", "gauge", "Artworks in each century's surprise pool",
+         [({"century_id": century_id}, size) for century_id, size in sorted(pools["pool_sizes"].items())]),
+        ("aic_single_flight_calls_total", "counter", "Page fetches made", flights["calls"]),
+        ("aic_single_flight_shared_total", "counter", "Page fetches that waited on another caller's", flights["shared"]),
+        ("aic_client_requests_total", "counter", "Requests sent on the pooled AIC session", client["requests"]),
+        ("aic_client_connections_total", "counter", "Connections opened by the pooled AIC session", client["connections"]),
+        ("aic_circuit_breaker_state", "gauge", "1 for the circuit breaker's current state",
+         [({"state": state}, int(state == CircuitBreaker.state())) for state in ("closed", "open", "half-open")]),
+    ]
+    return Response(Instrumentation.prometheus(extra), mimetype="text/plain; version=0.0.4")
+
 ##############################################################################
 # Homepage
 
-@app.route('/')
+@main.route('/')
 def home_page():
     return render_template('index.html')
 
 
+##############################################################################
+# App factory
+
+def init_migrations(app):
+    """Add the `flask db` commands that manage the schema of `app`'s database (see migrations/)"""
+    from flask_migrate import Migrate
+    #each revision commits on its own, so a failed deploy keeps the revisions before it; batch mode lets SQLite alter tables
+    Migrate(app, db, transaction_per_migration=True, render_as_batch=True)
+
+
+def create_app(config=None):
+    """Build the app with the settings for APP_ENV (development, testing or production),
+    or with `config`, a config object or profile name"""
+    if config is None or isinstance(config, str):
+        config = config_for(config)
+    app = Flask(__name__)
+    app.config.from_object(config)
+    if app.config["DEBUG_TOOLBAR"]:
+        from flask_debugtoolbar import DebugToolbarExtension
+        DebugToolbarExtension(app)
+    Instrumentation.init_app(app)
+    AICClient.init_app(app)
+    APIRequests.init_app(app)
+    AsyncAICClient.init_app(app)
+    PageCache.init_app(app)
+    SingleFlight.init_app(app)
+    RateLimiter.init_app(app)
+    CircuitBreaker.init_app(app)
+    ImageStore.init_app(app)
+    ImageDownloads.init_app(app)
+    Recommendations.init_app(app)
+    SurprisePools.init_app(app)
+    UserCache.init_app(app)
+    db.init_app(app)
+    bcrypt.init_app(app)
+    init_migrations(app)
+    app.register_blueprint(main)
+
+    #the schema is otherwise built and changed by `flask db upgrade` (see migrations/), run once per deploy
+    if app.config["CREATE_TABLES"]:
+        with app.app_context():
+            db.create_all()
+            #every century the app can search for exists before anyone signs up
+            CenturyCache.seed(APIRequests.century_dates)
+
+    if app.config["CATALOG_SYNC_INTERVAL"]:
+        ArtworkCatalog.start_sync_thread(app, app.config["CATALOG_SYNC_INTERVAL"])
+    create_directories(app)
+    return app
+
+
+def __getattr__(name):
+    """`app`, built for APP_ENV the first time it's asked for (by `flask run`, gunicorn's app:app or
+    `from app import app`), so importing this module doesn't touch the db or start any threads"""
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,14 +1,25 @@
-#This page is for saving the artwork. Either to the DB or to a file (for the image)
+#This page is for saving the artwork to the DB (images are downloaded by image_jobs.py)
+
+from models import db, Artwork, Artist, dialect_insert
+from flask import flash
+from sqlalchemy.exc import IntegrityError
+import logging
+
+
+def flash_or_log(message, category):
+    """Flash a message to the user, or log it when running outside of a request
+    (e.g. the background catalog sync)"""
+    try:
+        flash(message, category)
+    except RuntimeError:
+        logging.warning(message)
 
-from models import db, Artwork, Artist
-from flask import current_app, flash
-import os
-import requests
 
 class SaveArtwork:
     @classmethod
-    def save_artwork(cls, artwork_detail):
-        """This function saves the artwork details to the db"""
+    def save_artwork(cls, artwork_detail, century_id=None):
+        """This function saves the artwork details to the db
+        `century_id` files the artwork under that century of the local catalog"""
         artist = Artist.query.filter_by(artist_title=artwork_detail['artist_title']).first()
         if not artist:
             artist = Artist(artist_title=artwork_detail['artist_title'])
@@ -17,7 +28,7 @@ class SaveArtwork:
                 db.session.commit()
             except Exception as e:
                 db.session.rollback()
-                flash(f"An error occurred while saving the artist: {e}", "danger")
+                flash_or_log(f"An error occurred while saving the artist: {e}", "danger")
                 return None
 
         #check if an artwork with the provided id already exists
@@ -31,6 +42,8 @@ class SaveArtwork:
             artwork.medium_display = artwork_detail['medium_display']
             artwork.dimensions = artwork_detail['dimensions']
             artwork.image_id = artwork_detail.get('image_id')
+            if century_id:
+                artwork.century_id = century_id
             # artwork.image_url=artwork_detail.get('image_url')
         else:
             #creates a new entry
@@ -46,7 +59,8 @@ class SaveArtwork:
                 medium_display=artwork_detail['medium_display'],
                 dimensions=artwork_detail['dimensions'],
                 image_id=image_id,
-                image_url=image_url
+                image_url=image_url,
+                century_id=century_id
             )
             db.session.add(artwork)
 
@@ -55,28 +69,92 @@ class SaveArtwork:
             return artwork
         except Exception as e:
             db.session.rollback()
-            flash(f"An error occurred while saving the artwork: {e}", "danger")
+            flash_or_log(f"An error occurred while saving the artwork: {e}", "danger")
             return None
         
     @classmethod
-    def save_image_file(cls, image_url, image_id, title):
-        """Download the image from `image_url` and save it to the static/images directory""" 
-        #build the path to the images directory
-        IMAGES_DIR = os.path.join(current_app.static_folder, 'images')
-        #ensure the directory exists
-        os.makedirs(IMAGES_DIR, exist_ok=True)
-        #create the full path definition
-        image_path = os.path.join(IMAGES_DIR, f"{title.replace(' ', '_')}_{image_id}.jpg")
+    def save_artworks(cls, batch, century_id=None):
+        """Save a page of artwork details in one transaction.
+        Artists are resolved with a single IN query, missing ones are inserted together,
+        and the artworks are upserted with one INSERT ... ON CONFLICT DO UPDATE.
+        Rows that can't be saved (e.g. an image_id another artwork already has) are skipped, not the page.
+        Returns the persisted artworks in the order of `batch`"""
+        if not batch:
+            return []
+        #ON CONFLICT can't touch the same row twice in one statement
+        details_by_id = {detail['id']: detail for detail in batch}
 
         try:
-            #attempt to download
-            res = requests.get(image_url)
-            if res.status_code == 200:
-                #write the image data to a new file
-                if not os.path.exists(image_path):
-                    with open(image_path, 'wb') as image_file:
-                        image_file.write(res.content)
-                        print(flash.__class__)
-                        # flash("Images successfully saved.", "success")
+            titles = {detail['artist_title'] for detail in details_by_id.values()}
+            title_filter = Artist.artist_title.in_(titles)
+            if None in titles:
+                #IN never matches NULL, so unknown artists need their own clause
+                title_filter = db.or_(title_filter, Artist.artist_title.is_(None))
+            artists = {artist.artist_title: artist for artist in Artist.query.filter(title_filter).all()}
+            new_artists = [Artist(artist_title=title) for title in titles if title not in artists]
+            if new_artists:
+                db.session.add_all(new_artists)
+                db.session.flush()
+                artists.update((artist.artist_title, artist) for artist in new_artists)
+
+            rows = cls._unique_image_rows([{
+                'id': detail['id'],
+                'title': detail['title'],
+                'artist_id': artists[detail['artist_title']].id,
+                'date_start': detail.get('date_start'),
+                'date_end': detail.get('date_end'),
+                'medium_display': detail['medium_display'],
+                'dimensions': detail['dimensions'],
+                'image_id': detail.get('image_id'),
+                'image_url': f"https://www.artic.edu/iiif/2/{detail.get('image_id')}/full/843,/0/default.jpg",
+                'century_id': century_id,
+            } for detail in details_by_id.values()])
+
+            try:
+                with db.session.begin_nested():
+                    saved = cls._upsert(rows)
+            except IntegrityError:
+                #one bad row fails the whole statement; save them one at a time so only the bad ones are lost
+                saved = {}
+                for row in rows:
+                    try:
+                        with db.session.begin_nested():
+                            saved.update(cls._upsert([row]))
+                    except IntegrityError as e:
+                        logging.warning(f"Skipped artwork {row['id']}: {e.orig}")
+            db.session.commit()
         except Exception as e:
-            flash("Failed to download image", "danger")
\ No newline at end of file
+            db.session.rollback()
+            flash_or_log(f"An error occurred while saving the artworks: {e}", "danger")
+            return []
+
+        return [saved[detail['id']] for detail in batch if detail['id'] in saved]
+
+    @classmethod
+    def _unique_image_rows(cls, rows):
+        """`rows` without those whose image_id is used by an earlier row or by another artwork already saved"""
+        image_ids = {row['image_id'] for row in rows if row['image_id']}
+        owners = dict(db.session.execute(
+            db.select(Artwork.image_id, Artwork.id).where(Artwork.image_id.in_(image_ids))).all()) if image_ids else {}
+        unique = []
+        for row in rows:
+            image_id = row['image_id']
+            if image_id and owners.setdefault(image_id, row['id']) != row['id']:
+                logging.warning(f"Skipped artwork {row['id']}: image {image_id} belongs to artwork {owners[image_id]}")
+                continue
+            unique.append(row)
+        return unique
+
+    @classmethod
+    def _upsert(cls, rows):
+        """INSERT ... ON CONFLICT (id) DO UPDATE the rows. Returns the saved artworks by id"""
+        if not rows:
+            return {}
+        stmt = dialect_insert(Artwork).values(rows)
+        updates = {column: stmt.excluded[column] for column in
+                   ('title', 'artist_id', 'date_start', 'date_end', 'medium_display', 'dimensions', 'image_id')}
+        #keep an artwork in its partition when it's saved without a century
+        updates['century_id'] = db.func.coalesce(stmt.excluded.century_id, Artwork.century_id)
+        stmt = stmt.on_conflict_do_update(index_elements=[Artwork.id], set_=updates).returning(Artwork)
+        return {artwork.id: artwork for artwork in
+                db.session.scalars(stmt, execution_options={'populate_existing': True})}
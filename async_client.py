@@ -0,0 +1,96 @@
+#Optional asyncio client for the AIC search API, used when httpx is installed and AIC_ASYNC_PAGES is set.
+#A single event loop runs on a daemon thread in each process and drives one httpx.AsyncClient, so any
+#number of search pages can be waiting on the API at once without tying up a thread each.
+#Callers on ordinary threads get concurrent.futures.Future objects back, just like a ThreadPoolExecutor.
+#httpx is only imported once the loop starts, so apps that leave this off never load it.
+
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+from http_client import AICClient
+from instrumentation import Instrumentation
+
+
+class AsyncAICClient:
+    ENABLED = False
+    MAX_CONNECTIONS = 100
+    #for tests: an httpx transport to use instead of the network
+    TRANSPORT = None
+
+    _loop = None
+    _client = None
+    _pid = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        """Turn the async client on if the app asks for it and httpx is available"""
+        wanted = bool(app.config.get("AIC_ASYNC_PAGES"))
+        installed = cls.available()
+        if wanted and not installed:
+            logging.warning("AIC_ASYNC_PAGES is set but httpx isn't installed; using the thread pool")
+        cls.ENABLED = wanted and installed
+        cls.MAX_CONNECTIONS = app.config.get("AIC_ASYNC_CONNECTIONS", cls.MAX_CONNECTIONS)
+        cls.reset()
+
+    @classmethod
+    def available(cls):
+        """Whether httpx is installed, without importing it"""
+        return importlib.util.find_spec("httpx") is not None
+
+    @classmethod
+    def errors(cls):
+        """What a call raises when it never got a response, for use in `except`"""
+        import httpx
+        return httpx.HTTPError
+
+    @classmethod
+    def reset(cls):
+        """Stop the event loop so the next call starts one with fresh settings"""
+        with cls._lock:
+            if cls._loop is not None and cls._pid == os.getpid():
+                asyncio.run_coroutine_threadsafe(cls._client.aclose(), cls._loop).result(timeout=5)
+                cls._loop.call_soon_threadsafe(cls._loop.stop)
+            cls._loop = None
+            cls._client = None
+            cls._pid = None
+
+    @classmethod
+    def loop(cls):
+        """The event loop for this process, started on first use (and again in a forked worker)"""
+        if cls._loop is None or cls._pid != os.getpid():
+            with cls._lock:
+                if cls._loop is None or cls._pid != os.getpid():
+                    import httpx
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="aic-async", daemon=True).start()
+                    cls._client = httpx.AsyncClient(
+                        limits=httpx.Limits(max_connections=cls.MAX_CONNECTIONS),
+                        timeout=httpx.Timeout(AICClient.READ_TIMEOUT, connect=AICClient.CONNECT_TIMEOUT),
+                        transport=cls.TRANSPORT)
+                    cls._loop = loop
+                    cls._pid = os.getpid()
+        return cls._loop
+
+    @classmethod
+    def submit(cls, coroutine):
+        """Run `coroutine` on the event loop. Returns a concurrent.futures.Future for its result.
+        Upstream calls it makes count towards the request that submitted it"""
+        coroutine = Instrumentation.bind_coroutine(coroutine, Instrumentation.current())
+        return asyncio.run_coroutine_threadsafe(coroutine, cls.loop())
+
+    @classmethod
+    async def post(cls, url, **kwargs):
+        """POST on the shared client, retrying 429/5xx with the same backoff as AICClient"""
+        for attempt in range(AICClient.MAX_RETRIES + 1):
+            started = time.perf_counter()
+            response = await cls._client.post(url, **kwargs)
+            Instrumentation.record_upstream(started, len(response.content))
+            if response.status_code not in AICClient.RETRY_STATUSES or attempt == AICClient.MAX_RETRIES:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else AICClient.BACKOFF_FACTOR * 2 ** attempt
+            await asyncio.sleep(delay)
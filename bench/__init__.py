@@ -0,0 +1,2 @@
+#Load-testing tools: a stand-in for the AIC API (fake_aic.py), a script that records the artworks it
+#serves (record.py) and a benchmark harness that drives the app with concurrent users (run.py).
@@ -0,0 +1,224 @@
+#Local stand-in for the AIC search API and IIIF image server.
+#Searches are answered from recorded artworks (bench/fixtures/artworks.json, see record.py) by applying
+#the same century range and id exclusions the real search does, so pages come back with realistic sizes.
+#Latency, the share of 503 errors and a requests-per-minute limit (429 with Retry-After) can be set,
+#and every call is counted so the benchmark can report upstream calls per request.
+#
+#run it on its own like:
+#
+#    python3 -m bench.fake_aic --port 8001 --latency-ms 150
+#
+#and point the app at it with AIC_API_URL=http://127.0.0.1:8001/api/v1/artworks/search
+#and AIC_IIIF_URL=http://127.0.0.1:8001/iiif/2/{image_id}/full/{width},/0/default.jpg
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "artworks.json")
+SEARCH_PATH = "/api/v1/artworks/search"
+IIIF_PATH = re.compile(r"^/iiif/2/([\w-]+)/full/(\d+),/0/default\.jpg$")
+#the real search stops paging after this many results
+MAX_RESULTS = 10000
+
+
+def load_artworks(path=FIXTURES_PATH, synthetic=3000):
+    """The recorded artworks, or `synthetic` made-up ones of the same shape when nothing is recorded"""
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    rng = random.Random(0)
+    artworks = []
+    for i in range(synthetic):
+        date_start = rng.randint(1650, 2000)
+        artworks.append({
+            'id': 100000 + i,
+            'title': f"Untitled {i}",
+            'artist_title': f"Artist {rng.randint(1, synthetic // 10)}",
+            'image_id': f"{rng.getrandbits(128):032x}",
+            'dimensions': f"{rng.randint(10, 200)} x {rng.randint(10, 200)} cm",
+            'medium_display': rng.choice(["Oil on canvas", "Watercolor on paper", "Bronze", "Etching"]),
+            'date_display': str(date_start),
+            'date_start': date_start,
+            'date_end': date_start + rng.randint(0, 5),
+            'artist_display': f"Artist {i}\nAmerican",
+        })
+    return artworks
+
+
+def matches(artwork, bool_query):
+    """Whether an artwork matches the bool query the app sends: any `should` range, no `must_not` id"""
+    for clause in bool_query.get('must_not', []):
+        if artwork['id'] in clause.get('terms', {}).get('id', []):
+            return False
+    should = bool_query.get('should', [])
+    if not should:
+        return True
+    for clause in should:
+        (field, bounds), = clause['range'].items()
+        value = artwork.get(field)
+        if value is not None and bounds.get('gte', value) <= value <= bounds.get('lte', value):
+            return True
+    return False
+
+
+class FakeAIC:
+    """The fake API's data, knobs and counters, shared by every request handler"""
+    def __init__(self, artworks=None, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_per_minute=0,
+                 image_bytes=60 * 1024):
+        self.artworks = sorted(artworks if artworks is not None else load_artworks(), key=lambda a: a['id'])
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_per_minute = rate_per_minute
+        self.image = b"\xff\xd8" + os.urandom(max(image_bytes - 4, 0)) + b"\xff\xd9"
+        self.stats = Counter()
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = Counter()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def throttled(self):
+        """Whether this call goes over rate_per_minute. Returns the seconds to wait, or 0"""
+        if not self.rate_per_minute:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            while self._calls and now - self._calls[0] >= 60:
+                self._calls.popleft()
+            if len(self._calls) >= self.rate_per_minute:
+                return int(60 - (now - self._calls[0])) + 1
+            self._calls.append(now)
+        return 0
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            time.sleep(max(self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000)
+
+    def search(self, body):
+        """A search response for the request body, paged like the real API"""
+        limit = int(body.get('limit', 10))
+        page = int(body.get('page', 1))
+        hits = [a for a in self.artworks if matches(a, body.get('query', {}).get('bool', {}))]
+        total = min(len(hits), MAX_RESULTS)
+        offset = (page - 1) * limit
+        fields = body.get('fields')
+        data = [{field: artwork.get(field) for field in fields} if fields else dict(artwork)
+                for artwork in hits[offset:min(offset + limit, total)]]
+        return {
+            'preference': None,
+            'pagination': {'total': total, 'limit': limit, 'offset': offset,
+                           'total_pages': -(-total // limit) if limit else 0, 'current_page': page},
+            'data': data,
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b"", content_type="application/json", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def guarded(self, kind):
+        """Count the call and apply latency, errors and the rate limit. Returns False if the call was refused"""
+        self.fake.count(kind)
+        self.fake.delay()
+        retry_after = self.fake.throttled()
+        if retry_after:
+            self.fake.count("throttled")
+            self.send(429, b'{"detail": "Too many requests"}', headers=[("Retry-After", str(retry_after))])
+            return False
+        if self.fake.error_rate and random.random() < self.fake.error_rate:
+            self.fake.count("errors")
+            self.send(503, b'{"detail": "Service unavailable"}')
+            return False
+        return True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.split("?")[0] != SEARCH_PATH:
+            return self.send(404, b'{"detail": "Not found"}')
+        if self.guarded("search"):
+            self.send(200, json.dumps(self.fake.search(json.loads(body or b"{}"))).encode())
+
+    def do_GET(self):
+        if self.path == "/__stats":
+            return self.send(200, json.dumps(self.fake.stats).encode())
+        if not IIIF_PATH.match(self.path):
+            return self.send(404, b'{"detail": "Not found"}')
+        if self.guarded("iiif"):
+            self.send(200, self.fake.image, content_type="image/jpeg")
+
+
+def serve(fake, host="127.0.0.1", port=0):
+    """Start the fake API on a daemon thread. Returns the server; its base URL is http://host:server.server_port"""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, name="fake-aic", daemon=True).start()
+    return server
+
+
+def app_env(server):
+    """Environment variables that point the app at `server`"""
+    base = f"http://{server.server_address[0]}:{server.server_port}"
+    return {"AIC_API_URL": base + SEARCH_PATH,
+            "AIC_IIIF_URL": base + "/iiif/2/{image_id}/full/{width},/0/default.jpg"}
+
+
+def add_arguments(parser):
+    parser.add_argument("--fixtures", default=FIXTURES_PATH, help="recorded artworks (default: %(default)s)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every upstream call")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="latency varies by up to this much either way")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 503")
+    parser.add_argument("--rate-per-minute", type=int, default=0, help="answer 429 past this many calls a minute")
+
+
+def from_arguments(args):
+    return FakeAIC(load_artworks(args.fixtures), latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                   error_rate=args.error_rate, rate_per_minute=args.rate_per_minute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the AIC API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(from_arguments(args), args.host, args.port)
+    for name, value in app_env(server).items():
+        print(f"{name}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#Records artworks from the real AIC search API into bench/fixtures/artworks.json for fake_aic.py.
+#Pages are fetched one at a time, a second apart, to stay inside AIC's request budget.
+#
+#run it like:
+#
+#    python3 -m bench.record --pages 10
+
+import argparse
+import json
+import os
+import time
+import requests
+from api_requests import APIRequests
+from bench.fake_aic import FIXTURES_PATH
+
+
+def record(pages, path=FIXTURES_PATH):
+    """Fetch the first `pages` search pages of every century. Returns how many artworks were written"""
+    artworks = {}
+    for century_name in APIRequests.century_dates:
+        for page in range(1, pages + 1):
+            response = requests.post(APIRequests.API_URL, headers=APIRequests.HEADER, timeout=30,
+                                     json=APIRequests.build_century_query(century_name, page=page))
+            response.raise_for_status()
+            data = response.json()['data']
+            artworks.update((artwork['id'], artwork) for artwork in data)
+            print(f"{century_name} page {page}: {len(data)} artworks")
+            time.sleep(1)
+            if len(data) < APIRequests.PAGE_LIMIT:
+                break
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(sorted(artworks.values(), key=lambda a: a['id']), f, indent=1)
+    return len(artworks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record AIC search results for the fake AIC server")
+    parser.add_argument("--pages", type=int, default=10, help="pages per century (default: %(default)s)")
+    parser.add_argument("--out", default=FIXTURES_PATH, help="default: %(default)s")
+    args = parser.parse_args()
+    print(f"{record(args.pages, args.out)} artworks written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#Benchmark harness: drives the app with concurrent simulated users against the fake AIC server and
+#reports p50/p95/p99 latency, upstream calls and db queries per request for each scenario.
+#The database it's given is emptied first, so by default it runs on a throwaway SQLite file.
+#
+#run it like:
+#
+#    python3 -m bench.run --users 20 --requests 10 --latency-ms 150
+#
+#save a baseline with --json and pass it back with --baseline to fail on regressions:
+#
+#    python3 -m bench.run --json bench/results/baseline.json
+#    python3 -m bench.run --baseline bench/results/baseline.json --tolerance 0.25
+
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bench.fake_aic import add_arguments, from_arguments, serve, app_env
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SCENARIOS = ("profile", "surprise", "get_artworks", "surprise_me", "save_artwork")
+#metrics compared against a baseline; lower is better for all of them
+COMPARED = ("p95_ms", "upstream_per_request", "queries_per_request")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values`"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(timings, queries, errors, upstream, elapsed):
+    """One scenario's numbers, from its per-request latencies (seconds) and query counts"""
+    count = len(timings)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50) * 1000, 1),
+        'p95_ms': round(percentile(timings, 95) * 1000, 1),
+        'p99_ms': round(percentile(timings, 99) * 1000, 1),
+        'throughput_rps': round(count / elapsed, 1) if elapsed else 0.0,
+        'upstream_per_request': round(upstream / count, 2) if count else 0.0,
+        'queries_per_request': round(sum(queries) / count, 1) if count else 0.0,
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """Metrics that got worse than the baseline by more than `tolerance` (a fraction)"""
+    found = []
+    for scenario, numbers in results.items():
+        before = baseline.get(scenario)
+        if not before:
+            continue
+        for metric in COMPARED:
+            #a little slack so near-zero baselines don't flag noise
+            if numbers[metric] > before[metric] * (1 + tolerance) + 0.5:
+                found.append(f"{scenario} {metric}: {before[metric]} -> {numbers[metric]}")
+    return found
+
+
+def print_table(results):
+    columns = ("requests", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps",
+               "upstream_per_request", "queries_per_request")
+    print(f"{'scenario':<14}" + "".join(f"{column:>{len(column) + 2}}" for column in columns))
+    for scenario, numbers in results.items():
+        print(f"{scenario:<14}" + "".join(f"{numbers[column]:>{len(column) + 2}}" for column in columns))
+
+
+class Bench:
+    """Sets the app up against the fake API and runs the scenarios"""
+    def __init__(self, app, fake, users):
+        from models import db, User
+        from centuries import CenturyCache
+        from api_requests import APIRequests
+        from sqlalchemy import event
+
+        self.app = app
+        self.fake = fake
+        self._local = threading.local()
+        with app.app_context():
+            #SQLALCHEMY_ECHO would drown the report
+            db.engine.echo = False
+            event.listen(db.engine, "before_cursor_execute", self.count_query)
+            db.drop_all()
+            db.create_all()
+            CenturyCache.seed(APIRequests.century_dates)
+            centuries = [c for c in CenturyCache.all() if c.century_name in APIRequests.century_dates]
+            self.user_ids = [User.signup(f"bench{i}", "password", f"bench{i}@example.com", "Bench", str(i),
+                                         centuries[i % len(centuries)].id).id
+                             for i in range(users)]
+
+    def count_query(self, *args):
+        self._local.queries = getattr(self._local, "queries", 0) + 1
+
+    def sync_catalog(self):
+        """Fill the local catalog from the fake API, like `flask sync-catalog`. Returns the seconds taken"""
+        from catalog import ArtworkCatalog
+        start = time.perf_counter()
+        with self.app.app_context():
+            ArtworkCatalog.sync_all()
+        return time.perf_counter() - start
+
+    def reset_caches(self):
+        """Start every scenario cold"""
+        from page_cache import PageCache
+        from surprise_pools import SurprisePools
+        from user_loader import UserCache
+        PageCache.clear()
+        SurprisePools.reset()
+        UserCache.clear()
+
+    def call(self, scenario, client, user_id):
+        """Make one request of the scenario. Returns whether it succeeded"""
+        from models import db, User
+        from api_requests import APIRequests
+        from artwork import SaveArtwork
+
+        if scenario == "profile":
+            return client.get("/users/profile").status_code == 200
+        if scenario == "surprise":
+            return client.get("/users/surprise").status_code == 200
+        with self.app.test_request_context():
+            user = db.session.get(User, user_id)
+            if scenario == "get_artworks":
+                result = APIRequests.get_artworks(user)
+                return isinstance(result, list) or result[1] is None
+            if scenario == "surprise_me":
+                return bool(APIRequests.surprise_me(user)[0])
+            if scenario == "save_artwork":
+                return SaveArtwork.save_artwork(random.choice(self.fake.artworks)) is not None
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    def run_user(self, scenario, user_id, requests):
+        from user_loader import CURR_USER_KEY
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session[CURR_USER_KEY] = user_id
+        timings, queries, errors = [], [], 0
+        for i in range(requests):
+            self._local.queries = 0
+            start = time.perf_counter()
+            try:
+                ok = self.call(scenario, client, user_id)
+            except Exception:
+                ok = False
+            timings.append(time.perf_counter() - start)
+            queries.append(self._local.queries)
+            errors += not ok
+        return timings, queries, errors
+
+    def run(self, scenario, requests):
+        """Every user makes `requests` requests of the scenario at the same time"""
+        self.reset_caches()
+        self.fake.reset_stats()
+        timings, queries, errors = [], [], 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(self.user_ids)) as pool:
+            for user_timings, user_queries, user_errors in pool.map(
+                    lambda user_id: self.run_user(scenario, user_id, requests), self.user_ids):
+                timings += user_timings
+                queries += user_queries
+                errors += user_errors
+        elapsed = time.perf_counter() - start
+        upstream = self.fake.stats["search"] + self.fake.stats["iiif"]
+        return summarize(timings, queries, errors, upstream, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app against a fake AIC API")
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=10, help="requests per user per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="default: %(default)s")
+    parser.add_argument("--database-url", help="a scratch database; it is emptied (default: a temporary SQLite file)")
+    parser.add_argument("--json", default=os.path.join(RESULTS_DIR, "latest.json"), help="default: %(default)s")
+    parser.add_argument("--baseline", help="results JSON to compare against; exits 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    fake = from_arguments(args)
+    server = serve(fake)
+    #app settings have to be in place before it's imported; local state goes in a scratch directory
+    work_dir = tempfile.mkdtemp(prefix="aic-bench-")
+    os.environ.update(app_env(server))
+    os.environ["SQLALCHEMY_DATABASE_URI"] = args.database_url or f"sqlite:///{work_dir}/bench.db"
+    os.environ["AIC_RATE_STATE_PATH"] = os.path.join(work_dir, "aic_rate.sqlite3")
+    os.environ["IMAGE_STORE_DIR"] = os.path.join(work_dir, "images")
+    os.environ["IMAGE_QUEUE_PATH"] = os.path.join(work_dir, "image_jobs.sqlite3")
+    os.environ.setdefault("SECRET_KEY", "bench")
+    from app import app
+
+    bench = Bench(app, fake, args.users)
+    print(f"catalog synced in {bench.sync_catalog():.1f}s ({len(fake.artworks)} artworks upstream)")
+    results = {scenario: bench.run(scenario, args.requests) for scenario in scenarios}
+    print_table(results)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f)['results'], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#The local artwork catalog. Artworks are synced from the API ahead of time and
+#filed under a century, so the profile and surprise pages only ever read from the db.
+#Each sync starts at a random page among the century's search results (as many as the API will page
+#through), so the partitions keep growing past what users have already rated instead of re-saving the
+#same first hits.
+
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import func
+from models import db, Artwork, Favorite, NotFavorite
+from centuries import CenturyCache
+from api_requests import APIRequests
+from surprise_pools import SurprisePools
+
+try:
+    import fcntl
+except ImportError:
+    #no flock (e.g. Windows): every worker's sync thread runs
+    fcntl = None
+
+
+class ArtworkCatalog:
+    #how many artworks each century partition should hold after a sync
+    SYNC_TARGET = 500
+
+    #century id -> how many pages of search results it had at the last count
+    _result_pages = {}
+
+    @classmethod
+    def sync_century(cls, century):
+        """Pull artworks for `century` from the API into its catalog partition.
+        Returns the number of artworks saved"""
+        saved_artworks, error = APIRequests.collect_artworks(century.century_name, cls.SYNC_TARGET,
+                                                             century_id=century.id,
+                                                             start_page=cls.start_page(century))
+        if error:
+            logging.warning(f"Catalog sync for {century.century_name} stopped early: {error}")
+        SurprisePools.invalidate(century.id)
+        return len(saved_artworks)
+
+    @classmethod
+    def start_page(cls, century):
+        """A random page to start a sync from, leaving enough pages after it to reach SYNC_TARGET.
+        The century's results are counted each time; the last count is used if the API can't be asked"""
+        total = APIRequests.count_results(century.century_name)
+        if total is not None:
+            cls._result_pages[century.id] = min(-(-total // APIRequests.PAGE_LIMIT), APIRequests.MAX_PAGES)
+        pages = cls._result_pages.get(century.id, 1)
+        needed = -(-cls.SYNC_TARGET // APIRequests.PAGE_LIMIT)
+        return random.randint(1, max(1, pages - needed + 1))
+
+    @classmethod
+    def sync_all(cls):
+        """Sync every century the app knows how to filter on"""
+        synced = {}
+        for century in CenturyCache.all():
+            if century.century_name in APIRequests.century_dates:
+                synced[century.century_name] = cls.sync_century(century)
+        return synced
+
+    @classmethod
+    def start_sync_thread(cls, app, interval):
+        """Keep the catalog fresh by re-syncing every `interval` seconds on a daemon thread.
+        Every worker starts one, but only the worker holding the sync lock file syncs each round"""
+        lock_path = os.path.join(app.instance_path, "catalog_sync.lock")
+        def run():
+            while True:
+                try:
+                    with cls._sync_lock(lock_path) as locked:
+                        if locked:
+                            with app.app_context():
+                                cls.sync_all()
+                except Exception as e:
+                    logging.error(f"Catalog sync failed: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name="catalog-sync", daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    @contextmanager
+    def _sync_lock(cls, path):
+        """Try to take the lock file at `path` without waiting. Yields whether this worker got it"""
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @classmethod
+    def sample(cls, century_id, user_id, limit=1, skip=None):
+        """Random artworks from a century partition that the user hasn't rated yet.
+        `skip` is an optional select of further artwork ids to leave out"""
+        rated = (db.select(Favorite.artwork_id).where(Favorite.user_id == user_id)
+                 .union(db.select(NotFavorite.artwork_id).where(NotFavorite.user_id == user_id)))
+        query = Artwork.query.filter(Artwork.century_id == century_id, Artwork.id.notin_(rated))
+        if skip is not None:
+            query = query.filter(Artwork.id.notin_(skip))
+        return (query
+                .order_by(func.random())
+                .limit(limit)
+                .all())
+
+    @classmethod
+    def get_artworks(cls, user, limit=1):
+        """Artworks from the user's own century"""
+        return cls.sample(user.century_id, user.id, limit=limit)
+
+    @classmethod
+    def surprise_me(cls, user, limit=1):
+        """Artworks from a randomly selected unchosen century, taken from its shared surprise pool.
+        Falls back to sampling the catalog when the user has rated everything pooled.
+        Returns (artworks, century_name)"""
+        unchosen_centuries = [c for c in CenturyCache.all()
+                              if c.id != user.century_id and c.century_name in APIRequests.century_dates]
+        if not unchosen_centuries:
+            return [], None
+
+        random_century = random.choice(unchosen_centuries)
+        artworks = (SurprisePools.sample(random_century.id, user.id, limit=limit)
+                    or cls.sample(random_century.id, user.id, limit=limit))
+        return artworks, random_century.century_name
@@ -0,0 +1,73 @@
+#In-process cache of the Century reference table.
+#Centuries are a handful of rows that almost never change, so they are read once and kept as plain
+#tuples. Any insert, update or delete of a Century (including bulk deletes and dropping the table)
+#clears the cache, and the next read loads it again.
+
+import threading
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Century, dialect_insert
+
+CenturyRef = namedtuple("CenturyRef", ["id", "century_name"])
+
+
+class CenturyCache:
+    _centuries = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def all(cls):
+        """Every century, ordered by id"""
+        centuries = cls._centuries
+        if centuries is None:
+            with cls._lock:
+                if cls._centuries is None:
+                    cls._centuries = tuple(CenturyRef(c.id, c.century_name)
+                                           for c in Century.query.order_by(Century.id))
+                centuries = cls._centuries
+        return centuries
+
+    @classmethod
+    def get(cls, century_id):
+        return next((c for c in cls.all() if c.id == century_id), None)
+
+    @classmethod
+    def name(cls, century_id):
+        """The century's name, or None if there's no such century"""
+        century = cls.get(century_id)
+        return century.century_name if century else None
+
+    @classmethod
+    def choices(cls, order_by="id"):
+        """(id, name) pairs for a SelectField"""
+        return [(c.id, c.century_name) for c in sorted(cls.all(), key=lambda c: getattr(c, order_by))]
+
+    @classmethod
+    def invalidate(cls, *args, **kwargs):
+        """Forget the cached rows. Takes any arguments so it can be used as an event listener"""
+        with cls._lock:
+            cls._centuries = None
+
+    @classmethod
+    def seed(cls, century_names):
+        """Add any of `century_names` that aren't in the table yet. Safe to run on every start"""
+        db.session.execute(dialect_insert(Century)
+                           .values([{"century_name": name} for name in century_names])
+                           .on_conflict_do_nothing(index_elements=["century_name"]))
+        db.session.commit()
+        cls.invalidate()
+
+
+for event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Century, event_name, CenturyCache.invalidate)
+for event_name in ("after_create", "after_drop"):
+    event.listen(Century.__table__, event_name, CenturyCache.invalidate)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def invalidate_on_bulk_write(orm_execute_state):
+    """Bulk inserts, updates and deletes (e.g. Century.query.delete()) skip the mapper events"""
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and any(mapper.class_ is Century for mapper in orm_execute_state.all_mappers):
+        CenturyCache.invalidate()
@@ -0,0 +1,131 @@
+#App settings, read from the environment (and .env).
+#APP_ENV picks the profile: development (the default) installs the debug toolbar, testing is for the
+#test suite, and production leaves out the toolbar and SQL echo and sizes the db connection pool.
+
+import atexit
+import os
+import shutil
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for production: connections are checked before use and, on Postgres,
+    pooled per DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_RECYCLE with a DB_STATEMENT_TIMEOUT (ms)"""
+    options = {"pool_pre_ping": True}
+    if database_uri and database_uri.startswith("postgres"):
+        options["pool_size"] = int(os.getenv("DB_POOL_SIZE", 5))
+        options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", 10))
+        options["pool_recycle"] = int(os.getenv("DB_POOL_RECYCLE", 1800))
+        statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT", 15000))
+        if statement_timeout:
+            options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI")
+    SECRET_KEY = os.getenv("SECRET_KEY")
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    #set SQLALCHEMY_ECHO to log every statement; per-request counts and timings are always on (see instrumentation.py)
+    SQLALCHEMY_ECHO = os.getenv("SQLALCHEMY_ECHO", "") not in ("", "0")
+    DEBUG_TOOLBAR = False
+    #build missing tables at startup instead of through migrations; only the testing profile does
+    CREATE_TABLES = False
+    #log one JSON line per request with its db, AIC API and template timings
+    REQUEST_LOG = os.getenv("REQUEST_LOG", "") not in ("", "0")
+    #seconds between background catalog syncs; 0 leaves syncing to `flask sync-catalog`
+    CATALOG_SYNC_INTERVAL = int(os.getenv("CATALOG_SYNC_INTERVAL", 0))
+    #upstream endpoints; only changed to point the app at a stand-in such as bench/fake_aic.py
+    AIC_API_URL = os.getenv("AIC_API_URL")
+    AIC_IIIF_URL = os.getenv("AIC_IIIF_URL")
+    #pooled HTTP client settings for the AIC API (timeouts in seconds)
+    AIC_POOL_SIZE = int(os.getenv("AIC_POOL_SIZE", 10))
+    AIC_CONNECT_TIMEOUT = float(os.getenv("AIC_CONNECT_TIMEOUT", 3.05))
+    AIC_READ_TIMEOUT = float(os.getenv("AIC_READ_TIMEOUT", 10))
+    AIC_MAX_RETRIES = int(os.getenv("AIC_MAX_RETRIES", 3))
+    #fetch catalog search pages on one asyncio event loop (needs httpx) instead of a thread per page
+    AIC_ASYNC_PAGES = os.getenv("AIC_ASYNC_PAGES", "") not in ("", "0")
+    AIC_ASYNC_CONNECTIONS = int(os.getenv("AIC_ASYNC_CONNECTIONS", 100))
+    #search page cache: entries live PAGE_CACHE_TTL seconds; PAGE_CACHE_PATH shares them across workers
+    PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 600))
+    PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", 256))
+    PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH")
+    #identical in-flight page fetches are always shared within a process; with a lock directory
+    #(and a shared PAGE_CACHE_PATH) they're shared across workers too
+    SINGLE_FLIGHT_LOCK_DIR = os.getenv("SINGLE_FLIGHT_LOCK_DIR")
+    #all workers on the host share one AIC request budget, kept in AIC_RATE_STATE_PATH
+    AIC_RATE_PER_MINUTE = int(os.getenv("AIC_RATE_PER_MINUTE", 60))
+    AIC_RATE_BURST = int(os.getenv("AIC_RATE_BURST", 60))
+    AIC_RATE_STATE_PATH = os.getenv("AIC_RATE_STATE_PATH")
+    #after AIC_BREAKER_FAILURES failed calls in a row the API is left alone for AIC_BREAKER_RESET seconds
+    AIC_BREAKER_FAILURES = int(os.getenv("AIC_BREAKER_FAILURES", 5))
+    AIC_BREAKER_RESET = int(os.getenv("AIC_BREAKER_RESET", 30))
+    #expired search pages are kept this long to be served while the breaker is open
+    PAGE_CACHE_STALE_TTL = int(os.getenv("PAGE_CACHE_STALE_TTL", 24 * 60 * 60))
+    #favorited images are downloaded by IMAGE_WORKERS background threads from a queue at IMAGE_QUEUE_PATH
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+    IMAGE_QUEUE_PATH = os.getenv("IMAGE_QUEUE_PATH")
+    #seconds before a failed download is retried, doubling with each attempt
+    IMAGE_RETRY_BACKOFF = float(os.getenv("IMAGE_RETRY_BACKOFF", 2))
+    #downloaded images are kept under IMAGE_STORE_DIR, up to IMAGE_STORE_MAX_BYTES on disk
+    IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR")
+    IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", 1024 ** 3))
+    #each user's profile queue is refilled with RECOMMENDATION_BATCH artworks once it drops below RECOMMENDATION_LOW_WATER
+    RECOMMENDATION_LOW_WATER = int(os.getenv("RECOMMENDATION_LOW_WATER", 5))
+    RECOMMENDATION_BATCH = int(os.getenv("RECOMMENDATION_BATCH", 25))
+    #surprise pages sample from a shared pool of SURPRISE_POOL_SIZE artworks per century, rebuilt every SURPRISE_POOL_TTL seconds
+    SURPRISE_POOL_SIZE = int(os.getenv("SURPRISE_POOL_SIZE", 200))
+    SURPRISE_POOL_TTL = int(os.getenv("SURPRISE_POOL_TTL", 300))
+    #seconds a logged in user's row is reused across requests; 0 loads it on every request that reads g.user
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 0))
+
+
+class DevelopmentConfig(Config):
+    DEBUG_TOOLBAR = True
+    DEBUG_TB_INTERCEPT_REDIRECTS = False
+
+
+#only created once the testing profile's app starts using it
+TEST_STATE_DIR = os.path.join(tempfile.gettempdir(), f"aic_discovery_tests_{os.getpid()}")
+atexit.register(shutil.rmtree, TEST_STATE_DIR, ignore_errors=True)
+
+
+class TestingConfig(Config):
+    TESTING = True
+    CREATE_TABLES = True
+    SQLALCHEMY_ECHO = False
+    #an in-memory SQLite db unless TEST_DATABASE_URL points somewhere else
+    SQLALCHEMY_DATABASE_URI = os.getenv("TEST_DATABASE_URL", "sqlite://")
+    #cheap password hashes keep signup/login tests fast
+    BCRYPT_LOG_ROUNDS = 4
+    #a fixed key so the suite runs on a clean checkout, without a .env
+    SECRET_KEY = "testing"
+    #the rate limit bucket, image queue and image store go in a scratch directory for this run (removed
+    #when it exits), never the checkout's instance/ and static/ folders or a dev server's files
+    AIC_RATE_STATE_PATH = os.path.join(TEST_STATE_DIR, "aic_rate.sqlite3")
+    IMAGE_QUEUE_PATH = os.path.join(TEST_STATE_DIR, "image_jobs.sqlite3")
+    IMAGE_STORE_INDEX = os.path.join(TEST_STATE_DIR, "image_store.sqlite3")
+    IMAGE_STORE_DIR = os.path.join(TEST_STATE_DIR, "images")
+
+
+class ProductionConfig(Config):
+    SQLALCHEMY_ECHO = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(Config.SQLALCHEMY_DATABASE_URI)
+
+
+CONFIGS = {
+    "development": DevelopmentConfig,
+    "testing": TestingConfig,
+    "production": ProductionConfig,
+}
+
+
+def config_for(name=None):
+    """The config class for `name`, or for APP_ENV when no name is given"""
+    name = name or os.getenv("APP_ENV") or "development"
+    if name not in CONFIGS:
+        raise ValueError(f"Unknown APP_ENV {name!r}; expected one of {', '.join(CONFIGS)}")
+    return CONFIGS[name]
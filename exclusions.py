@@ -0,0 +1,86 @@
+#A compact, per-user record of the artworks they've rated (favorited or disliked).
+#It is kept up to date as users rate artwork and is checked locally against candidate
+#artworks, instead of loading every Favorite/NotFavorite row and shipping the ids to the API.
+
+from array import array
+from bisect import bisect_left
+from models import db, Favorite, NotFavorite, UserExclusion, dialect_insert
+
+
+class ExclusionSet:
+    """Sorted, de-duplicated artwork ids (4 bytes each) with O(log n) membership checks"""
+    def __init__(self, artwork_ids=()):
+        self.ids = array('I', sorted(set(artwork_ids)))
+
+    @classmethod
+    def from_bytes(cls, data):
+        exclusions = cls()
+        exclusions.ids.frombytes(data)
+        return exclusions
+
+    def to_bytes(self):
+        return self.ids.tobytes()
+
+    def __contains__(self, artwork_id):
+        i = bisect_left(self.ids, artwork_id)
+        return i < len(self.ids) and self.ids[i] == artwork_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def add(self, artwork_id):
+        i = bisect_left(self.ids, artwork_id)
+        if i == len(self.ids) or self.ids[i] != artwork_id:
+            self.ids.insert(i, artwork_id)
+
+    def discard(self, artwork_id):
+        i = bisect_left(self.ids, artwork_id)
+        if i < len(self.ids) and self.ids[i] == artwork_id:
+            del self.ids[i]
+
+
+class ExcludedArtworks:
+    @classmethod
+    def load(cls, user_id):
+        """The user's exclusions, built from their ratings the first time they're needed"""
+        row = db.session.get(UserExclusion, user_id)
+        if row is None:
+            cls._backfill(user_id)
+            db.session.commit()
+            row = db.session.get(UserExclusion, user_id)
+        return ExclusionSet.from_bytes(row.artwork_ids)
+
+    @classmethod
+    def add(cls, user_id, artwork_id):
+        """Record a newly rated artwork. Committed together with the rating by the caller"""
+        cls._update(user_id, lambda exclusions: exclusions.add(int(artwork_id)))
+
+    @classmethod
+    def remove(cls, user_id, artwork_id):
+        """Forget an artwork the user no longer rates. Committed together with the rating by the caller"""
+        cls._update(user_id, lambda exclusions: exclusions.discard(int(artwork_id)))
+
+    @classmethod
+    def _update(cls, user_id, change):
+        row = db.session.get(UserExclusion, user_id, with_for_update=True)
+        if row is None:
+            #there's no row to lock until one exists
+            cls._backfill(user_id)
+            row = db.session.get(UserExclusion, user_id, with_for_update=True, populate_existing=True)
+        exclusions = ExclusionSet.from_bytes(row.artwork_ids)
+        change(exclusions)
+        row.artwork_ids = exclusions.to_bytes()
+
+    @classmethod
+    def _backfill(cls, user_id):
+        """Build the exclusion row from the user's existing favorites and dislikes.
+        A concurrent request may get there first, in which case its row is kept"""
+        artwork_ids = db.session.scalars(
+            db.select(Favorite.artwork_id).where(Favorite.user_id == user_id)
+            .union(db.select(NotFavorite.artwork_id).where(NotFavorite.user_id == user_id))).all()
+        db.session.execute(dialect_insert(UserExclusion)
+                           .values(user_id=user_id, artwork_ids=ExclusionSet(artwork_ids).to_bytes())
+                           .on_conflict_do_nothing(index_elements=["user_id"]))
@@ -1,16 +1,45 @@
-from models import Artwork, Favorite, NotFavorite, db
-from artwork import SaveArtwork
+from models import Artwork, Artist, Favorite, NotFavorite, db, dialect_insert
+from image_jobs import ImageDownloads
+from image_store import ImageStore
+from exclusions import ExcludedArtworks
+from recommendations import Recommendations
 import logging
 
 # Setup basic configuration for logging
 logging.basicConfig(level=logging.INFO)
 
-save_image = SaveArtwork.save_image_file
+enqueue_image = ImageDownloads.enqueue
 
 class ArtworkFavorites:
     NO_USER = 403
     NO_ARTWORK = 404
     NO_ARTIST_ID = 400
+    #favorites shown per page of the favorites list
+    PAGE_SIZE = 24
+
+    @classmethod
+    def favorites_page(cls, user_id, after=None, limit=None):
+        """One page of the user's favorites, oldest first, with only the columns the favorites page shows.
+        Pages are keyed by favorite id: pass the returned cursor as `after` for the next page.
+        Returns (favorites, cursor), where cursor is None on the last page"""
+        limit = limit or cls.PAGE_SIZE
+        query = (db.select(Favorite.id.label("favorite_id"), Artwork.id, Artwork.title, Artwork.image_id,
+                           Artwork.image_url, Artwork.date_start, Artwork.date_end, Artist.artist_title)
+                 .join(Artwork, Favorite.artwork_id == Artwork.id)
+                 .join(Artist, Artwork.artist_id == Artist.id)
+                 .where(Favorite.user_id == user_id)
+                 .order_by(Favorite.id)
+                 .limit(limit + 1))
+        if after is not None:
+            query = query.where(Favorite.id > after)
+
+        favorites = db.session.execute(query).all()
+        #the extra row only tells us whether there's another page
+        if len(favorites) > limit:
+            favorites = favorites[:limit]
+            return favorites, favorites[-1].favorite_id
+        return favorites, None
+
     @classmethod
     def fav_artwork(cls, user, artwork_id):
         """Favorites artwork for a user"""
@@ -26,22 +55,22 @@ class ArtworkFavorites:
         if not artwork.artist_id:
             return cls.NO_ARTIST_ID
 
-        existing_favorite = Favorite.query.filter_by(
-            user_id=user.id, artwork_id=artwork_id, artist_id=artwork.artist_id).first()
-        if existing_favorite:
-           return 200
-        
-        new_favorite = Favorite(user_id=user.id, artwork_id=artwork_id, artist_id=artwork.artist_id)
-        db.session.add(new_favorite)
+        if not cls._insert_rating(Favorite, user, artwork):
+            return 200
+
+        ExcludedArtworks.add(user.id, artwork.id)
+        Recommendations.discard(user.id, artwork.id)
         db.session.commit()
         
 
-        #save artwork image
+        #queue every size of the artwork image for download in the background
         if artwork.image_url and artwork.image_id:
             try:
-                save_image(artwork.image_url, artwork.image_id, artwork.title)
+                for width in ImageStore.SIZES.values():
+                    enqueue_image(artwork.image_id, ImageStore.iiif_url(artwork.image_id, width), width)
             except Exception as e:
-                return 201
+                logging.error(f"Queueing image {artwork.image_id} failed: {e}")
+        return 201
     
 
     @classmethod
@@ -58,16 +87,24 @@ class ArtworkFavorites:
         if not artwork.artist_id:
             return cls.NO_ARTIST_ID
 
-        existing_not_favorite = NotFavorite.query.filter_by(user_id=user.id, artwork_id=artwork_id, artist_id=artwork.artist_id).first()
-        if existing_not_favorite:
+        # If it's not already disliked, create a new NotFavorite
+        if not cls._insert_rating(NotFavorite, user, artwork):
             return 200
 
-        # If it's not already disliked, create a new NotFavorite
-        new_not_favorite = NotFavorite(user_id=user.id, artwork_id=artwork_id, artist_id=artwork.artist_id)
-        db.session.add(new_not_favorite)
+        ExcludedArtworks.add(user.id, artwork.id)
+        Recommendations.discard(user.id, artwork.id)
         db.session.commit()
         return 201
         
+    @classmethod
+    def _insert_rating(cls, model, user, artwork):
+        """Add a Favorite or NotFavorite row unless the user already has one for the artwork.
+        Returns whether a row was added"""
+        result = db.session.execute(dialect_insert(model)
+                                    .values(user_id=user.id, artwork_id=artwork.id, artist_id=artwork.artist_id)
+                                    .on_conflict_do_nothing(index_elements=["user_id", "artwork_id"]))
+        return bool(result.rowcount)
+
     @classmethod
     def unfavorite_artwork(cls, user, artwork_id):
         """Removes an artwork from the user's favorites."""
@@ -81,6 +118,9 @@ class ArtworkFavorites:
             return cls.NO_ARTWORK
 
         db.session.delete(favorite)
+        #a disliked artwork stays excluded
+        if not NotFavorite.query.filter_by(user_id=user.id, artwork_id=artwork_id).first():
+            ExcludedArtworks.remove(user.id, artwork_id)
         db.session.commit()
      
         return 200
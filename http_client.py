@@ -0,0 +1,112 @@
+#One pooled, keep-alive HTTP session per process for talking to the AIC API and IIIF image server.
+#Calls get connect/read timeouts and retry with exponential backoff on 429/5xx, honoring Retry-After.
+#requests is only imported when the first session is built, so importing the app stays cheap.
+
+import os
+import threading
+import time
+from instrumentation import Instrumentation
+
+
+class AICClient:
+    POOL_SIZE = 10
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 10
+    MAX_RETRIES = 3
+    BACKOFF_FACTOR = 0.5
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    _session = None
+    _pid = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        """Read the client settings from the app config"""
+        cls.POOL_SIZE = app.config.get("AIC_POOL_SIZE", cls.POOL_SIZE)
+        cls.CONNECT_TIMEOUT = app.config.get("AIC_CONNECT_TIMEOUT", cls.CONNECT_TIMEOUT)
+        cls.READ_TIMEOUT = app.config.get("AIC_READ_TIMEOUT", cls.READ_TIMEOUT)
+        cls.MAX_RETRIES = app.config.get("AIC_MAX_RETRIES", cls.MAX_RETRIES)
+        cls.reset()
+
+    @classmethod
+    def reset(cls):
+        """Drop the current session so the next call builds one with fresh settings"""
+        with cls._lock:
+            if cls._session is not None:
+                cls._session.close()
+            cls._session = None
+            cls._pid = None
+
+    @classmethod
+    def session(cls):
+        """The shared session for this process.
+        A forked worker (e.g. under gunicorn) builds its own instead of sharing the parent's sockets"""
+        if cls._session is None or cls._pid != os.getpid():
+            with cls._lock:
+                if cls._session is None or cls._pid != os.getpid():
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    from urllib3.util.retry import Retry
+                    retry = Retry(total=cls.MAX_RETRIES,
+                                  backoff_factor=cls.BACKOFF_FACTOR,
+                                  status_forcelist=cls.RETRY_STATUSES,
+                                  #searches are POSTed but are read-only, so they're safe to retry
+                                  allowed_methods=frozenset({"GET", "POST"}),
+                                  respect_retry_after_header=True,
+                                  #hand the last response back so callers can report its status code
+                                  raise_on_status=False)
+                    adapter = HTTPAdapter(pool_connections=cls.POOL_SIZE, pool_maxsize=cls.POOL_SIZE,
+                                          max_retries=retry)
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    cls._session = session
+                    cls._pid = os.getpid()
+        return cls._session
+
+    @classmethod
+    def errors(cls):
+        """What a call raises when it never got a response, for use in `except`"""
+        import requests
+        return requests.RequestException
+
+    @classmethod
+    def request(cls, method, url, **kwargs):
+        """Send a request through the shared session with the default timeouts"""
+        kwargs.setdefault("timeout", (cls.CONNECT_TIMEOUT, cls.READ_TIMEOUT))
+        started = time.perf_counter()
+        response = cls.session().request(method, url, **kwargs)
+        #streamed bodies haven't been read yet, so go by their Content-Length
+        size = (int(response.headers.get("Content-Length") or 0) if kwargs.get("stream")
+                else len(response.content or b""))
+        Instrumentation.record_upstream(started, size)
+        return response
+
+    @classmethod
+    def get(cls, url, **kwargs):
+        return cls.request("GET", url, **kwargs)
+
+    @classmethod
+    def post(cls, url, **kwargs):
+        return cls.request("POST", url, **kwargs)
+
+    @classmethod
+    def metrics(cls):
+        """Connection pool usage for this process: requests sent, connections opened,
+        and how many requests reused an already open connection"""
+        requests_sent = connections_opened = 0
+        session = cls._session
+        if session is not None and cls._pid == os.getpid():
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        requests_sent += pool.num_requests
+                        connections_opened += pool.num_connections
+        return {
+            "requests": requests_sent,
+            "connections": connections_opened,
+            "reused": requests_sent - connections_opened,
+        }
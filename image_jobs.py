@@ -0,0 +1,109 @@
+#Background downloads of favorited artwork images into the ImageStore.
+#Favoriting only records a job in a local SQLite queue; a small thread pool does the download.
+#Jobs stay in the queue until they finish, so anything cut short by a restart is picked up again.
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from local_state import connect
+from image_store import ImageStore
+
+
+class ImageDownloads:
+    WORKERS = 2
+    MAX_ATTEMPTS = 3
+    #seconds to wait before the second attempt, doubled before each one after that
+    RETRY_BACKOFF = 2
+    #a running job whose worker hasn't finished within this many seconds is considered abandoned
+    LEASE_SECONDS = 300
+    QUEUE_PATH = None
+
+    _executor = None
+
+    @classmethod
+    def init_app(cls, app):
+        """Set up the queue next to the app and resume any jobs left over from the last run"""
+        cls.WORKERS = app.config.get("IMAGE_WORKERS", cls.WORKERS)
+        cls.RETRY_BACKOFF = app.config.get("IMAGE_RETRY_BACKOFF", cls.RETRY_BACKOFF)
+        cls.QUEUE_PATH = app.config.get("IMAGE_QUEUE_PATH") or os.path.join(app.instance_path, "image_jobs.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(cls.QUEUE_PATH)), exist_ok=True)
+
+        with closing(connect(cls.QUEUE_PATH)) as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS image_jobs (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                image_id TEXT NOT NULL,
+                                width INTEGER NOT NULL,
+                                image_url TEXT NOT NULL,
+                                status TEXT NOT NULL DEFAULT 'pending',
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                claimed_at REAL,
+                                UNIQUE (image_id, width))""")
+
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False)
+        cls._executor = ThreadPoolExecutor(max_workers=cls.WORKERS, thread_name_prefix="image-download")
+        return cls.resume()
+
+    @classmethod
+    def enqueue(cls, image_id, image_url, width=843):
+        """Queue an image download and hand it to a worker. A job that failed before is queued again.
+        Returns the worker's future, or None if the image is already stored or queued"""
+        if ImageStore.has(image_id, width):
+            return None
+        with closing(connect(cls.QUEUE_PATH)) as conn:
+            job = conn.execute("""INSERT INTO image_jobs (image_id, width, image_url) VALUES (?, ?, ?)
+                                  ON CONFLICT (image_id, width) DO UPDATE
+                                  SET status = 'pending', attempts = 0, image_url = excluded.image_url
+                                  WHERE status = 'failed'
+                                  RETURNING id""", (image_id, width, image_url)).fetchone()
+        if job is None:
+            return None
+        return cls._executor.submit(cls.run, job[0])
+
+    @classmethod
+    def resume(cls):
+        """Hand every unfinished job back to the workers. Returns their futures"""
+        with closing(connect(cls.QUEUE_PATH)) as conn:
+            job_ids = [row[0] for row in conn.execute("SELECT id FROM image_jobs WHERE status != 'failed'")]
+        return [cls._executor.submit(cls.run, job_id) for job_id in job_ids]
+
+    @classmethod
+    def run(cls, job_id):
+        """Download one queued image. Returns True if this worker completed the job"""
+        now = time.time()
+        with closing(connect(cls.QUEUE_PATH)) as conn:
+            #claim the job so other workers and processes leave it alone
+            claimed = conn.execute("""UPDATE image_jobs SET status = 'running', claimed_at = ?, attempts = attempts + 1
+                                      WHERE id = ? AND (status = 'pending' OR (status = 'running' AND claimed_at < ?))""",
+                                   (now, job_id, now - cls.LEASE_SECONDS)).rowcount
+            if not claimed:
+                return False
+            image_id, width, image_url, attempts = conn.execute(
+                "SELECT image_id, width, image_url, attempts FROM image_jobs WHERE id = ?", (job_id,)).fetchone()
+
+        #retry on this worker, backing off between attempts, until the image is saved or the job runs out of attempts
+        while not cls._fetch(image_id, image_url, width):
+            logging.error(f"Image download {image_id} failed (attempt {attempts})")
+            if attempts >= cls.MAX_ATTEMPTS:
+                with closing(connect(cls.QUEUE_PATH)) as conn:
+                    conn.execute("UPDATE image_jobs SET status = 'failed' WHERE id = ?", (job_id,))
+                return False
+            time.sleep(cls.RETRY_BACKOFF * 2 ** (attempts - 1))
+            attempts += 1
+            with closing(connect(cls.QUEUE_PATH)) as conn:
+                conn.execute("UPDATE image_jobs SET attempts = ?, claimed_at = ? WHERE id = ?",
+                             (attempts, time.time(), job_id))
+
+        with closing(connect(cls.QUEUE_PATH)) as conn:
+            conn.execute("DELETE FROM image_jobs WHERE id = ?", (job_id,))
+        return True
+
+    @classmethod
+    def _fetch(cls, image_id, image_url, width):
+        try:
+            return ImageStore.fetch(image_id, image_url, width)
+        except Exception as e:
+            logging.error(f"Image download {image_id} raised: {e}")
+            return False
@@ -0,0 +1,177 @@
+#Local store for artwork images, addressed by their IIIF image_id and width.
+#Files are sharded into subdirectories by the first characters of the id, and a SQLite index keeps
+#each file's size and last access. Once the store grows past IMAGE_STORE_MAX_BYTES, the least
+#recently used images that nobody has favorited any more are evicted.
+
+import os
+import re
+import tempfile
+import time
+from contextlib import closing
+from local_state import connect
+from http_client import AICClient
+from models import db, Artwork, Favorite
+
+#a file saved by the old download code: the title with spaces as underscores, then the IIIF image id
+LEGACY_NAME = re.compile(r".+_([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})\.jpg")
+
+
+class ImageStore:
+    IIIF_URL = "https://www.artic.edu/iiif/2/{image_id}/full/{width},/0/default.jpg"
+    #IIIF widths for each place an image is shown: grid thumbnails and the large single view
+    SIZES = {"thumb": 400, "hero": 843}
+    ROOT = None
+    INDEX_PATH = None
+    MAX_BYTES = 1024 ** 3
+    CHUNK_SIZE = 64 * 1024
+    #an image's last access is only written again once it's older than this many seconds,
+    #so serving an image is normally a read of the index rather than a write
+    TOUCH_INTERVAL = 60 * 60
+
+    _app = None
+
+    @classmethod
+    def init_app(cls, app):
+        """Set up the store directory and its index"""
+        cls._app = app
+        cls.IIIF_URL = app.config.get("AIC_IIIF_URL") or cls.IIIF_URL
+        cls.ROOT = app.config.get("IMAGE_STORE_DIR") or os.path.join(app.static_folder, "images", "store")
+        cls.INDEX_PATH = app.config.get("IMAGE_STORE_INDEX") or os.path.join(app.instance_path, "image_store.sqlite3")
+        cls.MAX_BYTES = app.config.get("IMAGE_STORE_MAX_BYTES", cls.MAX_BYTES)
+        os.makedirs(cls.ROOT, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(cls.INDEX_PATH)), exist_ok=True)
+        with closing(connect(cls.INDEX_PATH)) as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS images (
+                                image_id TEXT NOT NULL,
+                                width INTEGER NOT NULL,
+                                size INTEGER NOT NULL,
+                                last_access REAL NOT NULL,
+                                PRIMARY KEY (image_id, width))""")
+            conn.execute("CREATE INDEX IF NOT EXISTS images_last_access ON images (last_access)")
+
+    @classmethod
+    def iiif_url(cls, image_id, width=843):
+        """The AIC image server URL for the image scaled to `width` pixels"""
+        return cls.IIIF_URL.format(image_id=image_id, width=width)
+
+    @classmethod
+    def path_for(cls, image_id, width=843):
+        """Where the image lives on disk, e.g. ROOT/2d/2d484387-..._843.jpg"""
+        if not image_id or not re.fullmatch(r"[\w-]+", image_id):
+            raise ValueError(f"Invalid image id: {image_id!r}")
+        return os.path.join(cls.ROOT, image_id[:2], f"{image_id}_{int(width)}.jpg")
+
+    @classmethod
+    def has(cls, image_id, width=843):
+        """Whether the image is in the store; a hit counts as an access for eviction purposes"""
+        now = time.time()
+        with closing(connect(cls.INDEX_PATH)) as conn:
+            row = conn.execute("SELECT last_access FROM images WHERE image_id = ? AND width = ?",
+                               (image_id, width)).fetchone()
+            if row is None:
+                return False
+            if row[0] < now - cls.TOUCH_INTERVAL:
+                conn.execute("UPDATE images SET last_access = ? WHERE image_id = ? AND width = ? AND last_access < ?",
+                             (now, image_id, width, now - cls.TOUCH_INTERVAL))
+        return os.path.exists(cls.path_for(image_id, width))
+
+    @classmethod
+    def fetch(cls, image_id, image_url, width=843):
+        """Make sure the image is in the store, downloading it only if it isn't already.
+        Returns True once the image is on disk"""
+        if cls.has(image_id, width):
+            return True
+
+        image_path = cls.path_for(image_id, width)
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        res = AICClient.get(image_url, stream=True)
+        try:
+            if res.status_code != 200:
+                return False
+            #stream to a temp file next to the destination, then swap it in so a
+            #half-written image is never served
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(image_path), suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as image_file:
+                    for chunk in res.iter_content(chunk_size=cls.CHUNK_SIZE):
+                        image_file.write(chunk)
+                os.replace(tmp_path, image_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        finally:
+            res.close()
+
+        with closing(connect(cls.INDEX_PATH)) as conn:
+            conn.execute("INSERT OR REPLACE INTO images (image_id, width, size, last_access) VALUES (?, ?, ?, ?)",
+                         (image_id, width, os.path.getsize(image_path), time.time()))
+        cls.evict()
+        return True
+
+    @classmethod
+    def import_legacy(cls, directory, width=843):
+        """Move images saved by the old download code (<title>_<image_id>.jpg, 843 pixels wide, straight
+        into `directory`) into the store, so they're indexed and can be served and evicted like any other.
+        Copies the store already has are deleted. Other files are left alone. Returns how many were imported"""
+        imported = 0
+        for name in sorted(os.listdir(directory)):
+            match = LEGACY_NAME.fullmatch(name)
+            legacy_path = os.path.join(directory, name)
+            if not match or not os.path.isfile(legacy_path):
+                continue
+            image_id = match.group(1)
+            if cls.has(image_id, width):
+                os.remove(legacy_path)
+                continue
+            image_path = cls.path_for(image_id, width)
+            os.makedirs(os.path.dirname(image_path), exist_ok=True)
+            os.replace(legacy_path, image_path)
+            with closing(connect(cls.INDEX_PATH)) as conn:
+                conn.execute("INSERT OR REPLACE INTO images (image_id, width, size, last_access) VALUES (?, ?, ?, ?)",
+                             (image_id, width, os.path.getsize(image_path), time.time()))
+            imported += 1
+        cls.evict()
+        return imported
+
+    @classmethod
+    def total_bytes(cls):
+        with closing(connect(cls.INDEX_PATH)) as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+
+    @classmethod
+    def evict(cls):
+        """Remove least recently used, unfavorited images until the store fits in MAX_BYTES.
+        Returns the evicted (image_id, width) pairs"""
+        total = cls.total_bytes()
+        if total <= cls.MAX_BYTES:
+            return []
+
+        with closing(connect(cls.INDEX_PATH)) as conn:
+            rows = conn.execute("SELECT image_id, width, size FROM images ORDER BY last_access").fetchall()
+        favorited = cls.favorited_image_ids(list({image_id for image_id, width, size in rows}))
+
+        evicted = []
+        for image_id, width, size in rows:
+            if total <= cls.MAX_BYTES:
+                break
+            if image_id in favorited:
+                continue
+            try:
+                os.remove(cls.path_for(image_id, width))
+            except FileNotFoundError:
+                pass
+            with closing(connect(cls.INDEX_PATH)) as conn:
+                conn.execute("DELETE FROM images WHERE image_id = ? AND width = ?", (image_id, width))
+            total -= size
+            evicted.append((image_id, width))
+        return evicted
+
+    @classmethod
+    def favorited_image_ids(cls, image_ids):
+        """The subset of `image_ids` that at least one user still has favorited"""
+        if not image_ids:
+            return set()
+        with cls._app.app_context():
+            return set(db.session.scalars(
+                db.select(Artwork.image_id).join(Favorite, Favorite.artwork_id == Artwork.id)
+                .where(Artwork.image_id.in_(image_ids)).distinct()))
@@ -0,0 +1,244 @@
+#Per-request instrumentation.
+#Every request gets a RequestTimings that counts its SQL statements, its calls to the AIC API (with
+#bytes received) and its template rendering, each with the time spent. The numbers go out in a
+#Server-Timing header, in one JSON log line per request when REQUEST_LOG is set, and are added to
+#per-endpoint totals that /metrics serves in the Prometheus text format.
+#Page fetches run on worker threads or the async client's event loop, so the request's timings are
+#handed to them with `bind` / `bind_coroutine`; calls made outside any request count as "background".
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from flask import g, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """What one request spent on the db, the AIC API and templates"""
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.upstream_calls = 0
+        self.upstream_bytes = 0
+        self.upstream_time = 0.0
+        self.template_time = 0.0
+        #page fetches on other threads add to the same request
+        self._lock = threading.Lock()
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def server_timing(self, total):
+        """The Server-Timing header value, durations in milliseconds"""
+        return ", ".join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'aic;dur={self.upstream_time * 1000:.1f};desc="{self.upstream_calls} calls, {self.upstream_bytes} bytes"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+class Instrumentation:
+    LOG_REQUESTS = False
+    #upper bounds (seconds) of the request duration histogram buckets
+    DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    logger = logging.getLogger("aic_discovery.requests")
+
+    _lock = threading.Lock()
+    _requests = defaultdict(int)
+    _durations = {}
+    _totals = defaultdict(lambda: defaultdict(float))
+    _listening = False
+
+    @classmethod
+    def init_app(cls, app):
+        """Time every request of `app` and start counting SQL statements"""
+        cls.LOG_REQUESTS = app.config.get("REQUEST_LOG", cls.LOG_REQUESTS)
+        if cls.LOG_REQUESTS and not cls.logger.handlers:
+            cls.logger.addHandler(logging.StreamHandler())
+            cls.logger.setLevel(logging.INFO)
+        app.before_request(cls.start_request)
+        app.after_request(cls.finish_request)
+        app.teardown_request(cls.end_request)
+        before_render_template.connect(cls.start_template, app, weak=False)
+        template_rendered.connect(cls.finish_template, app, weak=False)
+        if not cls._listening:
+            event.listen(Engine, "before_cursor_execute", cls.start_query)
+            event.listen(Engine, "after_cursor_execute", cls.finish_query)
+            cls._listening = True
+
+    @classmethod
+    def reset(cls):
+        """Forget the per-endpoint totals"""
+        with cls._lock:
+            cls._requests.clear()
+            cls._durations.clear()
+            cls._totals.clear()
+
+    @classmethod
+    def current(cls):
+        """The RequestTimings being filled in, or None outside a request"""
+        return _current.get()
+
+    @classmethod
+    def bind(cls, fn):
+        """Wrap `fn` so calls to it on another thread count towards the current request"""
+        timings = _current.get()
+        def bound(*args, **kwargs):
+            token = _current.set(timings)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current.reset(token)
+        return bound
+
+    @classmethod
+    async def bind_coroutine(cls, coroutine, timings):
+        """Await `coroutine` on the event loop as part of the request that `timings` belongs to"""
+        _current.set(timings)
+        return await coroutine
+
+    # request hooks
+
+    @classmethod
+    def start_request(cls):
+        g.request_timings = RequestTimings(request.endpoint or "unknown")
+        _current.set(g.request_timings)
+
+    @classmethod
+    def finish_request(cls, response):
+        timings = g.get("request_timings")
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.started
+        response.headers["Server-Timing"] = timings.server_timing(total)
+        with cls._lock:
+            cls._requests[(timings.endpoint, request.method, response.status_code)] += 1
+            buckets = cls._durations.setdefault(timings.endpoint, [0] * (len(cls.DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(cls.DURATION_BUCKETS):
+                if total <= bound:
+                    buckets[i] += 1
+            #the last two slots hold the count and sum
+            buckets[-2] += 1
+            buckets[-1] += total
+            cls._totals[timings.endpoint]["template_seconds"] += timings.template_time
+        if cls.LOG_REQUESTS:
+            cls.logger.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "endpoint": timings.endpoint,
+                "status": response.status_code,
+                "duration_ms": round(total * 1000, 1),
+                "db_queries": timings.db_queries,
+                "db_ms": round(timings.db_time * 1000, 1),
+                "upstream_calls": timings.upstream_calls,
+                "upstream_bytes": timings.upstream_bytes,
+                "upstream_ms": round(timings.upstream_time * 1000, 1),
+                "template_ms": round(timings.template_time * 1000, 1),
+            }))
+        return response
+
+    @classmethod
+    def end_request(cls, exc):
+        _current.set(None)
+
+    # what requests spend their time on
+
+    @classmethod
+    def record(cls, **amounts):
+        """Add to the current request's timings (if any) and to its endpoint's totals"""
+        timings = _current.get()
+        if timings is not None:
+            timings.add(**amounts)
+        endpoint = timings.endpoint if timings is not None else "background"
+        with cls._lock:
+            totals = cls._totals[endpoint]
+            for name, amount in amounts.items():
+                totals[name] += amount
+
+    @classmethod
+    def record_upstream(cls, started, size):
+        """Count one AIC call that began at `started` (perf_counter) and returned `size` bytes"""
+        cls.record(upstream_calls=1, upstream_bytes=size, upstream_time=time.perf_counter() - started)
+
+    @classmethod
+    def start_query(cls, conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @classmethod
+    def finish_query(cls, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is not None:
+            cls.record(db_queries=1, db_time=time.perf_counter() - started)
+
+    @classmethod
+    def start_template(cls, app, template, context, **extra):
+        timings = _current.get()
+        if timings is not None:
+            timings.template_started = time.perf_counter()
+
+    @classmethod
+    def finish_template(cls, app, template, context, **extra):
+        timings = _current.get()
+        if timings is not None and hasattr(timings, "template_started"):
+            timings.add(template_time=time.perf_counter() - timings.template_started)
+
+    # /metrics
+
+    @classmethod
+    def prometheus(cls, extra=()):
+        """Every total in the Prometheus text format.
+        `extra` adds (name, type, help, samples) metrics; samples is a number or a list of (labels, value)"""
+        with cls._lock:
+            requests = dict(cls._requests)
+            durations = {endpoint: list(buckets) for endpoint, buckets in cls._durations.items()}
+            totals = {endpoint: dict(amounts) for endpoint, amounts in cls._totals.items()}
+
+        metrics = [
+            ("aic_http_requests_total", "counter", "Requests handled",
+             [({"endpoint": endpoint, "method": method, "status": status}, count)
+              for (endpoint, method, status), count in sorted(requests.items())]),
+        ]
+        for name, key, help in (("aic_db_queries_total", "db_queries", "SQL statements executed"),
+                                ("aic_db_seconds_total", "db_time", "Time spent executing SQL"),
+                                ("aic_upstream_calls_total", "upstream_calls", "Calls to the AIC API"),
+                                ("aic_upstream_bytes_total", "upstream_bytes", "Bytes received from the AIC API"),
+                                ("aic_upstream_seconds_total", "upstream_time", "Time spent waiting on the AIC API"),
+                                ("aic_template_seconds_total", "template_seconds", "Time spent rendering templates")):
+            metrics.append((name, "counter", help, [({"endpoint": endpoint}, amounts.get(key, 0))
+                                                     for endpoint, amounts in sorted(totals.items())]))
+        metrics.extend(extra)
+
+        lines = []
+        for name, kind, help, samples in metrics:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            if not isinstance(samples, list):
+                samples = [({}, samples)]
+            lines += [f"{name}{cls._labels(labels)} {value}" for labels, value in samples]
+
+        name = "aic_http_request_duration_seconds"
+        lines += [f"# HELP {name} Request duration", f"# TYPE {name} histogram"]
+        for endpoint, buckets in sorted(durations.items()):
+            for bound, count in zip(cls.DURATION_BUCKETS, buckets):
+                lines.append(f"{name}_bucket{cls._labels({'endpoint': endpoint, 'le': bound})} {count}")
+            lines.append(f"{name}_bucket{cls._labels({'endpoint': endpoint, 'le': '+Inf'})} {buckets[-2]}")
+            lines.append(f"{name}_count{cls._labels({'endpoint': endpoint})} {buckets[-2]}")
+            lines.append(f"{name}_sum{cls._labels({'endpoint': endpoint})} {buckets[-1]}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def _labels(cls, labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
@@ -0,0 +1,13 @@
+#Small SQLite databases on local disk for state that every worker process on the host shares
+#(cached API pages, job queues, ...). They live next to the app, not in Postgres.
+
+import sqlite3
+
+
+def connect(path):
+    """Open a connection to the SQLite file at `path`.
+    Connections are in autocommit mode with WAL enabled so readers don't block the writer;
+    open one per operation rather than sharing it between threads"""
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
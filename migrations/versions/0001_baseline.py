@@ -0,0 +1,72 @@
+"""Baseline: the schema as first released, and its centuries
+
+Tables that already exist (databases built by db.create_all before migrations) are left alone,
+so `flask db upgrade` brings those databases under migrations as well.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+"""
+import sqlalchemy as sa
+from alembic import op
+from schema_ops import create_table
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+#the centuries the app searches for (APIRequests.century_dates) at the time of this migration
+CENTURIES = ('18th Century', '19th Century', '20th Century')
+
+
+def upgrade():
+    create_table('centuries',
+                 sa.Column('id', sa.Integer(), primary_key=True),
+                 sa.Column('century_name', sa.Text(), nullable=False, unique=True))
+    create_table('users',
+                 sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+                 sa.Column('username', sa.String(length=20), nullable=False, unique=True),
+                 sa.Column('password', sa.Text(), nullable=False),
+                 sa.Column('email', sa.String(length=50), nullable=False),
+                 sa.Column('first_name', sa.String(length=30)),
+                 sa.Column('last_name', sa.String(length=30)),
+                 sa.Column('century_id', sa.Integer(), sa.ForeignKey('centuries.id'), nullable=False))
+    create_table('artists',
+                 sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+                 sa.Column('artist_title', sa.Text()),
+                 sa.Column('artist_display', sa.Text()))
+    create_table('classifications',
+                 sa.Column('classification_title', sa.String(), primary_key=True))
+    create_table('artworks',
+                 sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+                 sa.Column('title', sa.Text(), nullable=False),
+                 sa.Column('artist_id', sa.Integer(), sa.ForeignKey('artists.id'), nullable=False),
+                 sa.Column('date_start', sa.Integer()),
+                 sa.Column('date_end', sa.Integer()),
+                 sa.Column('medium_display', sa.String(length=255)),
+                 sa.Column('dimensions', sa.String(length=255)),
+                 sa.Column('on_view', sa.Boolean()),
+                 sa.Column('on_loan', sa.Boolean()),
+                 sa.Column('classification_title', sa.String(),
+                           sa.ForeignKey('classifications.classification_title')),
+                 sa.Column('image_id', sa.String(length=255), unique=True),
+                 sa.Column('image_url', sa.Text(), nullable=False))
+    for table in ('favorites', 'not_favorites'):
+        create_table(table,
+                     sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+                     sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+                     sa.Column('artist_id', sa.Integer(), sa.ForeignKey('artists.id'), nullable=False),
+                     sa.Column('artwork_id', sa.Integer(), sa.ForeignKey('artworks.id'), nullable=False))
+
+    for name in CENTURIES:
+        op.execute(sa.text("INSERT INTO centuries (century_name) SELECT :name "
+                           "WHERE NOT EXISTS (SELECT 1 FROM centuries WHERE century_name = :name)")
+                   .bindparams(name=name))
+
+
+def downgrade():
+    for table in ('not_favorites', 'favorites', 'artworks', 'classifications', 'artists', 'users', 'centuries'):
+        op.drop_table(table)
@@ -0,0 +1,69 @@
+"""Century partitions for the local catalog, user exclusions and recommendation queues
+
+artworks.century_id is added as a nullable column (instant on Postgres) with its foreign key NOT VALID,
+and the index is built concurrently. Existing artworks are then filed under their century in batches,
+and the foreign key is validated last, on its own, so artworks isn't locked against writes while it's checked.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+"""
+import sqlalchemy as sa
+from alembic import op
+from schema_ops import (is_postgres, has_column, create_table, create_index, drop_index, in_batches,
+                        validate_constraint)
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+#(name, first year, last year) as in APIRequests.century_dates at the time of this migration
+CENTURY_DATES = (('18th Century', 1700, 1799), ('19th Century', 1800, 1899), ('20th Century', 1900, 1999))
+
+
+def upgrade():
+    if not has_column('artworks', 'century_id'):
+        if is_postgres():
+            op.add_column('artworks', sa.Column('century_id', sa.Integer(), nullable=True))
+            op.execute("ALTER TABLE artworks ADD CONSTRAINT artworks_century_id_fkey "
+                       "FOREIGN KEY (century_id) REFERENCES centuries (id) NOT VALID")
+        else:
+            #SQLite can't add a foreign key in place, so batch mode copies the table
+            with op.batch_alter_table('artworks') as batch_op:
+                batch_op.add_column(sa.Column('century_id', sa.Integer(), nullable=True))
+                batch_op.create_foreign_key('artworks_century_id_fkey', 'centuries', ['century_id'], ['id'])
+    create_index('ix_artworks_century_id', 'artworks', ['century_id'])
+
+    #an artwork belongs to the first century it starts or ends in, like the century search query
+    for name, start, end in CENTURY_DATES:
+        in_batches("""UPDATE artworks SET century_id = (SELECT id FROM centuries WHERE century_name = :name)
+                      WHERE id IN (SELECT id FROM artworks
+                                   WHERE century_id IS NULL
+                                     AND (date_start BETWEEN :start AND :end OR date_end BETWEEN :start AND :end)
+                                   LIMIT :batch_size)""",
+                   name=name, start=start, end=end)
+    #only now, with the column filled in and the ADD COLUMN lock long released
+    validate_constraint('artworks_century_id_fkey', 'artworks')
+
+    create_table('user_exclusions',
+                 sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+                 sa.Column('artwork_ids', sa.LargeBinary(), nullable=False))
+    create_table('queued_artworks',
+                 sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+                 sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+                 sa.Column('artwork_id', sa.Integer(), sa.ForeignKey('artworks.id'), nullable=False),
+                 sa.UniqueConstraint('user_id', 'artwork_id'))
+    create_index('ix_queued_artworks_user_id_id', 'queued_artworks', ['user_id', 'id'])
+
+
+def downgrade():
+    op.drop_table('queued_artworks')
+    op.drop_table('user_exclusions')
+    drop_index('ix_artworks_century_id', 'artworks')
+    with op.batch_alter_table('artworks') as batch_op:
+        if not is_postgres():
+            batch_op.drop_constraint('artworks_century_id_fkey', type_='foreignkey')
+        batch_op.drop_column('century_id')
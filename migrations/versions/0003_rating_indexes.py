@@ -0,0 +1,37 @@
+"""Unique (user_id, artwork_id) indexes on favorites and dislikes, and an index on artist titles
+
+Duplicate ratings are removed in batches first (keeping the earliest of each), then the indexes are
+built concurrently. If a rating is duplicated again while an index builds, the build fails; running
+the upgrade again removes the new duplicates and rebuilds the index.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+"""
+from schema_ops import create_index, drop_index, in_batches
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('favorites', 'not_favorites'):
+        in_batches(f"""DELETE FROM {table} WHERE id IN (
+                           SELECT id FROM {table} later
+                           WHERE EXISTS (SELECT 1 FROM {table} earlier
+                                         WHERE earlier.user_id = later.user_id
+                                           AND earlier.artwork_id = later.artwork_id
+                                           AND earlier.id < later.id)
+                           LIMIT :batch_size)""")
+        create_index(f'uq_{table}_user_id_artwork_id', table, ['user_id', 'artwork_id'], unique=True)
+    create_index('ix_artists_artist_title', 'artists', ['artist_title'])
+
+
+def downgrade():
+    drop_index('ix_artists_artist_title', 'artists')
+    for table in ('not_favorites', 'favorites'):
+        drop_index(f'uq_{table}_user_id_artwork_id', table)
@@ -6,6 +6,16 @@ db = SQLAlchemy()
 bcrypt = Bcrypt()
 
 
+def dialect_insert(model):
+    """INSERT for `model` built with the bound database's dialect, so ON CONFLICT
+    clauses are available (Postgres in production, SQLite when testing locally)"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
 class User(db.Model):
     __tablename__ = 'users'
 
@@ -66,7 +76,8 @@ class User(db.Model):
 class Artist(db.Model):
     __tablename__ = 'artists'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    artist_title = db.Column(db.Text)
+    #artworks are matched to their artist by title when they're saved
+    artist_title = db.Column(db.Text, index=True)
     artist_display = db.Column(db.Text)
     
     
@@ -87,6 +98,8 @@ class Artwork(db.Model):
     classification_title = db.Column(db.String, db.ForeignKey('classifications.classification_title'), nullable=True)
     image_id = db.Column(db.String(255), unique=True, nullable=True) 
     image_url = db.Column(db.Text, nullable = False)
+    #the century partition of the local catalog this artwork was synced into
+    century_id = db.Column(db.Integer, db.ForeignKey('centuries.id'), nullable=True, index=True)
     
     classifications = db.relationship('Classification', backref='artworks', lazy=True)
 
@@ -108,6 +121,8 @@ class Classification(db.Model):
     
 class Favorite(db.Model):
     __tablename__= 'favorites'
+    #a user favorites an artwork at most once; also serves lookups by user_id
+    __table_args__ = (db.Index('uq_favorites_user_id_artwork_id', 'user_id', 'artwork_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
@@ -118,6 +133,7 @@ class Favorite(db.Model):
 
 class NotFavorite(db.Model):
     __tablename__ = 'not_favorites'
+    __table_args__ = (db.Index('uq_not_favorites_user_id_artwork_id', 'user_id', 'artwork_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
@@ -133,3 +149,21 @@ class Century(db.Model):
     
 
 
+
+class UserExclusion(db.Model):
+    """Every artwork a user has rated, packed as a sorted array of ids (see exclusions.py)"""
+    __tablename__ = 'user_exclusions'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    artwork_ids = db.Column(db.LargeBinary, nullable=False, default=b'')
+
+
+class QueuedArtwork(db.Model):
+    """An artwork waiting to be shown on a user's profile page, oldest first (see recommendations.py)"""
+    __tablename__ = 'queued_artworks'
+    __table_args__ = (db.UniqueConstraint('user_id', 'artwork_id'),
+                      db.Index('ix_queued_artworks_user_id_id', 'user_id', 'id'))
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    artwork_id = db.Column(db.Integer, db.ForeignKey('artworks.id'), nullable=False)
+
+    artwork = db.relationship('Artwork')
@@ -0,0 +1,107 @@
+#Cache of raw AIC search pages. Entries expire after a TTL and the least recently used are evicted
+#once the cache is full. Every process keeps an in-memory LRU; when PAGE_CACHE_PATH is set, pages are
+#also stored in a SQLite file so all workers on the host share them.
+#Expired pages are kept until STALE_TTL so they can still be served while the API is unavailable.
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from local_state import connect
+
+
+class PageCache:
+    TTL = 600
+    STALE_TTL = 24 * 60 * 60
+    MAX_ENTRIES = 256
+    PATH = None
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        """Read the cache settings from the app config"""
+        cls.TTL = app.config.get("PAGE_CACHE_TTL", cls.TTL)
+        cls.STALE_TTL = max(app.config.get("PAGE_CACHE_STALE_TTL", cls.STALE_TTL), cls.TTL)
+        cls.MAX_ENTRIES = app.config.get("PAGE_CACHE_SIZE", cls.MAX_ENTRIES)
+        cls.PATH = app.config.get("PAGE_CACHE_PATH") or None
+        if cls.PATH:
+            os.makedirs(os.path.dirname(os.path.abspath(cls.PATH)), exist_ok=True)
+            with closing(connect(cls.PATH)) as conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS page_cache (
+                                    key TEXT PRIMARY KEY,
+                                    data TEXT NOT NULL,
+                                    stored_at REAL NOT NULL,
+                                    accessed_at REAL NOT NULL)""")
+        cls.clear()
+
+    @classmethod
+    def key(cls, query):
+        """Normalized cache key for a search body"""
+        return json.dumps(query, sort_keys=True, separators=(",", ":"))
+
+    @classmethod
+    def get(cls, query, stale_ok=False):
+        """Cached page data for `query`, or None if it's missing or expired.
+        With `stale_ok`, pages past their TTL but within STALE_TTL are returned too"""
+        if cls.TTL <= 0:
+            return None
+        key = cls.key(query)
+        now = time.time()
+        max_age = cls.STALE_TTL if stale_ok else cls.TTL
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is not None:
+                stored_at, data = entry
+                if now - stored_at < max_age:
+                    cls._entries.move_to_end(key)
+                    return data
+                if now - stored_at >= cls.STALE_TTL:
+                    del cls._entries[key]
+
+        if cls.PATH:
+            with closing(connect(cls.PATH)) as conn:
+                row = conn.execute("SELECT data, stored_at FROM page_cache WHERE key = ? AND stored_at > ?",
+                                   (key, now - max_age)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE page_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    data = json.loads(row[0])
+                    cls._remember(key, row[1], data)
+                    return data
+        return None
+
+    @classmethod
+    def set(cls, query, data):
+        """Store a page's data for `query`"""
+        if cls.TTL <= 0:
+            return
+        key = cls.key(query)
+        now = time.time()
+        cls._remember(key, now, data)
+
+        if cls.PATH:
+            with closing(connect(cls.PATH)) as conn:
+                conn.execute("INSERT OR REPLACE INTO page_cache (key, data, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                             (key, json.dumps(data), now, now))
+                conn.execute("DELETE FROM page_cache WHERE stored_at <= ?", (now - cls.STALE_TTL,))
+                conn.execute("""DELETE FROM page_cache WHERE key NOT IN (
+                                    SELECT key FROM page_cache ORDER BY accessed_at DESC LIMIT ?)""",
+                             (cls.MAX_ENTRIES,))
+
+    @classmethod
+    def _remember(cls, key, stored_at, data):
+        """Put an entry in the in-memory LRU, evicting the least recently used past MAX_ENTRIES"""
+        with cls._lock:
+            cls._entries[key] = (stored_at, data)
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > cls.MAX_ENTRIES:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def clear(cls):
+        """Forget everything in this process's memory (the shared SQLite file is left alone)"""
+        with cls._lock:
+            cls._entries.clear()
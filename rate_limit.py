@@ -0,0 +1,197 @@
+#Guards for calls to the AIC API.
+#RateLimiter is a token bucket that keeps every worker on the host under AIC's request budget
+#(60 requests a minute per IP); its state lives in a small SQLite file so workers draw from one bucket.
+#CircuitBreaker stops calling the API after repeated failures, so a slow or failing upstream makes
+#callers fall back to cached pages straight away instead of each of them waiting on timeouts.
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import closing, contextmanager
+from local_state import connect
+
+
+class RateLimiter:
+    RATE = 1.0
+    BURST = 60
+    #longest a caller will wait for a token before giving up
+    MAX_WAIT = 10
+    PATH = None
+
+    _tokens = None
+    _updated_at = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        """Read the budget from the app config and set up the shared bucket.
+        A bucket other workers are already drawing from is left as it is, so starting workers doesn't refill it"""
+        cls.RATE = app.config.get("AIC_RATE_PER_MINUTE", cls.RATE * 60) / 60
+        cls.BURST = app.config.get("AIC_RATE_BURST", cls.BURST)
+        cls.PATH = app.config.get("AIC_RATE_STATE_PATH") or os.path.join(app.instance_path, "aic_rate.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(cls.PATH)), exist_ok=True)
+        with closing(connect(cls.PATH)) as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS token_bucket (
+                                name TEXT PRIMARY KEY,
+                                tokens REAL NOT NULL,
+                                updated_at REAL NOT NULL)""")
+        #the row itself is created, full, by the first worker to take a token
+        with cls._lock:
+            cls._tokens = None
+            cls._updated_at = None
+
+    @classmethod
+    def reset(cls):
+        """Refill the bucket"""
+        with cls._lock:
+            cls._tokens = None
+            cls._updated_at = None
+        if cls.PATH:
+            with closing(connect(cls.PATH)) as conn:
+                conn.execute("DELETE FROM token_bucket WHERE name = 'aic'")
+
+    @classmethod
+    def try_acquire(cls):
+        """Take a token if one is available. Returns 0, or the seconds until the next token"""
+        if cls.PATH:
+            return cls._take_shared()
+        with cls._lock:
+            cls._tokens, cls._updated_at, wait = cls._take(cls._tokens, cls._updated_at)
+        return wait
+
+    @classmethod
+    def acquire(cls):
+        """Wait up to MAX_WAIT seconds for a token. Returns whether one was taken"""
+        deadline = time.monotonic() + cls.MAX_WAIT
+        while True:
+            wait = cls.try_acquire()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    @classmethod
+    async def acquire_async(cls):
+        """`acquire` for the event loop. The shared bucket is updated on the loop's default executor,
+        so waiting on its file lock doesn't hold up the loop"""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + cls.MAX_WAIT
+        while True:
+            wait = await loop.run_in_executor(None, cls.try_acquire)
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    @classmethod
+    def _take(cls, tokens, updated_at):
+        """Refill by the time passed and take one token. Returns (tokens, updated_at, wait)"""
+        now = time.time()
+        if tokens is None:
+            tokens, updated_at = cls.BURST, now
+        tokens = min(cls.BURST, tokens + (now - updated_at) * cls.RATE)
+        if tokens >= 1:
+            return tokens - 1, now, 0
+        return tokens, now, (1 - tokens) / cls.RATE
+
+    @classmethod
+    def _take_shared(cls):
+        with closing(connect(cls.PATH)) as conn:
+            #BEGIN IMMEDIATE takes the write lock up front, so workers update the bucket one at a time
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM token_bucket WHERE name = 'aic'").fetchone()
+                tokens, updated_at, wait = cls._take(*(row or (None, None)))
+                conn.execute("INSERT OR REPLACE INTO token_bucket (name, tokens, updated_at) VALUES ('aic', ?, ?)",
+                             (tokens, updated_at))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return wait
+
+
+class CircuitBreaker:
+    #consecutive failures that open the circuit
+    FAILURE_THRESHOLD = 5
+    #seconds the circuit stays open before one trial call is let through
+    RESET_TIMEOUT = 30
+
+    _failures = 0
+    _opened_at = None
+    _trial = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        cls.FAILURE_THRESHOLD = app.config.get("AIC_BREAKER_FAILURES", cls.FAILURE_THRESHOLD)
+        cls.RESET_TIMEOUT = app.config.get("AIC_BREAKER_RESET", cls.RESET_TIMEOUT)
+        cls.reset()
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._failures = 0
+            cls._opened_at = None
+            cls._trial = False
+
+    @classmethod
+    def allow(cls):
+        """Whether a call to the API may go ahead"""
+        with cls._lock:
+            return cls._allow()[0]
+
+    @classmethod
+    @contextmanager
+    def attempt(cls):
+        """`allow` for the length of one call: yields whether it may go ahead. If it was the half-open
+        trial and ends without recording a success or failure (no rate limit token, an unexpected error),
+        the trial slot is given back so the next call can try instead"""
+        with cls._lock:
+            allowed, trial = cls._allow()
+        try:
+            yield allowed
+        finally:
+            if trial is not None:
+                with cls._lock:
+                    if cls._trial is trial:
+                        cls._trial = False
+
+    @classmethod
+    def _allow(cls):
+        """Call with the lock held. Returns (allowed, the trial slot taken or None)"""
+        if cls._opened_at is None:
+            return True, None
+        if cls._trial or time.monotonic() - cls._opened_at < cls.RESET_TIMEOUT:
+            return False, None
+        #half open: let one call find out whether the API is back
+        cls._trial = object()
+        return True, cls._trial
+
+    @classmethod
+    def record_success(cls):
+        with cls._lock:
+            cls._failures = 0
+            cls._opened_at = None
+            cls._trial = False
+
+    @classmethod
+    def record_failure(cls):
+        with cls._lock:
+            cls._failures += 1
+            if cls._trial or cls._failures >= cls.FAILURE_THRESHOLD:
+                cls._opened_at = time.monotonic()
+                cls._trial = False
+
+    @classmethod
+    def state(cls):
+        """The circuit's state: closed, open or half-open"""
+        with cls._lock:
+            if cls._opened_at is None:
+                return "closed"
+            if cls._trial or time.monotonic() - cls._opened_at >= cls.RESET_TIMEOUT:
+                return "half-open"
+            return "open"
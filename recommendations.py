@@ -0,0 +1,106 @@
+#Per-user queue of artworks ready to show on the profile page.
+#A profile view pops the head of the user's queue with one indexed lookup. Once the queue runs
+#below LOW_WATER it is topped back up from the catalog on a background thread, so the sampling
+#work is shared across many views instead of being repeated on each one.
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from models import db, QueuedArtwork, dialect_insert
+from catalog import ArtworkCatalog
+
+
+class Recommendations:
+    #refill once fewer than this many artworks are waiting
+    LOW_WATER = 5
+    #how many artworks a refill adds
+    BATCH = 25
+    WORKERS = 1
+
+    _app = None
+    _executor = None
+    _refilling = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        """Start the refill worker"""
+        cls._app = app
+        cls.LOW_WATER = app.config.get("RECOMMENDATION_LOW_WATER", cls.LOW_WATER)
+        cls.BATCH = app.config.get("RECOMMENDATION_BATCH", cls.BATCH)
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False)
+        cls._executor = ThreadPoolExecutor(max_workers=cls.WORKERS, thread_name_prefix="recommendations")
+
+    @classmethod
+    def next_artwork(cls, user):
+        """Pop the next artwork to show the user, or None if their catalog partition is used up"""
+        queued = cls._peek(user.id)
+        if not queued:
+            #nothing waiting yet (first visit, or a new century): fill the queue now
+            cls.refill(user.id, user.century_id)
+            queued = cls._peek(user.id)
+            if not queued:
+                return None
+        elif len(queued) <= cls.LOW_WATER:
+            cls.schedule_refill(user)
+
+        head = queued[0]
+        artwork = head.artwork
+        db.session.delete(head)
+        db.session.commit()
+        return artwork
+
+    @classmethod
+    def _peek(cls, user_id):
+        """The first LOW_WATER + 1 entries of the user's queue, enough to tell whether it's running low"""
+        return (QueuedArtwork.query
+                .filter_by(user_id=user_id)
+                .order_by(QueuedArtwork.id)
+                .limit(cls.LOW_WATER + 1)
+                .all())
+
+    @classmethod
+    def refill(cls, user_id, century_id):
+        """Queue up to BATCH unrated artworks from the century that aren't queued already.
+        Returns how many were added"""
+        queued = db.select(QueuedArtwork.artwork_id).where(QueuedArtwork.user_id == user_id)
+        artworks = ArtworkCatalog.sample(century_id, user_id, limit=cls.BATCH, skip=queued)
+        if not artworks:
+            return 0
+        db.session.execute(dialect_insert(QueuedArtwork)
+                           .values([{"user_id": user_id, "artwork_id": artwork.id} for artwork in artworks])
+                           .on_conflict_do_nothing(index_elements=["user_id", "artwork_id"]))
+        db.session.commit()
+        return len(artworks)
+
+    @classmethod
+    def schedule_refill(cls, user):
+        """Refill the user's queue on the worker. Returns the future, or None if a refill is already running"""
+        with cls._lock:
+            if user.id in cls._refilling:
+                return None
+            cls._refilling.add(user.id)
+        return cls._executor.submit(cls._run_refill, user.id, user.century_id)
+
+    @classmethod
+    def _run_refill(cls, user_id, century_id):
+        try:
+            with cls._app.app_context():
+                return cls.refill(user_id, century_id)
+        except Exception as e:
+            logging.error(f"Recommendation refill for user {user_id} failed: {e}")
+            return 0
+        finally:
+            with cls._lock:
+                cls._refilling.discard(user_id)
+
+    @classmethod
+    def discard(cls, user_id, artwork_id):
+        """Take a rated artwork out of the user's queue. Committed with the rating"""
+        QueuedArtwork.query.filter_by(user_id=user_id, artwork_id=artwork_id).delete()
+
+    @classmethod
+    def clear(cls, user_id):
+        """Empty the user's queue, e.g. after they pick a different century. Committed by the caller"""
+        QueuedArtwork.query.filter_by(user_id=user_id).delete()
@@ -0,0 +1,77 @@
+#Helpers for migrations (see migrations/versions) that change tables the app is busy with.
+#On Postgres, indexes are built CONCURRENTLY outside the migration's transaction, so reads and writes
+#carry on while they build, and data is changed in small batches that each commit on their own, so
+#no statement holds row locks on a hot table for long. SQLite (local development) gets the plain versions.
+#Every helper is safe to re-run, so a migration cut short part way can simply be run again.
+
+import sqlalchemy as sa
+from alembic import op
+
+BATCH_SIZE = 1000
+
+
+def is_postgres():
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def has_table(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def has_column(table, column):
+    return any(c["name"] == column for c in sa.inspect(op.get_bind()).get_columns(table))
+
+
+def create_table(table, *columns, **kwargs):
+    """Create `table` unless it's already there (e.g. made by db.create_all before migrations existed)"""
+    if not has_table(table):
+        op.create_table(table, *columns, **kwargs)
+
+
+def create_index(name, table, columns, unique=False):
+    """Create an index if it's missing, without blocking writes on Postgres.
+    A concurrent build that failed part way leaves an invalid index behind, which is dropped and rebuilt"""
+    if not is_postgres():
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+        return
+    with op.get_context().autocommit_block():
+        invalid = op.get_bind().execute(sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"), {"name": name}).first()
+        if invalid:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True, postgresql_concurrently=True)
+
+
+def drop_index(name, table):
+    """Drop an index if it exists, without blocking writes on Postgres"""
+    if not is_postgres():
+        op.drop_index(name, table_name=table, if_exists=True)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+
+
+def validate_constraint(name, table):
+    """Check a constraint added NOT VALID against the existing rows, outside the migration's transaction,
+    so the scan only takes a lock that lets reads and writes on `table` carry on. Postgres only"""
+    if not is_postgres():
+        return
+    with op.get_context().autocommit_block():
+        unvalidated = op.get_bind().execute(sa.text(
+            "SELECT 1 FROM pg_constraint WHERE conname = :name AND conrelid = CAST(:table AS regclass) "
+            "AND NOT convalidated"), {"name": name, "table": table}).first()
+        if unvalidated:
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def in_batches(statement, batch_size=BATCH_SIZE, **params):
+    """Run `statement`, an UPDATE or DELETE limited to :batch_size rows, until it changes nothing.
+    Each batch commits on its own. Returns the number of rows changed"""
+    total = 0
+    with op.get_context().autocommit_block():
+        while True:
+            changed = op.get_bind().execute(sa.text(statement), dict(params, batch_size=batch_size)).rowcount
+            total += changed
+            if not changed:
+                return total
@@ -0,0 +1,97 @@
+#Request coalescing for upstream fetches.
+#Concurrent callers asking for the same key share one call and its result instead of each making it.
+#Within a process followers wait on the leader's future; with SINGLE_FLIGHT_LOCK_DIR set, leaders in
+#different workers also take turns on a lock file per key, so whoever goes second can find the
+#first one's result in the shared PageCache instead of calling the API again.
+
+import asyncio
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    #no flock (e.g. Windows): coalescing stays within the process
+    fcntl = None
+
+
+class SingleFlight:
+    LOCK_DIR = None
+
+    _calls = {}
+    _async_calls = {}
+    _lock = threading.Lock()
+    _stats = {"calls": 0, "shared": 0}
+
+    @classmethod
+    def init_app(cls, app):
+        cls.LOCK_DIR = app.config.get("SINGLE_FLIGHT_LOCK_DIR")
+        if cls.LOCK_DIR:
+            os.makedirs(cls.LOCK_DIR, exist_ok=True)
+
+    @classmethod
+    def do(cls, key, fn):
+        """Call fn() unless a call for `key` is already in flight, in which case wait for and return its result"""
+        with cls._lock:
+            future = cls._calls.get(key)
+            leader = future is None
+            if leader:
+                future = cls._calls[key] = Future()
+                cls._stats["calls"] += 1
+            else:
+                cls._stats["shared"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            with cls._worker_lock(key):
+                result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with cls._lock:
+                cls._calls.pop(key, None)
+
+    @classmethod
+    async def do_async(cls, key, coroutine_fn):
+        """`do` for coroutines on one event loop. Only coalesces within the process"""
+        task = cls._async_calls.get(key)
+        if task is not None:
+            with cls._lock:
+                cls._stats["shared"] += 1
+            return await asyncio.shield(task)
+
+        task = cls._async_calls[key] = asyncio.ensure_future(coroutine_fn())
+        with cls._lock:
+            cls._stats["calls"] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            cls._async_calls.pop(key, None)
+
+    @classmethod
+    @contextmanager
+    def _worker_lock(cls, key):
+        """Hold an exclusive lock on the key's lock file, when cross-worker locking is set up"""
+        if not cls.LOCK_DIR or fcntl is None:
+            yield
+            return
+        path = os.path.join(cls.LOCK_DIR, hashlib.sha1(key.encode()).hexdigest() + ".lock")
+        with open(path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @classmethod
+    def metrics(cls):
+        """How many calls were made, and how many callers shared one instead"""
+        with cls._lock:
+            return dict(cls._stats)
@@ -0,0 +1,37 @@
+// Infinite scroll for the favorites page: when the "More favorites" link scrolls into view,
+// fetch the next page of cards and put them in its place. Without JS the link still works.
+// Removing a favorite goes through the JSON API and takes its card off the page.
+const cards = document.getElementById("favorite-cards");
+
+function watchForMore() {
+    const more = cards.querySelector(".favorites-more");
+    if (!more || !("IntersectionObserver" in window)) return;
+
+    const observer = new IntersectionObserver(async (entries) => {
+        if (!entries[0].isIntersecting) return;
+        observer.disconnect();
+        const url = new URL(more.dataset.next, window.location.origin);
+        url.searchParams.set("partial", "1");
+        const res = await axios.get(url.toString());
+        more.insertAdjacentHTML("beforebegin", res.data);
+        more.remove();
+        watchForMore();
+    }, { rootMargin: "400px" });
+    observer.observe(more);
+}
+
+watchForMore();
+
+cards.addEventListener("submit", async (event) => {
+    const form = event.target;
+    if (!form.classList.contains("un-favorite-form")) return;
+    event.preventDefault();
+    const csrfInput = form.querySelector("input[name=csrf_token]");
+    try {
+        await axios.delete(`/api/favorites/${form.elements.artwork_id.value}`,
+            { headers: { "X-CSRFToken": csrfInput ? csrfInput.value : "" } });
+        form.closest(".col-md-4").remove();
+    } catch (err) {
+        form.submit();
+    }
+});
@@ -0,0 +1,47 @@
+// Likes and dislikes on the profile and surprise pages go through the JSON API, which answers
+// with the next artwork to show, so rating doesn't reload the page.
+const feed = document.querySelector(".artwork-feed");
+
+function showArtwork(next) {
+    if (!next.artwork) {
+        // nothing left to show: let the page render its empty state
+        window.location.reload();
+        return;
+    }
+    for (const el of document.querySelectorAll("[data-field]")) {
+        const field = el.dataset.field;
+        if (field === "image_src") {
+            el.src = next.artwork.image_src;
+        } else if (field === "century") {
+            el.textContent = next.century;
+        } else {
+            el.textContent = next.artwork[field] ?? "";
+        }
+    }
+    document.querySelector(".artist-biography").hidden = !next.artwork.artist_display;
+    for (const input of feed.querySelectorAll("input[name=artwork_id]")) {
+        input.value = next.artwork.id;
+    }
+}
+
+async function rate(event) {
+    event.preventDefault();
+    const form = event.currentTarget;
+    const url = form.classList.contains("favorite-form") ? "/api/favorites" : "/api/dislikes";
+    const csrfInput = form.querySelector("input[name=csrf_token]");
+    try {
+        const res = await axios.post(url,
+            { artwork_id: form.elements.artwork_id.value, feed: feed.dataset.feed },
+            { headers: { "X-CSRFToken": csrfInput ? csrfInput.value : "" } });
+        showArtwork(res.data.next);
+    } catch (err) {
+        // fall back to the plain form post
+        form.submit();
+    }
+}
+
+if (feed) {
+    for (const form of feed.querySelectorAll("form")) {
+        form.addEventListener("submit", rate);
+    }
+}
@@ -0,0 +1,77 @@
+#Shared candidate pools for the surprise page, one per century.
+#Each pool is a random sample of artwork ids from the century's catalog partition, kept in memory
+#for POOL_TTL seconds and shared by every user; a surprise request only filters the pool by the
+#user's exclusions instead of querying the catalog.
+
+import random
+import threading
+import time
+from sqlalchemy import func
+from models import db, Artwork
+from exclusions import ExcludedArtworks
+
+
+class SurprisePools:
+    POOL_SIZE = 200
+    POOL_TTL = 300
+
+    _pools = {}
+    _lock = threading.Lock()
+    _stats = {"hits": 0, "misses": 0, "exhausted": 0}
+
+    @classmethod
+    def init_app(cls, app):
+        cls.POOL_SIZE = app.config.get("SURPRISE_POOL_SIZE", cls.POOL_SIZE)
+        cls.POOL_TTL = app.config.get("SURPRISE_POOL_TTL", cls.POOL_TTL)
+        cls.reset()
+
+    @classmethod
+    def reset(cls):
+        """Drop every pool and zero the metrics"""
+        with cls._lock:
+            cls._pools = {}
+            cls._stats = {"hits": 0, "misses": 0, "exhausted": 0}
+
+    @classmethod
+    def invalidate(cls, century_id):
+        """Rebuild the century's pool on next use, e.g. after its catalog partition was synced"""
+        with cls._lock:
+            cls._pools.pop(century_id, None)
+
+    @classmethod
+    def pool(cls, century_id):
+        """The artwork ids pooled for a century, rebuilt from the catalog once they go stale"""
+        now = time.monotonic()
+        with cls._lock:
+            entry = cls._pools.get(century_id)
+            if entry and entry[0] > now:
+                cls._stats["hits"] += 1
+                return entry[1]
+            cls._stats["misses"] += 1
+
+        artwork_ids = list(db.session.scalars(db.select(Artwork.id)
+                                              .where(Artwork.century_id == century_id)
+                                              .order_by(func.random())
+                                              .limit(cls.POOL_SIZE)))
+        with cls._lock:
+            cls._pools[century_id] = (now + cls.POOL_TTL, artwork_ids)
+        return artwork_ids
+
+    @classmethod
+    def sample(cls, century_id, user_id, limit=1):
+        """Up to `limit` pooled artworks from the century that the user hasn't rated"""
+        exclusions = ExcludedArtworks.load(user_id)
+        candidates = [artwork_id for artwork_id in cls.pool(century_id) if artwork_id not in exclusions]
+        if not candidates:
+            with cls._lock:
+                cls._stats["exhausted"] += 1
+            return []
+        chosen = random.sample(candidates, min(limit, len(candidates)))
+        return Artwork.query.filter(Artwork.id.in_(chosen)).all()
+
+    @classmethod
+    def metrics(cls):
+        """Hit/miss counts, how often a pool had nothing left for a user, and the size of each pool"""
+        with cls._lock:
+            return dict(cls._stats, pool_sizes={century_id: len(artwork_ids)
+                                                for century_id, (expires, artwork_ids) in cls._pools.items()})
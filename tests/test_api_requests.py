@@ -10,7 +10,9 @@ import os
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
 from api_requests import APIRequests
+from page_cache import PageCache
 from models import db, User, Century, Favorite, NotFavorite, Artwork, Artist
+os.environ['APP_ENV'] = "testing"
 from app import app, CURR_USER_KEY
 from flask import flash, get_flashed_messages
 import logging
@@ -22,7 +24,6 @@ logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, o
 logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
 
 app.config['WTF_CSRF_ENABLED'] = False
-os.environ['DATABASE_URL'] = "postgresql:///test_aic_capstone"
 
 
 # run these tests like:
@@ -38,6 +39,7 @@ class TestAPIRequests(TestCase):
         self.app_context.push()  
         db.create_all()
         self.populate_db()
+        PageCache.clear()
     
     def populate_db(self):
         """Runs before each test"""
@@ -110,20 +112,20 @@ class TestAPIRequests(TestCase):
         db.session.commit()
         self.app_context.pop()
 
-    @patch('api_requests.requests.get')
+    @patch('api_requests.AICClient.post')
     def test_get_artworks(self, mock_get):
         """Test get_artworks with mocked API response"""
         mock_response  = {
             "data": [
                 {
-                    "id": 1, 
+                    "id": 4, 
                     "title": "Yellow Octopus", 
                     "artist_title": "Stacy Smith", 
                     'date_start': 1820,
                     'date_end': 1821,
                     'medium_display': "coffee",
                     'dimensions': "100x150",
-                    'image_id': "yellowoctopus",
+                    'image_id': "yellowoctopus_print",
                     'image_url': "http://example.com/yellowoctopus.jpg"
                 } for i in range(10) #Making math easy -- each call recievees 10 items
             ] 
@@ -141,7 +143,7 @@ class TestAPIRequests(TestCase):
         self.assertEqual(artworks[0].title, "Yellow Octopus")
         self.assertEqual(artworks[0].artist.artist_title, "Stacy Smith")
         
-    @patch('api_requests.requests.get')
+    @patch('api_requests.AICClient.post')
     def test_get_artworks_empty_response(self, mock_get):
         """Test get_artworks when the API returns an empty list of artworks."""
         mock_response = MagicMock()
@@ -159,7 +161,7 @@ class TestAPIRequests(TestCase):
         # Assert that the get request was called correctly
         mock_get.assert_called_once()
 
-    @patch('api_requests.requests.get')
+    @patch('api_requests.AICClient.post')
     def test_get_artworks_api_failure(self, mock_get):
         """Test handling of non-200 response from the API."""
         mock_response = MagicMock()
@@ -176,12 +178,12 @@ class TestAPIRequests(TestCase):
         self.assertIn(error, 'Failed with status code 500')
         self.assertListEqual(artworks, [])
 
-    @patch('api_requests.requests.get')
-    @patch('api_requests.Century.query')
-    @patch('api_requests.save_artwork')
-    def test_surprise_me_successful(self, mock_save_artwork, mock_century_query, mock_get):
-        # Setting up the mock for Century query
-        mock_century_query.get.return_value = Century(century_name='19th Century')
+    @patch('api_requests.AICClient.post')
+    @patch('api_requests.CenturyCache.name')
+    @patch('api_requests.save_artworks')
+    def test_surprise_me_successful(self, mock_save_artworks, mock_century_name, mock_get):
+        # Setting up the mock for the century lookup
+        mock_century_name.return_value = '19th Century'
 
         # Mock response from API
         mock_response = MagicMock()
@@ -202,6 +204,7 @@ class TestAPIRequests(TestCase):
             } for i in range(10)]
         }
         mock_get.return_value = mock_response
+        mock_save_artworks.side_effect = lambda batch, century_id=None: batch
 
         # Execute the method under test
         artworks, century = APIRequests.surprise_me(self.user)
@@ -210,13 +213,13 @@ class TestAPIRequests(TestCase):
         self.assertEqual(len(artworks), 50)
         self.assertIsNotNone(century)
         self.assertIn(century, ['18th Century', '20th Century'])  
-        mock_save_artwork.assert_called()
+        mock_save_artworks.assert_called()
 
-    @patch('api_requests.requests.get')
-    @patch('api_requests.Century.query')
-    def test_surprise_me_api_failure(self, mock_century_query, mock_get):
-        # Mock Century query
-        mock_century_query.get.return_value = Century(century_name='20th Century')
+    @patch('api_requests.AICClient.post')
+    @patch('api_requests.CenturyCache.name')
+    def test_surprise_me_api_failure(self, mock_century_name, mock_get):
+        # Mock the century lookup
+        mock_century_name.return_value = '20th Century'
 
         # Mock API failure
         mock_response = MagicMock()
@@ -232,7 +235,42 @@ class TestAPIRequests(TestCase):
         self.assertListEqual([], artworks)
         self.assertNotEqual(century, '20th Century')
    
-    @patch('api_requests.requests.get')
+    @patch('api_requests.save_artworks')
+    @patch('api_requests.AICClient.post')
+    def test_collect_artworks_concurrent_pages(self, mock_post, mock_save_artworks):
+        """Test pages are requested ahead in parallel but saved in page order."""
+        def page_response(url, headers=None, json=None):
+            response = MagicMock()
+            response.status_code = 200
+            page = json['page']
+            response.json.return_value = {'data': [{'id': page * 100 + i} for i in range(10)]}
+            return response
+
+        mock_post.side_effect = page_response
+        mock_save_artworks.side_effect = lambda batch, century_id=None: batch
+
+        with patch.object(APIRequests, 'PAGE_LIMIT', 10):
+            artworks, error = APIRequests.collect_artworks('19th Century', 35)
+
+        self.assertIsNone(error)
+        self.assertEqual(len(artworks), 35)
+        self.assertEqual([a['id'] for a in artworks[:11]], list(range(100, 110)) + [200])
+        #four pages cover 35 artworks, so no page beyond the fourth is speculated
+        self.assertEqual(mock_post.call_count, 4)
+
+    @patch('api_requests.AICClient.post')
+    def test_count_results(self, mock_post):
+        """Test a century's results are counted with one request for no artworks."""
+        mock_post.return_value = MagicMock(status_code=200)
+        mock_post.return_value.json.return_value = {'pagination': {'total': 4321}, 'data': []}
+        self.assertEqual(APIRequests.count_results('19th Century'), 4321)
+        self.assertEqual(mock_post.call_args.kwargs['json']['limit'], 0)
+
+        mock_post.return_value = MagicMock(status_code=500)
+        self.assertIsNone(APIRequests.count_results('19th Century'))
+        self.assertIsNone(APIRequests.count_results('Unknown Century'))
+
+    @patch('api_requests.AICClient.post')
     def test_api_failure_flashes_error(self, mock_get):
         """Test API failure triggers flash with error message."""
         # Configure mock_get to simulate a failed API response
@@ -249,6 +287,61 @@ class TestAPIRequests(TestCase):
         expected_message = ('danger', "Failed to fetch artworks from API: 500")
         self.assertIn(expected_message, flashed_messages)
 
+    def test_build_century_query(self):
+        """Test the century is translated into a range query on the search body."""
+        query = APIRequests.build_century_query('19th Century', excluded_ids=[1, 2], page=3)
+        bool_query = query['query']['bool']
+
+        self.assertIn({'range': {'date_start': {'gte': 1800, 'lte': 1899}}}, bool_query['should'])
+        self.assertIn({'range': {'date_end': {'gte': 1800, 'lte': 1899}}}, bool_query['should'])
+        self.assertEqual(bool_query['minimum_should_match'], 1)
+        self.assertEqual(bool_query['must_not'], [{'terms': {'id': [1, 2]}}])
+        self.assertEqual(query['page'], 3)
+        self.assertEqual(query['limit'], 100)
+
+    def test_build_century_query_no_exclusions(self):
+        """Test no must_not clause is sent when nothing is excluded, and unknown centuries give None."""
+        query = APIRequests.build_century_query('18th Century')
+        self.assertNotIn('must_not', query['query']['bool'])
+        self.assertIsNone(APIRequests.build_century_query('21st Century'))
+
+    @patch('api_requests.AICClient.post')
+    def test_get_artworks_sends_century_query(self, mock_post):
+        """Test the user's century is sent in the request body but their rated artworks are not."""
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {'data': []}
+
+        APIRequests.get_artworks(self.user)
+
+        query = mock_post.call_args.kwargs['json']
+        self.assertIn({'range': {'date_start': {'gte': 1800, 'lte': 1899}}}, query['query']['bool']['should'])
+        self.assertNotIn('must_not', query['query']['bool'])
+
+    @patch('api_requests.AICClient.post')
+    def test_fetch_artworks_from_cache(self, mock_post):
+        """Test pages are shared between users through the cache and exclusions are applied locally."""
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {'data': [{'id': 1}, {'id': 2}, {'id': 3}]}
+
+        artworks, error = APIRequests.fetch_artworks_from_api(
+            APIRequests.build_century_query('19th Century', excluded_ids=[1]))
+        self.assertEqual([a['id'] for a in artworks], [2, 3])
+
+        artworks, error = APIRequests.fetch_artworks_from_api(
+            APIRequests.build_century_query('19th Century', excluded_ids=[2, 3]))
+        self.assertEqual([a['id'] for a in artworks], [1])
+        mock_post.assert_called_once()
+
+    @patch('api_requests.AICClient.post')
+    def test_fetch_artworks_errors_not_cached(self, mock_post):
+        """Test failed pages are fetched again on the next call."""
+        mock_post.return_value.status_code = 500
+
+        with app.test_request_context():
+            APIRequests.fetch_artworks_from_api(APIRequests.build_century_query('19th Century'))
+            APIRequests.fetch_artworks_from_api(APIRequests.build_century_query('19th Century'))
+        self.assertEqual(mock_post.call_count, 2)
+
     def test_filter_dates_within_range(self):
         """Test filtering artworks within the specified century range."""
         artwork = {
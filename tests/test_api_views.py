@@ -0,0 +1,122 @@
+#tests the JSON API routes in app.py
+
+import os
+from unittest import TestCase
+from models import db, User, Century, Favorite, NotFavorite, Artwork, Artist
+os.environ['APP_ENV'] = "testing"
+from app import app, CURR_USER_KEY
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_api_views.py
+
+class APIViewTestCase(TestCase):
+    """Tests for the JSON feed and rating routes"""
+    def setUp(self):
+        """Create test client add sample data"""
+        self.client = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+        century = Century(id=1, century_name='19th Century')
+        db.session.add(century)
+        db.session.commit()
+
+        user = User(id=1, username='testuser', password='testpassword', email='test@example.com',
+                    first_name='Test', last_name='User', century_id=century.id)
+        artist = Artist(id=1, artist_title='Stacy Smith')
+        db.session.add_all([user, artist])
+        db.session.commit()
+
+        db.session.add_all([Artwork(id=i, title=f"Art {i}", artist_id=artist.id, image_url="www.sample.jpg",
+                                    century_id=century.id) for i in range(1, 4)])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self, c):
+        with c.session_transaction() as sess:
+            sess[CURR_USER_KEY] = 1
+
+    def test_unauthorized(self):
+        """API calls without a logged in user get a 401"""
+        with self.client as c:
+            res = c.get('/api/feed/next')
+            self.assertEqual(res.status_code, 401)
+            self.assertEqual(res.get_json(), {'error': 'Access unauthorized.'})
+
+    def test_feed_next(self):
+        """The feed returns the next artwork with its century"""
+        with self.client as c:
+            self.login(c)
+            data = c.get('/api/feed/next').get_json()
+            self.assertEqual(data['century'], '19th Century')
+            self.assertIn(data['artwork']['id'], [1, 2, 3])
+            self.assertEqual(data['artwork']['artist_title'], 'Stacy Smith')
+
+    def test_favorite_returns_next_artwork(self):
+        """Favoriting answers with the next artwork, never the one just rated"""
+        with self.client as c:
+            self.login(c)
+            res = c.post('/api/favorites', json={'artwork_id': 2, 'feed': 'profile'})
+            self.assertEqual(res.status_code, 201)
+            self.assertNotEqual(res.get_json()['next']['artwork']['id'], 2)
+            self.assertIsNotNone(Favorite.query.filter_by(user_id=1, artwork_id=2).first())
+
+            res = c.post('/api/favorites', json={'artwork_id': 2})
+            self.assertEqual(res.status_code, 200)
+
+            res = c.delete('/api/favorites/2')
+            self.assertEqual(res.get_json(), {'removed': 2})
+            self.assertIsNone(Favorite.query.filter_by(user_id=1, artwork_id=2).first())
+
+    def test_dislike(self):
+        """Disliking records the dislike; unknown artworks are a 404"""
+        with self.client as c:
+            self.login(c)
+            res = c.post('/api/dislikes', json={'artwork_id': 3})
+            self.assertEqual(res.status_code, 201)
+            self.assertIsNotNone(NotFavorite.query.filter_by(user_id=1, artwork_id=3).first())
+
+            res = c.post('/api/dislikes', json={'artwork_id': 99})
+            self.assertEqual(res.status_code, 404)
+
+    def test_bad_artwork_id(self):
+        """Bodies that aren't an object, and artwork ids that aren't whole numbers, are a 400"""
+        with self.client as c:
+            self.login(c)
+            for body in ([1], {}, {'artwork_id': None}, {'artwork_id': 'abc'}, {'artwork_id': {'x': 1}},
+                         {'artwork_id': True}):
+                res = c.post('/api/favorites', json=body)
+                self.assertEqual(res.status_code, 400, body)
+                self.assertIn('error', res.get_json())
+            self.assertEqual(c.post('/api/favorites', json={'artwork_id': '2'}).status_code, 201)
+            self.assertEqual(c.delete('/api/favorites/abc').status_code, 400)
+
+    def test_csrf_required(self):
+        """With CSRF protection on, writes need the page's token in X-CSRFToken"""
+        app.config['WTF_CSRF_ENABLED'] = True
+        try:
+            with self.client as c:
+                self.login(c)
+                res = c.post('/api/favorites', json={'artwork_id': 2})
+                self.assertEqual(res.status_code, 400)
+                self.assertIsNone(Favorite.query.filter_by(user_id=1, artwork_id=2).first())
+        finally:
+            app.config['WTF_CSRF_ENABLED'] = False
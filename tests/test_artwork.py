@@ -1,13 +1,13 @@
 #tests artwork.py
-#tests the code that saves artwork to the db or to a file
+#tests the code that saves artwork to the db
 
 import os
 from unittest import TestCase
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from models import db, Artwork, Artist
 from artwork import SaveArtwork
-from app import app, CURR_USER_KEY
-from flask import current_app, get_flashed_messages
+os.environ['APP_ENV'] = "testing"
+from app import app
 import logging
 
 
@@ -17,7 +17,6 @@ logging.basicConfig(level=logging.ERROR)  # Set to WARNING to reduce output, or
 # Adjust logging level for SQLAlchemy specifically if needed
 logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
 app.config['WTF_CSRF_ENABLED'] = False
-os.environ['DATABASE_URL'] = "postgresql:///test_aic_capstone"
 
 # run these tests like:
 #
@@ -127,42 +126,72 @@ class TestSaveArtwork(TestCase):
         self.assertEqual(Artist.query.count(), 1)
 
     
-    def test_save_image_file(self):
-        """Testing downloading and image from the image_url and saving it the static file"""
-        #mock the `requests.get` method & return a mock response with status code 200 & mock the flash
-        with patch('artwork.requests.get') as mock_get:
-            mock_get.start()
-            #configure the mock to return a response with a succesful status code & binary
-            mock_get.return_value.status_code = 200
-            
-
-            #title & image_id to use for testing
-            title = self.artwork.title
-            image_id = self.artwork.image_id
-            image_url = self.artwork.image_url
-
-            # Ensure the test_images subfolder exists within the static folder
-            TEST_IMAGES_SUBFOLDER = 'test_images'
-            TEST_IMAGES_DIR = os.path.join(current_app.static_folder, TEST_IMAGES_SUBFOLDER)
-            os.makedirs(TEST_IMAGES_DIR, exist_ok=True) 
-
-            # Call the save_image_file method
-            SaveArtwork.save_image_file(image_url, image_id, title)
-
-            # self.assertTrue(mock_flash.called)
-            self.assertTrue(mock_get.called)
-
-            # Build the file path
-            test_image_path = os.path.join(TEST_IMAGES_DIR, f"{title.replace(' ', '_')}_{image_id}.jpg")
-
-            
-            #assert taht the file was created
-            self.assertTrue(os.path.exists(TEST_IMAGES_DIR))
-
-            if os.path.exists(test_image_path):
-                os.remove(test_image_path)
-
-           
+    def test_save_artworks_batch(self):
+        """Test a batch creates new artworks, updates existing ones and only adds missing artists."""
+        batch = [{
+            'id': artwork_id,
+            'title': f"Batch Artwork {artwork_id}",
+            'artist_title': artist_title,
+            'date_start': 1900,
+            'date_end': 1901,
+            'medium_display': "Oil on Canvas",
+            'dimensions': "200x300",
+            'image_id': f"batch_image_{artwork_id}",
+        } for artwork_id, artist_title in [(1, "Test Artist"), (2, "New Artist"), (3, "New Artist")]]
+
+        saved = SaveArtwork.save_artworks(batch, century_id=None)
+
+        self.assertEqual([artwork.id for artwork in saved], [1, 2, 3])
+        self.assertEqual(Artwork.query.count(), 3)
+        self.assertEqual(Artist.query.count(), 2)
+        self.assertEqual(Artwork.query.get(1).title, "Batch Artwork 1")
+        self.assertEqual(Artwork.query.get(1).artist_id, self.artist.id)
+        self.assertEqual(Artwork.query.get(2).artist_id, Artwork.query.get(3).artist_id)
+
+    def test_save_artworks_repeated_ids(self):
+        """Test rows repeated within a batch are upserted once but returned for every row."""
+        detail = {
+            'id': 5,
+            'title': "Repeated",
+            'artist_title': "Test Artist",
+            'medium_display': "Ink",
+            'dimensions': "1x1",
+            'image_id': "repeated",
+        }
+        saved = SaveArtwork.save_artworks([detail, detail, detail])
+
+        self.assertEqual(len(saved), 3)
+        self.assertEqual(Artwork.query.filter_by(id=5).count(), 1)
+
+    def test_save_artworks_skips_only_bad_rows(self):
+        """Test rows with a taken image_id or a missing title are skipped and the rest of the page saved."""
+        self.artwork.image_id = "taken"
+        db.session.commit()
+        batch = [{
+            'id': artwork_id,
+            'title': title,
+            'artist_title': "Test Artist",
+            'medium_display': "Ink",
+            'dimensions': "1x1",
+            'image_id': image_id,
+        } for artwork_id, title, image_id in [(2, "Taken image", "taken"), (3, "Fine", "img3"),
+                                              (4, "Same image as 3", "img3"), (5, None, "img5"), (6, "Fine", None)]]
+
+        saved = SaveArtwork.save_artworks(batch)
+
+        self.assertEqual([artwork.id for artwork in saved], [3, 6])
+        self.assertEqual(sorted(artwork.id for artwork in Artwork.query.all()), [1, 3, 6])
+
+    @patch('artwork.flash')
+    def test_save_artworks_flash_on_error(self, mock_flash):
+        """Test a failed batch is rolled back and nothing is returned."""
+        detail = {'id': 6, 'title': "Broken", 'artist_title': "Test Artist", 'medium_display': "Ink", 'dimensions': "1x1"}
+        with patch('artwork.db.session.commit', side_effect=Exception("DB Error")):
+            saved = SaveArtwork.save_artworks([detail])
+
+        self.assertEqual(saved, [])
+        mock_flash.assert_called_with('An error occurred while saving the artworks: DB Error', 'danger')
+
     @patch('artwork.flash')
     def test_save_artwork_flash_on_error(self, mock_flash):
         """Test that a flash message is sent on database error."""
@@ -182,31 +211,3 @@ class TestSaveArtwork(TestCase):
             result = SaveArtwork.save_artwork(artwork_detail)
             self.assertIsNone(result)
             mock_flash.assert_called_with('An error occurred while saving the artist: DB Error', 'danger')
-
-    @patch('artwork.requests.get')
-    @patch('artwork.flash')
-    def test_save_image_file_flash_success(self, mock_flash, mock_get):
-        """Ensure flash message is triggered correctly on successful image download."""
-        # Set up the mock return value
-        mock_get.return_value.status_code = 200
-            #using the b'' represents the byte string used in responses from servers\
-            #this simulates teh behavior of a successful HTTP GET reuest that retrieves
-            #data from a specified URL w/o performing the network operation
-        mock_get.return_value.content = b'fake-image-content'
-
-        image_id = "1adf2696-8489-499b-cad2-821d7fde4b33"
-        image_url = "https://www.artic.edu/iiif/2/2d484387-2509-5e8e-2c43-22f9981972eb/full/843,/0/default.jpg"
-        title = "A Sunday on La Grande Jatte — 1884"
-
-        # Expected path where the image should be saved
-        expected_image_path = os.path.join(current_app.static_folder, 'images', f"{title.replace(' ', '_')}_{image_id}.jpg")
-
-        # Call the method under test
-        SaveArtwork.save_image_file(image_url, image_id, title)
-
-        # Check if the file exists and clean up
-        self.assertTrue(os.path.exists(expected_image_path))
-        os.remove(expected_image_path)
-
-        # Ensure flash was called with success message
-        mock_flash.assert_called_with("Images successfully saved.", "success")
@@ -0,0 +1,110 @@
+#tests async_client.py
+#tests fetching search pages on the asyncio event loop
+
+import json
+import threading
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+from async_client import AsyncAICClient
+from api_requests import APIRequests
+from http_client import AICClient
+from page_cache import PageCache
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_async_client.py
+
+@skipIf(httpx is None, "httpx isn't installed")
+class TestAsyncAICClient(TestCase):
+    """Tests the AsyncAICClient class"""
+    def setUp(self):
+        self.requests = []
+        self.statuses = []
+        AsyncAICClient.TRANSPORT = httpx.MockTransport(self.handle)
+        AsyncAICClient.ENABLED = True
+        AsyncAICClient.reset()
+        PageCache.clear()
+
+    def tearDown(self):
+        AsyncAICClient.reset()
+        AsyncAICClient.TRANSPORT = None
+        AsyncAICClient.ENABLED = False
+        PageCache.clear()
+
+    def handle(self, request):
+        """Stand-in for the search API: answers with the queued status codes, then pages of artworks"""
+        self.requests.append(request)
+        status = self.statuses.pop(0) if self.statuses else 200
+        page = json.loads(request.read())['page']
+        return httpx.Response(status, json={'data': [{'id': page * 10 + i} for i in range(APIRequests.PAGE_LIMIT)]})
+
+    def test_page_fetched_on_event_loop(self):
+        """A page comes back through a concurrent future and is cached"""
+        query = APIRequests.build_century_query('19th Century', page=2)
+        data, error, message = AsyncAICClient.submit(APIRequests.request_page_async(query)).result(timeout=5)
+        self.assertIsNone(error)
+        self.assertEqual(data[0]['id'], 20)
+        self.assertEqual(PageCache.get(query), data)
+
+    @patch('async_client.AICClient.BACKOFF_FACTOR', 0)
+    def test_retries_server_errors(self):
+        """429/5xx responses are retried up to MAX_RETRIES times"""
+        self.statuses = [503, 429]
+        query = APIRequests.build_century_query('19th Century')
+        data, error, message = AsyncAICClient.submit(APIRequests.request_page_async(query)).result(timeout=5)
+        self.assertIsNone(error)
+        self.assertEqual(len(self.requests), 3)
+
+        self.statuses = [500] * (AICClient.MAX_RETRIES + 1)
+        data, error, message = AsyncAICClient.submit(
+            APIRequests.request_page_async(APIRequests.build_century_query('18th Century'))).result(timeout=5)
+        self.assertEqual(error, "Failed with status code 500")
+
+    @patch('api_requests.save_artworks')
+    def test_collect_artworks_uses_event_loop(self, mock_save_artworks):
+        """collect_artworks pages through the async client when it's enabled"""
+        mock_save_artworks.side_effect = lambda batch, century_id=None: batch
+        with patch('api_requests.AICClient.post') as mock_post:
+            saved, error = APIRequests.collect_artworks('19th Century', 250)
+        mock_post.assert_not_called()
+        self.assertIsNone(error)
+        self.assertEqual(len(saved), 250)
+        self.assertEqual(saved[0]['id'], 10)
+
+    def test_identical_pages_coalesced(self):
+        """Concurrent requests for the same page on the event loop share one API call"""
+        query = APIRequests.build_century_query('20th Century')
+        futures = [AsyncAICClient.submit(APIRequests.request_page_async(query)) for i in range(3)]
+        results = [future.result(timeout=5) for future in futures]
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_follower_finds_cached_page(self):
+        """A fetch that starts after another worker cached the page serves it without calling the API"""
+        query = APIRequests.build_century_query('19th Century', page=3)
+        PageCache.set(query, [{'id': 1}])
+        data, error, message = AsyncAICClient.submit(APIRequests._fetch_page_async(query)).result(timeout=5)
+        self.assertEqual(data, [{'id': 1}])
+        self.assertEqual(self.requests, [])
+
+    def test_sqlite_work_kept_off_the_loop(self):
+        """The rate limiter's bucket and the page cache are used from executor threads, not the event loop"""
+        threads = set()
+        def record(fn):
+            def wrapper(*args, **kwargs):
+                threads.add(threading.current_thread().name)
+                return fn(*args, **kwargs)
+            return wrapper
+        with patch('rate_limit.RateLimiter.try_acquire', record(lambda: 0)), \
+                patch('api_requests.PageCache.get', record(PageCache.get)), \
+                patch('api_requests.PageCache.set', record(PageCache.set)):
+            query = APIRequests.build_century_query('18th Century', page=4)
+            data, error, message = AsyncAICClient.submit(APIRequests.request_page_async(query)).result(timeout=5)
+        self.assertIsNone(error)
+        self.assertTrue(threads)
+        self.assertNotIn("aic-async", threads)
@@ -0,0 +1,71 @@
+#tests bench/fake_aic.py and bench/run.py
+#tests the fake AIC API's search answers and failure knobs, and the benchmark's statistics
+
+from unittest import TestCase
+import requests
+from bench.fake_aic import FakeAIC, load_artworks, serve, app_env
+from bench.run import percentile, summarize, regressions
+from api_requests import APIRequests
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_bench.py
+
+class TestFakeAIC(TestCase):
+    """Tests the fake AIC API"""
+    def setUp(self):
+        self.artworks = load_artworks(path="/nonexistent", synthetic=300)
+
+    def test_search_filters_like_aic(self):
+        """Searches apply the app's century range and exclusions, and page the hits"""
+        fake = FakeAIC(self.artworks)
+        query = APIRequests.build_century_query('19th Century', excluded_ids=[self.artworks[0]['id']])
+        query['limit'] = 10
+        response = fake.search(query)
+        self.assertEqual(len(response['data']), 10)
+        self.assertEqual(set(response['data'][0]), set(APIRequests.FIELDS))
+        for artwork in response['data']:
+            self.assertTrue(1800 <= artwork['date_start'] <= 1899 or 1800 <= artwork['date_end'] <= 1899)
+            self.assertNotEqual(artwork['id'], self.artworks[0]['id'])
+
+        last_page = response['pagination']['total_pages']
+        query['page'] = last_page + 1
+        self.assertEqual(fake.search(query)['data'], [])
+
+    def test_server_counts_and_throttles(self):
+        """The server counts calls and answers 429 past its rate limit"""
+        fake = FakeAIC(self.artworks, rate_per_minute=2)
+        server = serve(fake)
+        self.addCleanup(server.shutdown)
+        url = app_env(server)["AIC_API_URL"]
+        query = APIRequests.build_century_query('20th Century')
+        statuses = [requests.post(url, json=query, timeout=5).status_code for i in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(fake.stats["search"], 3)
+        self.assertEqual(fake.stats["throttled"], 1)
+
+    def test_server_errors(self):
+        """With an error rate of 1 every call is a 503"""
+        fake = FakeAIC(self.artworks, error_rate=1.0)
+        server = serve(fake)
+        self.addCleanup(server.shutdown)
+        image_url = app_env(server)["AIC_IIIF_URL"].format(image_id="abc", width=400)
+        self.assertEqual(requests.get(image_url, timeout=5).status_code, 503)
+        self.assertEqual(fake.stats["errors"], 1)
+
+
+class TestBenchStats(TestCase):
+    """Tests the benchmark's statistics"""
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_regressions(self):
+        """Only metrics worse than the baseline by more than the tolerance are reported"""
+        baseline = {'profile': summarize([0.1] * 10, [5] * 10, 0, 0, 1)}
+        same = {'profile': summarize([0.11] * 10, [5] * 10, 0, 0, 1)}
+        slower = {'profile': summarize([0.5] * 10, [20] * 10, 0, 0, 1)}
+        self.assertEqual(regressions(same, baseline, 0.25), [])
+        self.assertEqual(len(regressions(slower, baseline, 0.25)), 2)
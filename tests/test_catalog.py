@@ -0,0 +1,135 @@
+#tests catalog.py
+#tests the local, century-partitioned artwork catalog
+
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from models import db, User, Century, Favorite, NotFavorite, Artwork, Artist
+from catalog import ArtworkCatalog
+from api_requests import APIRequests
+from surprise_pools import SurprisePools
+os.environ['APP_ENV'] = "testing"
+from app import app
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_catalog.py
+
+class TestArtworkCatalog(TestCase):
+    """Tests the ArtworkCatalog class"""
+    def setUp(self):
+        """Create test client add sample data"""
+        self.client = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        ArtworkCatalog._result_pages.clear()
+        SurprisePools.reset()
+        self.populate_db()
+
+    def populate_db(self):
+        """Runs before each test"""
+        db.drop_all()
+        db.create_all()
+
+        c_18 = Century(id=1, century_name='18th Century')
+        c_19 = Century(id=2, century_name='19th Century')
+        db.session.add_all([c_18, c_19])
+        db.session.commit()
+
+        user = User(id=1, username='testuser', password='testpassword', email='test@example.com',
+                    first_name='Test', last_name='User', century_id=c_19.id)
+        artist = Artist(id=1, artist_title='Stacy Smith')
+        db.session.add_all([user, artist])
+        db.session.commit()
+
+        #three artworks in the 19th century partition, one in the 18th
+        artworks = [Artwork(id=i, title=f"Art {i}", artist_id=artist.id, image_url="www.sample.jpg",
+                            century_id=c_19.id) for i in range(1, 4)]
+        artworks.append(Artwork(id=4, title="Old Art", artist_id=artist.id, image_url="www.sample.jpg",
+                                century_id=c_18.id))
+        db.session.add_all(artworks)
+        db.session.commit()
+
+        db.session.add_all([Favorite(user_id=user.id, artist_id=artist.id, artwork_id=1),
+                            NotFavorite(user_id=user.id, artist_id=artist.id, artwork_id=2)])
+        db.session.commit()
+
+        self.user = user
+        self.c_18 = c_18
+        self.c_19 = c_19
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_sample_skips_rated_artworks(self):
+        """Only unrated artworks from the user's century are sampled"""
+        artworks = ArtworkCatalog.get_artworks(self.user, limit=10)
+        self.assertEqual([a.id for a in artworks], [3])
+
+    def test_surprise_me_uses_other_century(self):
+        """Surprise artworks come from a century the user didn't choose"""
+        artworks, century = ArtworkCatalog.surprise_me(self.user, limit=10)
+        self.assertEqual(century, '18th Century')
+        self.assertEqual([a.id for a in artworks], [4])
+
+    @patch('catalog.APIRequests.count_results', return_value=None)
+    @patch('catalog.APIRequests.collect_artworks')
+    def test_sync_century(self, mock_collect, mock_count):
+        """Syncing a century saves artworks into that century's partition"""
+        mock_collect.return_value = (['art'] * 5, None)
+        count = ArtworkCatalog.sync_century(self.c_18)
+
+        self.assertEqual(count, 5)
+        mock_collect.assert_called_once()
+        self.assertEqual(mock_collect.call_args.args, ('18th Century', ArtworkCatalog.SYNC_TARGET))
+        self.assertEqual(mock_collect.call_args.kwargs['century_id'], self.c_18.id)
+
+    @patch('catalog.APIRequests.count_results')
+    def test_start_page_within_results(self, mock_count):
+        """Syncs start at a random page that leaves enough of the century's results to reach SYNC_TARGET"""
+        needed = -(-ArtworkCatalog.SYNC_TARGET // APIRequests.PAGE_LIMIT)
+        mock_count.return_value = 12 * APIRequests.PAGE_LIMIT
+        starts = {ArtworkCatalog.start_page(self.c_18) for i in range(200)}
+        self.assertEqual(starts, set(range(1, 12 - needed + 2)))
+
+        #too few results to move around in, or no count at all: the last count holds
+        mock_count.return_value = 3
+        self.assertEqual(ArtworkCatalog.start_page(self.c_18), 1)
+        mock_count.return_value = None
+        self.assertEqual(ArtworkCatalog.start_page(self.c_18), 1)
+        #the API won't page past MAX_PAGES however many results there are
+        mock_count.return_value = 10 ** 6
+        self.assertLessEqual(ArtworkCatalog.start_page(self.c_18), APIRequests.MAX_PAGES - needed + 1)
+
+    def test_sync_lock(self):
+        """Only one holder of the sync lock file at a time"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "catalog_sync.lock")
+            #flock locks belong to the open file, so a nested open stands in for another worker
+            with ArtworkCatalog._sync_lock(path) as first, ArtworkCatalog._sync_lock(path) as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+            with ArtworkCatalog._sync_lock(path) as again:
+                self.assertTrue(again)
+
+    @patch('catalog.APIRequests.count_results', return_value=None)
+    @patch('catalog.APIRequests.collect_artworks')
+    def test_sync_all(self, mock_collect, mock_count):
+        """Every known century is synced"""
+        mock_collect.return_value = ([], None)
+        synced = ArtworkCatalog.sync_all()
+        self.assertEqual(synced, {'18th Century': 0, '19th Century': 0})
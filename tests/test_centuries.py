@@ -0,0 +1,71 @@
+#tests centuries.py
+#tests the in-process Century cache
+
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from models import db, Century
+from centuries import CenturyCache
+os.environ['APP_ENV'] = "testing"
+from app import app
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_centuries.py
+
+class TestCenturyCache(TestCase):
+    """Tests the CenturyCache class"""
+    def setUp(self):
+        """Create test client add sample data"""
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([Century(id=1, century_name='19th Century'), Century(id=2, century_name='18th Century')])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_loaded_once(self):
+        """Centuries are read from the db once and then served from memory"""
+        self.assertEqual(CenturyCache.name(2), '18th Century')
+        with patch('centuries.Century.query') as mock_query:
+            self.assertEqual(CenturyCache.choices(), [(1, '19th Century'), (2, '18th Century')])
+            self.assertEqual(CenturyCache.choices(order_by='century_name'), [(2, '18th Century'), (1, '19th Century')])
+            self.assertIsNone(CenturyCache.get(3))
+        mock_query.order_by.assert_not_called()
+
+    def test_writes_invalidate(self):
+        """Adding, renaming or bulk deleting centuries is picked up on the next read"""
+        CenturyCache.all()
+        db.session.add(Century(id=3, century_name='20th Century'))
+        db.session.commit()
+        self.assertEqual(CenturyCache.name(3), '20th Century')
+
+        db.session.get(Century, 3).century_name = 'Modern'
+        db.session.commit()
+        self.assertEqual(CenturyCache.name(3), 'Modern')
+
+        Century.query.filter_by(id=3).delete()
+        db.session.commit()
+        self.assertIsNone(CenturyCache.get(3))
+
+    def test_seed_is_idempotent(self):
+        """Seeding only adds the centuries that are missing"""
+        CenturyCache.seed(['18th Century', '19th Century', '20th Century'])
+        CenturyCache.seed(['18th Century', '19th Century', '20th Century'])
+        self.assertEqual([c.century_name for c in CenturyCache.all()],
+                         ['19th Century', '18th Century', '20th Century'])
@@ -0,0 +1,50 @@
+#tests config.py
+#tests the development/testing/production profiles
+
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from config import config_for, engine_options, DevelopmentConfig, TestingConfig, ProductionConfig, TEST_STATE_DIR
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_config.py
+
+class ConfigTestCase(TestCase):
+    """Tests for the config profiles"""
+    def test_config_for(self):
+        """APP_ENV picks the profile, and development is the default"""
+        with patch.dict(os.environ, {"APP_ENV": "production"}):
+            self.assertIs(config_for(), ProductionConfig)
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIs(config_for(), DevelopmentConfig)
+        self.assertIs(config_for("testing"), TestingConfig)
+        with self.assertRaises(ValueError):
+            config_for("staging")
+
+    def test_production_is_quiet(self):
+        """Production has no debug toolbar and never echoes SQL"""
+        self.assertTrue(DevelopmentConfig.DEBUG_TOOLBAR)
+        self.assertFalse(ProductionConfig.DEBUG_TOOLBAR)
+        self.assertFalse(ProductionConfig.SQLALCHEMY_ECHO)
+        self.assertTrue(ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS["pool_pre_ping"])
+
+    def test_engine_options(self):
+        """Postgres connections are pooled per the environment and get a statement timeout"""
+        env = {"DB_POOL_SIZE": "20", "DB_MAX_OVERFLOW": "5", "DB_STATEMENT_TIMEOUT": "2000"}
+        with patch.dict(os.environ, env):
+            options = engine_options("postgresql:///aic_capstone")
+        self.assertEqual((options["pool_size"], options["max_overflow"]), (20, 5))
+        self.assertEqual(options["connect_args"], {"options": "-c statement_timeout=2000"})
+        self.assertEqual(engine_options("sqlite:///aic.db"), {"pool_pre_ping": True})
+
+    def test_testing_profile(self):
+        """The testing profile needs no database server and hashes passwords cheaply"""
+        if not os.getenv("TEST_DATABASE_URL"):
+            self.assertEqual(TestingConfig.SQLALCHEMY_DATABASE_URI, "sqlite://")
+        self.assertLess(TestingConfig.BCRYPT_LOG_ROUNDS, 12)
+        #sessions work without a SECRET_KEY in the environment
+        self.assertTrue(TestingConfig.SECRET_KEY)
+        #local state stays out of the checkout
+        for key in ("AIC_RATE_STATE_PATH", "IMAGE_QUEUE_PATH", "IMAGE_STORE_INDEX", "IMAGE_STORE_DIR"):
+            self.assertTrue(getattr(TestingConfig, key).startswith(TEST_STATE_DIR), key)
@@ -0,0 +1,105 @@
+#tests exclusions.py
+#tests the per-user record of rated artworks
+
+import os
+from unittest import TestCase
+from models import db, User, Century, Favorite, NotFavorite, Artwork, Artist, UserExclusion
+from exclusions import ExclusionSet, ExcludedArtworks
+from favoriting_Art import ArtworkFavorites
+os.environ['APP_ENV'] = "testing"
+from app import app
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_exclusions.py
+
+class TestExclusionSet(TestCase):
+    """Tests the ExclusionSet structure"""
+    def test_sorted_and_unique(self):
+        exclusions = ExclusionSet([5, 1, 5, 3])
+        self.assertEqual(list(exclusions), [1, 3, 5])
+        self.assertIn(3, exclusions)
+        self.assertNotIn(4, exclusions)
+
+    def test_add_and_discard(self):
+        exclusions = ExclusionSet([1, 5])
+        exclusions.add(3)
+        exclusions.add(3)
+        exclusions.discard(1)
+        exclusions.discard(42)
+        self.assertEqual(list(exclusions), [3, 5])
+
+    def test_round_trip_bytes(self):
+        exclusions = ExclusionSet([7, 70000, 2])
+        self.assertEqual(len(exclusions.to_bytes()), 12)
+        self.assertEqual(list(ExclusionSet.from_bytes(exclusions.to_bytes())), [2, 7, 70000])
+
+
+class TestExcludedArtworks(TestCase):
+    """Tests keeping a user's exclusions in step with their ratings"""
+    def setUp(self):
+        """Create test client add sample data"""
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+        century = Century(id=1, century_name='19th Century')
+        db.session.add(century)
+        db.session.commit()
+
+        self.user = User(id=1, username='testuser', password='testpassword', email='test@example.com',
+                         first_name='Test', last_name='User', century_id=century.id)
+        artist = Artist(id=1, artist_title='Stacy Smith')
+        db.session.add_all([self.user, artist])
+        db.session.commit()
+
+        db.session.add_all([Artwork(id=i, title=f"Art {i}", artist_id=artist.id, image_url="www.sample.jpg")
+                            for i in range(1, 5)])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_backfill_from_ratings(self):
+        """Existing favorites and dislikes are picked up the first time exclusions are loaded"""
+        db.session.add_all([Favorite(user_id=1, artist_id=1, artwork_id=2),
+                            NotFavorite(user_id=1, artist_id=1, artwork_id=1)])
+        db.session.commit()
+
+        self.assertEqual(list(ExcludedArtworks.load(1)), [1, 2])
+        self.assertIsNotNone(db.session.get(UserExclusion, 1))
+
+    def test_rating_updates_exclusions(self):
+        """Favoriting, disliking and unfavoriting keep the exclusions current"""
+        ArtworkFavorites.fav_artwork(self.user, 3)
+        ArtworkFavorites.dislike_artwork(self.user, '4')
+        self.assertEqual(list(ExcludedArtworks.load(1)), [3, 4])
+
+        ArtworkFavorites.unfavorite_artwork(self.user, 3)
+        self.assertEqual(list(ExcludedArtworks.load(1)), [4])
+
+    def test_backfill_keeps_concurrent_row(self):
+        """A row another request created first is kept rather than inserted again"""
+        db.session.add(UserExclusion(user_id=1, artwork_ids=ExclusionSet([4]).to_bytes()))
+        db.session.commit()
+        db.session.add(Favorite(user_id=1, artist_id=1, artwork_id=2))
+        db.session.commit()
+
+        ExcludedArtworks._backfill(1)
+        ExcludedArtworks.add(1, 3)
+        db.session.commit()
+        self.assertEqual(list(ExcludedArtworks.load(1)), [3, 4])
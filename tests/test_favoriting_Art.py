@@ -1,4 +1,5 @@
 from unittest import TestCase
+from unittest.mock import patch
 from models import User, Century, db, Artwork, Artist, Favorite, NotFavorite
 import os
 import logging
@@ -17,10 +18,11 @@ logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
 
 #set up the environmenta database
 
-os.environ['DATABASE_URL'] = "postgresql:///test_aic_capstone"
+os.environ['APP_ENV'] = "testing"
 
 #import the app
 from app import app, CURR_USER_KEY
+from favoriting_Art import ArtworkFavorites
 
 app.config['WTF_CSRF_ENABLED'] = False
 
@@ -137,4 +139,46 @@ class ArtworkViewTestCase(TestCase):
                 self.assertIn("18th Century", html)
 
                 not_favorite = NotFavorite.query.filter_by(user_id=self.u1.id, artwork_id=self.test_art_s.id).first()
-                self.assertIsNone(not_favorite)
\ No newline at end of file
+                self.assertIsNone(not_favorite)
+
+    def test_favorite_twice_is_idempotent(self):
+        """Favoriting the same artwork again leaves a single favorite"""
+        self.assertNotEqual(ArtworkFavorites.fav_artwork(self.u1, self.test_art_s.id), 200)
+        self.assertEqual(ArtworkFavorites.fav_artwork(self.u1, self.test_art_s.id), 200)
+        self.assertEqual(ArtworkFavorites.dislike_artwork(self.u1, self.test_art_a.id), 201)
+        self.assertEqual(ArtworkFavorites.dislike_artwork(self.u1, self.test_art_a.id), 200)
+
+        self.assertEqual(Favorite.query.filter_by(user_id=self.u1.id).count(), 1)
+        self.assertEqual(NotFavorite.query.filter_by(user_id=self.u1.id).count(), 1)
+
+    def test_favorites_keyset_pages(self):
+        """Favorites come back a page at a time, each page picking up after the last"""
+        ArtworkFavorites.fav_artwork(self.u1, self.test_art_s.id)
+        ArtworkFavorites.fav_artwork(self.u1, self.test_art_a.id)
+
+        first, cursor = ArtworkFavorites.favorites_page(self.u1.id, limit=1)
+        self.assertEqual([f.title for f in first], [self.test_art_s.title])
+        self.assertEqual(first[0].artist_title, "Stacy Smith")
+
+        second, cursor = ArtworkFavorites.favorites_page(self.u1.id, after=cursor, limit=1)
+        self.assertEqual([f.artist_title for f in second], ["Allison Currie"])
+        self.assertIsNone(cursor)
+
+    def test_favorites_next_page_partial(self):
+        """The favorites page links to the next page, which can be fetched as bare cards"""
+        ArtworkFavorites.fav_artwork(self.u1, self.test_art_s.id)
+        ArtworkFavorites.fav_artwork(self.u1, self.test_art_a.id)
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1.id
+            with patch.object(ArtworkFavorites, 'PAGE_SIZE', 1):
+                html = c.get('/users/favorites').get_data(as_text=True)
+                self.assertIn("Does Allison love Em more than queso?", html)
+                self.assertNotIn("yellow octopus", html)
+                self.assertIn('data-next="/users/favorites?after=', html)
+
+                favorite_id = Favorite.query.filter_by(artwork_id=self.test_art_s.id).first().id
+                html = c.get(f'/users/favorites?after={favorite_id}&partial=1').get_data(as_text=True)
+                self.assertIn("yellow octopus", html)
+                self.assertNotIn("<h1", html)
+                self.assertNotIn("favorites-more", html)
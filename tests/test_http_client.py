@@ -0,0 +1,53 @@
+#tests http_client.py
+#tests the pooled session used to talk to the AIC API
+
+from unittest import TestCase
+from unittest.mock import patch
+from http_client import AICClient
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_http_client.py
+
+class TestAICClient(TestCase):
+    """Tests the AICClient class"""
+    def setUp(self):
+        AICClient.reset()
+
+    def tearDown(self):
+        AICClient.reset()
+
+    def test_session_is_shared(self):
+        """The same session is handed out on every call within a process"""
+        self.assertIs(AICClient.session(), AICClient.session())
+
+    def test_session_rebuilt_after_fork(self):
+        """A different process id gets a fresh session"""
+        session = AICClient.session()
+        with patch('http_client.os.getpid', return_value=-1):
+            self.assertIsNot(AICClient.session(), session)
+
+    def test_retry_policy(self):
+        """Retries back off on 429/5xx and honor Retry-After"""
+        adapter = AICClient.session().get_adapter("https://api.artic.edu")
+        retry = adapter.max_retries
+
+        self.assertEqual(retry.total, AICClient.MAX_RETRIES)
+        self.assertIn(429, retry.status_forcelist)
+        self.assertIn(503, retry.status_forcelist)
+        self.assertIn("POST", retry.allowed_methods)
+        self.assertTrue(retry.respect_retry_after_header)
+
+    def test_default_timeouts(self):
+        """Requests get the configured connect/read timeouts unless one is given"""
+        with patch('requests.Session.request') as mock_request:
+            AICClient.post("https://api.artic.edu/api/v1/artworks/search", json={})
+            self.assertEqual(mock_request.call_args.kwargs['timeout'],
+                             (AICClient.CONNECT_TIMEOUT, AICClient.READ_TIMEOUT))
+
+            AICClient.get("https://www.artic.edu/iiif/2/x/full/843,/0/default.jpg", timeout=1)
+            self.assertEqual(mock_request.call_args.kwargs['timeout'], 1)
+
+    def test_metrics_without_requests(self):
+        """Metrics are zero before anything has been sent"""
+        self.assertEqual(AICClient.metrics(), {"requests": 0, "connections": 0, "reused": 0})
@@ -0,0 +1,114 @@
+#tests image_jobs.py
+#tests the background image download queue
+
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+from image_jobs import ImageDownloads
+from image_store import ImageStore
+from local_state import connect
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_image_jobs.py
+
+class FakeApp:
+    """Just enough of a Flask app for ImageDownloads.init_app and ImageStore.init_app"""
+    def __init__(self, root):
+        self.config = {"IMAGE_WORKERS": 1, "IMAGE_QUEUE_PATH": os.path.join(root, "jobs.sqlite3")}
+        self.instance_path = root
+        self.static_folder = os.path.join(root, "static")
+
+
+class TestImageDownloads(TestCase):
+    """Tests the ImageDownloads class"""
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = FakeApp(self.tmp_dir.name)
+        ImageStore.init_app(self.app)
+        ImageDownloads.init_app(self.app)
+
+    def tearDown(self):
+        ImageDownloads._executor.shutdown(wait=True)
+        self.tmp_dir.cleanup()
+
+    def pending_jobs(self):
+        with connect(ImageDownloads.QUEUE_PATH) as conn:
+            return conn.execute("SELECT image_id, status FROM image_jobs").fetchall()
+
+    @patch('image_store.AICClient.get')
+    def test_download_streams_to_images_dir(self, mock_get):
+        """A queued image is streamed to disk and its job removed"""
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b'fake-', b'image']
+
+        future = ImageDownloads.enqueue("abc", "https://example.com/a.jpg")
+        self.assertTrue(future.result(timeout=5))
+
+        image_path = os.path.join(self.app.static_folder, "images", "store", "ab", "abc_843.jpg")
+        with open(image_path, 'rb') as image_file:
+            self.assertEqual(image_file.read(), b'fake-image')
+        self.assertEqual(os.listdir(os.path.dirname(image_path)), ["abc_843.jpg"])
+        self.assertEqual(self.pending_jobs(), [])
+
+    @patch('image_store.AICClient.get')
+    def test_stored_image_not_queued(self, mock_get):
+        """An image already in the store is never queued or downloaded again"""
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b'image']
+        ImageDownloads.enqueue("abc", "https://example.com/a.jpg").result(timeout=5)
+
+        self.assertIsNone(ImageDownloads.enqueue("abc", "https://example.com/a.jpg"))
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('image_store.AICClient.get')
+    def test_duplicate_enqueue_ignored(self, mock_get):
+        """An image that's already queued isn't queued twice"""
+        ImageDownloads._executor.shutdown(wait=True)
+        ImageDownloads._executor = MagicMock()
+
+        ImageDownloads.enqueue("abc", "https://example.com/a.jpg")
+        self.assertIsNone(ImageDownloads.enqueue("abc", "https://example.com/a.jpg"))
+        self.assertEqual(self.pending_jobs(), [("abc", "pending")])
+
+    @patch('image_store.AICClient.get')
+    def test_jobs_survive_restart(self, mock_get):
+        """Jobs still queued when the app stops are resumed on the next start"""
+        ImageDownloads._executor.shutdown(wait=True)
+        ImageDownloads._executor = MagicMock()
+        ImageDownloads.enqueue("abc", "https://example.com/a.jpg")
+
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b'image']
+        futures = ImageDownloads.init_app(self.app)
+
+        self.assertEqual([future.result(timeout=5) for future in futures], [True])
+        self.assertEqual(self.pending_jobs(), [])
+
+    @patch('image_jobs.time.sleep')
+    @patch('image_store.AICClient.get')
+    def test_failed_download_retried_then_given_up(self, mock_get, mock_sleep):
+        """A failing download is retried up to MAX_ATTEMPTS, backing off in between, and then marked failed"""
+        mock_get.return_value.status_code = 500
+
+        future = ImageDownloads.enqueue("abc", "https://example.com/a.jpg")
+        self.assertFalse(future.result(timeout=5))
+
+        self.assertEqual(mock_get.call_count, ImageDownloads.MAX_ATTEMPTS)
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [2, 4])
+        self.assertEqual(self.pending_jobs(), [("abc", "failed")])
+
+    @patch('image_jobs.time.sleep')
+    @patch('image_store.AICClient.get')
+    def test_failed_download_queued_again(self, mock_get, mock_sleep):
+        """Favoriting an image whose download failed queues it again"""
+        mock_get.return_value.status_code = 500
+        self.assertFalse(ImageDownloads.enqueue("abc", "https://example.com/a.jpg").result(timeout=5))
+
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b"jpeg"]
+        future = ImageDownloads.enqueue("abc", "https://example.com/a.jpg")
+        self.assertIsNotNone(future)
+        self.assertTrue(future.result(timeout=5))
+        self.assertEqual(self.pending_jobs(), [])
@@ -0,0 +1,187 @@
+#tests image_store.py
+#tests the image_id-addressed image store and its eviction
+
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from models import db, User, Century, Favorite, Artwork, Artist
+from image_store import ImageStore
+from local_state import connect
+os.environ['APP_ENV'] = "testing"
+from app import app, image_src
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_image_store.py
+
+class TestImageStore(TestCase):
+    """Tests the ImageStore class"""
+    def setUp(self):
+        """Point the store at a temp directory and add sample data"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = {key: app.config.get(key) for key in
+                       ("IMAGE_STORE_DIR", "IMAGE_STORE_INDEX", "IMAGE_STORE_MAX_BYTES")}
+        app.config["IMAGE_STORE_DIR"] = os.path.join(self.tmp_dir.name, "store")
+        app.config["IMAGE_STORE_INDEX"] = os.path.join(self.tmp_dir.name, "index.sqlite3")
+        app.config["IMAGE_STORE_MAX_BYTES"] = 10
+        ImageStore.init_app(app)
+
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+        century = Century(id=1, century_name='19th Century')
+        db.session.add(century)
+        db.session.commit()
+        user = User(id=1, username='testuser', password='testpassword', email='test@example.com',
+                    first_name='Test', last_name='User', century_id=century.id)
+        artist = Artist(id=1, artist_title='Stacy Smith')
+        db.session.add_all([user, artist])
+        db.session.commit()
+        db.session.add_all([Artwork(id=i, title=f"Art {i}", artist_id=1, image_id=f"img{i}", image_url="www.sample.jpg")
+                            for i in range(1, 4)])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        app.config.update(self.config)
+        ImageStore.init_app(app)
+        self.tmp_dir.cleanup()
+
+    def test_path_is_sharded(self):
+        """Images are filed under a directory named after the first characters of their id"""
+        self.assertEqual(ImageStore.path_for("2d484387-2509"),
+                         os.path.join(ImageStore.ROOT, "2d", "2d484387-2509_843.jpg"))
+        with self.assertRaises(ValueError):
+            ImageStore.path_for("../secrets")
+
+    @patch('image_store.AICClient.get')
+    def test_fetch_checks_store_first(self, mock_get):
+        """A stored image is never downloaded again"""
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b'12345']
+
+        self.assertTrue(ImageStore.fetch("img1", "https://example.com/1.jpg"))
+        self.assertTrue(ImageStore.fetch("img1", "https://example.com/1.jpg"))
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(ImageStore.total_bytes(), 5)
+        self.assertTrue(ImageStore.has("img1"))
+
+    @patch('image_store.AICClient.get')
+    def test_failed_download_not_stored(self, mock_get):
+        """Nothing is stored when the image server doesn't return the image"""
+        mock_get.return_value.status_code = 404
+        self.assertFalse(ImageStore.fetch("img1", "https://example.com/1.jpg"))
+        self.assertFalse(ImageStore.has("img1"))
+
+    @patch('image_store.AICClient.get')
+    def test_evicts_least_recently_used_unfavorited(self, mock_get):
+        """Going over the size limit evicts old images, but never favorited ones"""
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b'1234']
+        db.session.add(Favorite(user_id=1, artist_id=1, artwork_id=1))
+        db.session.commit()
+
+        ImageStore.fetch("img1", "https://example.com/1.jpg")
+        ImageStore.fetch("img2", "https://example.com/2.jpg")
+        #12 bytes against a 10 byte limit: img1 is oldest but favorited, so img2 goes
+        ImageStore.fetch("img3", "https://example.com/3.jpg")
+
+        self.assertTrue(ImageStore.has("img1"))
+        self.assertFalse(ImageStore.has("img2"))
+        self.assertFalse(os.path.exists(ImageStore.path_for("img2")))
+        self.assertTrue(ImageStore.has("img3"))
+        self.assertEqual(ImageStore.total_bytes(), 8)
+
+    @patch('image_store.AICClient.get')
+    def test_access_touched_at_most_hourly(self, mock_get):
+        """Hits only write the last access once it's stale, and misses never write"""
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b'1']
+        ImageStore.fetch("img1", "https://example.com/1.jpg")
+
+        def last_access():
+            with connect(ImageStore.INDEX_PATH) as conn:
+                return conn.execute("SELECT last_access FROM images WHERE image_id = 'img1'").fetchone()[0]
+
+        fetched_at = last_access()
+        self.assertTrue(ImageStore.has("img1"))
+        self.assertEqual(last_access(), fetched_at)
+
+        with patch('image_store.time.time', return_value=fetched_at + ImageStore.TOUCH_INTERVAL + 1):
+            self.assertTrue(ImageStore.has("img1"))
+            self.assertFalse(ImageStore.has("img2"))
+        self.assertEqual(last_access(), fetched_at + ImageStore.TOUCH_INTERVAL + 1)
+
+    @patch('image_store.AICClient.get')
+    def test_stored_image_served_locally(self, mock_get):
+        """A stored image is served from disk with long-lived caching headers"""
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b'12']
+        ImageStore.fetch("img1", "https://example.com/1.jpg", ImageStore.SIZES["thumb"])
+
+        with app.test_client() as client:
+            res = client.get('/images/img1/thumb')
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data, b'12')
+            self.assertIn('immutable', res.headers['Cache-Control'])
+            etag = res.headers['ETag']
+            res.close()
+
+            res = client.get('/images/img1/thumb', headers={'If-None-Match': etag})
+            self.assertEqual(res.status_code, 304)
+
+    def test_missing_image_redirects_to_iiif(self):
+        """An image that isn't stored sends the browser to the IIIF server at the right size"""
+        with app.test_client() as client:
+            res = client.get('/images/img2/thumb')
+            self.assertEqual(res.status_code, 302)
+            self.assertEqual(res.headers['Location'], ImageStore.iiif_url("img2", 400))
+
+            self.assertEqual(client.get('/images/img2/huge').status_code, 404)
+            self.assertEqual(client.get('/images/..%2Fsecrets/hero').status_code, 404)
+
+    @patch('image_store.AICClient.get')
+    def test_image_src_picks_url_when_rendering(self, mock_get):
+        """Pages link stored images through the app and everything else straight to IIIF"""
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = [b'12']
+        ImageStore.fetch("img1", "https://example.com/1.jpg", ImageStore.SIZES["thumb"])
+
+        with app.test_request_context():
+            self.assertEqual(image_src("img1", "thumb"), "/images/img1/thumb")
+            self.assertEqual(image_src("img2", "hero"), ImageStore.iiif_url("img2", 843))
+            self.assertEqual(image_src(None, "hero", "www.sample.jpg"), "www.sample.jpg")
+
+    def test_import_legacy_images(self):
+        """Images the old code saved as <title>_<image_id>.jpg are moved into the store; other files stay"""
+        app.config["IMAGE_STORE_MAX_BYTES"] = 1024
+        ImageStore.init_app(app)
+        legacy_dir = os.path.join(self.tmp_dir.name, "legacy")
+        os.makedirs(legacy_dir)
+        image_id = "2d9fb8b5-b9a3-3e41-270e-3c480f7b317b"
+        for name in (f"A_Young_Lady_with_a_Parrot_{image_id}.jpg", "Seed_Art_None.jpg", "Sunday.png"):
+            with open(os.path.join(legacy_dir, name), "wb") as image_file:
+                image_file.write(b"jpeg")
+
+        self.assertEqual(ImageStore.import_legacy(legacy_dir), 1)
+        self.assertTrue(ImageStore.has(image_id))
+        with open(ImageStore.path_for(image_id), "rb") as image_file:
+            self.assertEqual(image_file.read(), b"jpeg")
+        self.assertEqual(sorted(os.listdir(legacy_dir)), ["Seed_Art_None.jpg", "Sunday.png"])
+        self.assertEqual(ImageStore.import_legacy(legacy_dir), 0)
@@ -0,0 +1,83 @@
+#tests instrumentation.py
+#tests the per-request db, AIC API and template timings and the /metrics endpoint
+
+import os
+import threading
+from unittest import TestCase
+from models import db, User, Century, Artwork, Artist
+os.environ['APP_ENV'] = "testing"
+from app import app, CURR_USER_KEY
+from instrumentation import Instrumentation
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_instrumentation.py
+
+class InstrumentationTestCase(TestCase):
+    """Tests for the request instrumentation"""
+    def setUp(self):
+        self.client = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+        century = Century(id=1, century_name='19th Century')
+        artist = Artist(id=1, artist_title='Stacy Smith')
+        db.session.add_all([century, artist])
+        db.session.commit()
+        db.session.add_all([User(id=1, username='testuser', password='testpassword', email='test@example.com',
+                                 first_name='Test', last_name='User', century_id=1),
+                            Artwork(id=1, title="Art 1", artist_id=1, image_url="www.sample.jpg", century_id=1)])
+        db.session.commit()
+        Instrumentation.reset()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        Instrumentation.reset()
+
+    def test_server_timing(self):
+        """Responses say how long was spent on the db, the AIC API and the template"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = 1
+            res = c.get('/users/profile')
+            self.assertEqual(res.status_code, 200)
+            timing = res.headers['Server-Timing']
+            for name in ('db;', 'aic;', 'tpl;', 'total;'):
+                self.assertIn(name, timing)
+            self.assertNotIn('desc="0 queries"', timing)
+
+    def test_bound_threads_count_towards_request(self):
+        """Upstream calls made on a bound worker thread are added to the request that started them"""
+        with app.test_request_context('/'):
+            Instrumentation.start_request()
+            record = Instrumentation.bind(lambda: Instrumentation.record_upstream(0, 1024))
+            worker = threading.Thread(target=record)
+            worker.start()
+            worker.join()
+            timings = Instrumentation.current()
+            self.assertEqual((timings.upstream_calls, timings.upstream_bytes), (1, 1024))
+            Instrumentation.end_request(None)
+        self.assertIsNone(Instrumentation.current())
+
+    def test_metrics(self):
+        """/metrics totals requests, queries and upstream calls by endpoint"""
+        self.client.get('/')
+        Instrumentation.record_upstream(0, 10)
+        body = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('aic_http_requests_total{endpoint="main.home_page",method="GET",status="200"} 1', body)
+        self.assertIn('aic_upstream_calls_total{endpoint="background"} 1', body)
+        self.assertIn('aic_http_request_duration_seconds_count{endpoint="main.home_page"} 1', body)
+        self.assertIn('aic_circuit_breaker_state{state="closed"} 1', body)
@@ -0,0 +1,83 @@
+#tests the schema migrations in migrations/
+
+import os
+import tempfile
+from unittest import TestCase
+import sqlalchemy as sa
+from flask import Flask
+from flask_migrate import upgrade, downgrade
+os.environ['APP_ENV'] = "testing"
+from app import init_migrations
+from models import db
+import logging
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_migrations.py
+
+logging.basicConfig(level=logging.ERROR)
+logging.getLogger('alembic').setLevel(logging.ERROR)
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+
+class MigrationsTestCase(TestCase):
+    """Tests for upgrading a database with `flask db upgrade`"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        #a bare app, so the app the other tests share keeps its settings
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(self.tmp.name, "aic.sqlite3")
+        db.init_app(self.app)
+        init_migrations(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.ctx.pop()
+        self.tmp.cleanup()
+
+    def indexes(self, table):
+        return {index["name"] for index in sa.inspect(db.engine).get_indexes(table)}
+
+    def run_sql(self, statement, **params):
+        with db.engine.begin() as conn:
+            result = conn.execute(sa.text(statement), params)
+            return result.all() if result.returns_rows else None
+
+    def test_upgrade_empty_database(self):
+        """An empty database gets every table, index and century"""
+        upgrade(directory=MIGRATIONS)
+        tables = set(sa.inspect(db.engine).get_table_names())
+        self.assertTrue(set(db.metadata.tables) <= tables)
+        self.assertIn("ix_artworks_century_id", self.indexes("artworks"))
+        self.assertIn("uq_favorites_user_id_artwork_id", self.indexes("favorites"))
+        self.assertIn("ix_artists_artist_title", self.indexes("artists"))
+        self.assertEqual(len(self.run_sql("SELECT * FROM centuries")), 3)
+
+        downgrade(directory=MIGRATIONS, revision="base")
+        self.assertEqual(sa.inspect(db.engine).get_table_names(), ["alembic_version"])
+
+    def test_upgrade_database_built_by_create_all(self):
+        """A database create_all already built is taken over as it is"""
+        db.create_all()
+        upgrade(directory=MIGRATIONS)
+        self.assertEqual(self.run_sql("SELECT version_num FROM alembic_version"), [("0003",)])
+
+    def test_upgrade_backfills_and_dedupes(self):
+        """Existing artworks are filed under their century, and duplicate ratings are removed"""
+        upgrade(directory=MIGRATIONS, revision="0001")
+        self.run_sql("INSERT INTO users (id, username, password, email, century_id) VALUES (1, 'u', 'p', 'e', 1)")
+        self.run_sql("INSERT INTO artists (id, artist_title) VALUES (1, 'Artist')")
+        for id, start, end in ((1, 1750, 1760), (2, 1795, 1805), (3, 1500, 1510)):
+            self.run_sql("INSERT INTO artworks (id, title, artist_id, date_start, date_end, image_url) "
+                         "VALUES (:id, 'Art', 1, :start, :end, 'url')", id=id, start=start, end=end)
+        for id in (1, 2, 3):
+            self.run_sql("INSERT INTO favorites (id, user_id, artist_id, artwork_id) VALUES (:id, 1, 1, 1)", id=id)
+
+        upgrade(directory=MIGRATIONS)
+        self.assertEqual(self.run_sql("SELECT id, century_id FROM artworks ORDER BY id"),
+                         [(1, 1), (2, 1), (3, None)])
+        self.assertEqual(self.run_sql("SELECT id FROM favorites"), [(1,)])
@@ -4,6 +4,7 @@
 import os
 from unittest import TestCase
 from models import db, Artwork, Artist, Favorite, NotFavorite, User, Artist, Artwork, Favorite, NotFavorite, Century
+os.environ['APP_ENV'] = "testing"
 from app import app, CURR_USER_KEY
 import logging
 
@@ -21,7 +22,6 @@ logging.basicConfig(level=logging.ERROR)  # Set to WARNING to reduce output, or
 # Adjust logging level for SQLAlchemy specifically if needed
 logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
 app.config['WTF_CSRF_ENABLED'] = False
-os.environ['DATABASE_URL'] = "postgresql:///test_aic_capstone"
 
 
 class ModelsRelationshipTestCase(TestCase):
@@ -108,4 +108,4 @@ class ModelsRelationshipTestCase(TestCase):
         self.assertEqual(century.century_name, "19th Century")
 
 
-        
\ No newline at end of file
+        
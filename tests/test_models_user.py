@@ -20,7 +20,7 @@ logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
 
 #set up the environmenta database
 
-os.environ['DATABASE_URL'] = "postgresql:///test_aic_capstone"
+os.environ['APP_ENV'] = "testing"
 
 #import the app
 from app import app, CURR_USER_KEY
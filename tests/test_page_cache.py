@@ -0,0 +1,81 @@
+#tests page_cache.py
+#tests the TTL + LRU cache for AIC search pages
+
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from page_cache import PageCache
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_page_cache.py
+
+class TestPageCache(TestCase):
+    """Tests the PageCache class"""
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.defaults = (PageCache.TTL, PageCache.MAX_ENTRIES, PageCache.PATH)
+        PageCache.TTL = 60
+        PageCache.MAX_ENTRIES = 2
+        PageCache.PATH = None
+        PageCache.clear()
+
+    def tearDown(self):
+        PageCache.TTL, PageCache.MAX_ENTRIES, PageCache.PATH = self.defaults
+        PageCache.clear()
+        self.tmp_dir.cleanup()
+
+    def test_key_is_normalized(self):
+        """Dict ordering doesn't change the key"""
+        self.assertEqual(PageCache.key({'page': 1, 'limit': 100}), PageCache.key({'limit': 100, 'page': 1}))
+
+    def test_get_and_set(self):
+        """Stored pages are returned until they expire"""
+        PageCache.set({'page': 1}, [{'id': 1}])
+        self.assertEqual(PageCache.get({'page': 1}), [{'id': 1}])
+        self.assertIsNone(PageCache.get({'page': 2}))
+
+        with patch('page_cache.time.time', return_value=10**12):
+            self.assertIsNone(PageCache.get({'page': 1}))
+
+    def test_stale_pages(self):
+        """Expired pages are only returned with stale_ok, and only until STALE_TTL"""
+        PageCache.set({'page': 1}, [{'id': 1}])
+        stored_at = PageCache._entries[PageCache.key({'page': 1})][0]
+        with patch('page_cache.time.time', return_value=stored_at + 120):
+            self.assertIsNone(PageCache.get({'page': 1}))
+            self.assertEqual(PageCache.get({'page': 1}, stale_ok=True), [{'id': 1}])
+        with patch('page_cache.time.time', return_value=stored_at + PageCache.STALE_TTL + 1):
+            self.assertIsNone(PageCache.get({'page': 1}, stale_ok=True))
+
+    def test_lru_eviction(self):
+        """The least recently used page is evicted once the cache is full"""
+        PageCache.set({'page': 1}, [1])
+        PageCache.set({'page': 2}, [2])
+        PageCache.get({'page': 1})
+        PageCache.set({'page': 3}, [3])
+
+        self.assertEqual(PageCache.get({'page': 1}), [1])
+        self.assertIsNone(PageCache.get({'page': 2}))
+        self.assertEqual(PageCache.get({'page': 3}), [3])
+
+    def test_sqlite_backend_shared(self):
+        """With a SQLite path, a page stored by one worker is found by another"""
+        app_config = {"PAGE_CACHE_TTL": 60, "PAGE_CACHE_SIZE": 2,
+                      "PAGE_CACHE_PATH": os.path.join(self.tmp_dir.name, "cache.sqlite3")}
+
+        class FakeApp:
+            config = app_config
+
+        PageCache.init_app(FakeApp)
+        PageCache.set({'page': 1}, [{'id': 1}])
+        #simulate another worker: nothing in memory, only the shared file
+        PageCache.clear()
+        self.assertEqual(PageCache.get({'page': 1}), [{'id': 1}])
+
+    def test_disabled_with_zero_ttl(self):
+        """A TTL of 0 turns caching off"""
+        PageCache.TTL = 0
+        PageCache.set({'page': 1}, [1])
+        self.assertIsNone(PageCache.get({'page': 1}))
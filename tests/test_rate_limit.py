@@ -0,0 +1,148 @@
+#tests rate_limit.py
+#tests the shared token bucket and the circuit breaker that guard calls to the AIC API
+
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+import requests
+from rate_limit import RateLimiter, CircuitBreaker
+from api_requests import APIRequests
+from page_cache import PageCache
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_rate_limit.py
+
+class TestRateLimiter(TestCase):
+    """Tests the RateLimiter class"""
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.defaults = (RateLimiter.RATE, RateLimiter.BURST, RateLimiter.MAX_WAIT, RateLimiter.PATH)
+        RateLimiter.RATE = 1.0
+        RateLimiter.BURST = 3
+        RateLimiter.PATH = None
+        RateLimiter.reset()
+
+    def tearDown(self):
+        RateLimiter.RATE, RateLimiter.BURST, RateLimiter.MAX_WAIT, RateLimiter.PATH = self.defaults
+        RateLimiter.reset()
+        self.tmp_dir.cleanup()
+
+    def test_burst_then_wait(self):
+        """A full bucket allows BURST calls, then says how long until the next token"""
+        with patch('rate_limit.time.time', return_value=1000.0):
+            self.assertEqual([RateLimiter.try_acquire() for i in range(3)], [0, 0, 0])
+            self.assertAlmostEqual(RateLimiter.try_acquire(), 1.0)
+        with patch('rate_limit.time.time', return_value=1001.0):
+            self.assertEqual(RateLimiter.try_acquire(), 0)
+
+    def test_acquire_gives_up_after_max_wait(self):
+        """acquire doesn't wait longer than MAX_WAIT for a token"""
+        RateLimiter.RATE = 0.01
+        RateLimiter.MAX_WAIT = 1
+        for i in range(3):
+            self.assertTrue(RateLimiter.acquire())
+        with patch('rate_limit.time.sleep') as sleep:
+            self.assertFalse(RateLimiter.acquire())
+        sleep.assert_not_called()
+
+    def test_shared_bucket(self):
+        """With a state file, every limiter draws from the same bucket"""
+        app = MagicMock(instance_path=self.tmp_dir.name)
+        app.config = {"AIC_RATE_PER_MINUTE": 60, "AIC_RATE_BURST": 2,
+                      "AIC_RATE_STATE_PATH": os.path.join(self.tmp_dir.name, "rate.sqlite3")}
+        RateLimiter.init_app(app)
+        with patch('rate_limit.time.time', return_value=1000.0):
+            self.assertEqual(RateLimiter.try_acquire(), 0)
+            #another worker: no in-process state, only the file
+            RateLimiter._tokens = None
+            self.assertEqual(RateLimiter.try_acquire(), 0)
+            self.assertGreater(RateLimiter.try_acquire(), 0)
+            #a worker starting up doesn't refill the bucket the others have drawn down
+            RateLimiter.init_app(app)
+            self.assertGreater(RateLimiter.try_acquire(), 0)
+
+
+class TestCircuitBreaker(TestCase):
+    """Tests the CircuitBreaker class and how APIRequests uses it"""
+    def setUp(self):
+        self.defaults = (CircuitBreaker.FAILURE_THRESHOLD, CircuitBreaker.RESET_TIMEOUT)
+        CircuitBreaker.FAILURE_THRESHOLD = 2
+        CircuitBreaker.RESET_TIMEOUT = 30
+        CircuitBreaker.reset()
+        PageCache.clear()
+
+    def tearDown(self):
+        CircuitBreaker.FAILURE_THRESHOLD, CircuitBreaker.RESET_TIMEOUT = self.defaults
+        CircuitBreaker.reset()
+        PageCache.clear()
+
+    def test_opens_after_failures(self):
+        """The circuit opens after FAILURE_THRESHOLD failures in a row"""
+        CircuitBreaker.record_failure()
+        self.assertTrue(CircuitBreaker.allow())
+        CircuitBreaker.record_failure()
+        self.assertEqual(CircuitBreaker.state(), "open")
+        self.assertFalse(CircuitBreaker.allow())
+
+    def test_half_open_trial(self):
+        """After RESET_TIMEOUT one trial call goes through; success closes the circuit, failure reopens it"""
+        CircuitBreaker.record_failure()
+        CircuitBreaker.record_failure()
+        opened_at = CircuitBreaker._opened_at
+        with patch('rate_limit.time.monotonic', return_value=opened_at + 31):
+            self.assertEqual(CircuitBreaker.state(), "half-open")
+            self.assertTrue(CircuitBreaker.allow())
+            self.assertFalse(CircuitBreaker.allow())
+            CircuitBreaker.record_failure()
+            self.assertFalse(CircuitBreaker.allow())
+        with patch('rate_limit.time.monotonic', return_value=opened_at + 62):
+            self.assertTrue(CircuitBreaker.allow())
+            CircuitBreaker.record_success()
+        self.assertEqual(CircuitBreaker.state(), "closed")
+
+    @patch('api_requests.RateLimiter.acquire', return_value=False)
+    @patch('api_requests.AICClient.post')
+    def test_trial_given_back_when_not_made(self, mock_post, mock_acquire):
+        """A half-open trial that never reaches the API (rate limited, or an unexpected error) frees the slot"""
+        CircuitBreaker.record_failure()
+        CircuitBreaker.record_failure()
+        opened_at = CircuitBreaker._opened_at
+        with patch('rate_limit.time.monotonic', return_value=opened_at + 31):
+            self.assertEqual(APIRequests.request_page({'page': 1})[1], "Rate limited")
+            mock_acquire.return_value = True
+            mock_post.side_effect = KeyError("unexpected")
+            with self.assertRaises(KeyError):
+                APIRequests.request_page({'page': 1})
+            self.assertTrue(CircuitBreaker.allow())
+        mock_post.assert_called_once()
+
+    @patch('api_requests.AICClient.post')
+    def test_open_circuit_serves_stale_page(self, mock_post):
+        """While the circuit is open, request_page serves an expired cached page without calling the API"""
+        query = {'page': 1, 'limit': 10}
+        PageCache.set(query, [{'id': 1}])
+        stored_at = PageCache._entries[PageCache.key(query)][0]
+        CircuitBreaker.record_failure()
+        CircuitBreaker.record_failure()
+        with patch('page_cache.time.time', return_value=stored_at + PageCache.TTL + 1):
+            data, error, message = APIRequests.request_page(query)
+            self.assertEqual(data, [{'id': 1}])
+            self.assertIsNone(error)
+
+            data, error, message = APIRequests.request_page({'page': 2, 'limit': 10})
+            self.assertIsNone(data)
+            self.assertEqual(error, "AIC API unavailable")
+        mock_post.assert_not_called()
+
+    @patch('api_requests.AICClient.post')
+    def test_failures_open_circuit(self, mock_post):
+        """Connection errors and 5xx responses from the API count as failures"""
+        mock_post.side_effect = requests.ConnectionError("down")
+        APIRequests.request_page({'page': 1})
+        mock_post.side_effect = None
+        mock_post.return_value = MagicMock(status_code=503)
+        APIRequests.request_page({'page': 2})
+        self.assertEqual(CircuitBreaker.state(), "open")
+        self.assertEqual(mock_post.call_count, 2)
@@ -0,0 +1,95 @@
+#tests recommendations.py
+#tests the prefetched per-user queue behind the profile page
+
+import os
+from unittest import TestCase
+from models import db, User, Century, Artwork, Artist, QueuedArtwork
+from recommendations import Recommendations
+from favoriting_Art import ArtworkFavorites
+os.environ['APP_ENV'] = "testing"
+from app import app
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_recommendations.py
+
+class TestRecommendations(TestCase):
+    """Tests the Recommendations class"""
+    def setUp(self):
+        """Create test client add sample data"""
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+        century = Century(id=1, century_name='19th Century')
+        db.session.add(century)
+        db.session.commit()
+
+        self.user = User(id=1, username='testuser', password='testpassword', email='test@example.com',
+                         first_name='Test', last_name='User', century_id=century.id)
+        artist = Artist(id=1, artist_title='Stacy Smith')
+        db.session.add_all([self.user, artist])
+        db.session.commit()
+
+        db.session.add_all([Artwork(id=i, title=f"Art {i}", artist_id=artist.id, image_url="www.sample.jpg",
+                                    century_id=century.id) for i in range(1, 9)])
+        db.session.commit()
+
+        self.settings = (Recommendations.LOW_WATER, Recommendations.BATCH)
+        Recommendations.LOW_WATER, Recommendations.BATCH = 2, 4
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        Recommendations.LOW_WATER, Recommendations.BATCH = self.settings
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def queued_ids(self):
+        return [q.artwork_id for q in QueuedArtwork.query.filter_by(user_id=1).order_by(QueuedArtwork.id)]
+
+    def test_first_view_fills_queue(self):
+        """An empty queue is filled with a batch and the head is popped"""
+        artwork = Recommendations.next_artwork(self.user)
+        self.assertIsNotNone(artwork)
+        self.assertEqual(len(self.queued_ids()), 3)
+        self.assertNotIn(artwork.id, self.queued_ids())
+
+    def test_low_queue_refilled_in_background(self):
+        """Dropping to the low-water mark tops the queue up without repeating queued artworks"""
+        Recommendations.refill(1, 1)
+        for i in range(3):
+            Recommendations.next_artwork(self.user)
+        #every refill is finished once the worker has run a no-op after it
+        Recommendations._executor.submit(lambda: None).result(timeout=5)
+
+        #one left after three views, plus a fresh batch of four
+        queued = self.queued_ids()
+        self.assertEqual(len(queued), 5)
+        self.assertEqual(len(set(queued)), 5)
+
+    def test_rated_artwork_leaves_queue(self):
+        """Favoriting or disliking an artwork takes it out of the queue"""
+        Recommendations.refill(1, 1)
+        first, second = self.queued_ids()[:2]
+        ArtworkFavorites.fav_artwork(self.user, first)
+        ArtworkFavorites.dislike_artwork(self.user, second)
+        self.assertNotIn(first, self.queued_ids())
+        self.assertNotIn(second, self.queued_ids())
+
+    def test_exhausted_catalog(self):
+        """Once every artwork is rated there's nothing left to show"""
+        for artwork_id in range(1, 9):
+            ArtworkFavorites.dislike_artwork(self.user, artwork_id)
+        self.assertIsNone(Recommendations.next_artwork(self.user))
@@ -0,0 +1,76 @@
+#tests single_flight.py
+#tests coalescing concurrent identical upstream fetches
+
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+from single_flight import SingleFlight
+from api_requests import APIRequests
+from page_cache import PageCache
+
+# run these tests like:
+#
+#    python3 -m unittest tests/test_single_flight.py
+
+class TestSingleFlight(TestCase):
+    """Tests the SingleFlight class"""
+    def setUp(self):
+        PageCache.clear()
+
+    def tearDown(self):
+        SingleFlight.LOCK_DIR = None
+        PageCache.clear()
+
+    def run_together(self, fn, callers=5):
+        """Call fn from several threads at once"""
+        start = threading.Barrier(callers)
+        def call():
+            start.wait()
+            return fn()
+        with ThreadPoolExecutor(max_workers=callers) as pool:
+            futures = [pool.submit(call) for i in range(callers)]
+            return [future.result(timeout=5) for future in futures]
+
+    def test_concurrent_calls_shared(self):
+        """Callers that arrive while a call is in flight get its result"""
+        calls = []
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return "page"
+        results = self.run_together(lambda: SingleFlight.do("key", slow))
+        self.assertEqual(results, ["page"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_shared(self):
+        """A failed call fails every caller waiting on it, and the next call starts fresh"""
+        def broken():
+            time.sleep(0.2)
+            raise RuntimeError("upstream down")
+        with self.assertRaises(RuntimeError):
+            self.run_together(lambda: SingleFlight.do("key", broken))
+        self.assertEqual(SingleFlight.do("key", lambda: "ok"), "ok")
+
+    def test_worker_lock(self):
+        """With a lock directory, the call runs while holding the key's lock file"""
+        with tempfile.TemporaryDirectory() as lock_dir:
+            SingleFlight.LOCK_DIR = lock_dir
+            self.assertEqual(SingleFlight.do("key", lambda: 42), 42)
+
+    @patch('api_requests.AICClient.post')
+    def test_identical_pages_fetched_once(self, mock_post):
+        """Concurrent requests for the same search page make one API call"""
+        def slow_post(*args, **kwargs):
+            time.sleep(0.2)
+            response = MagicMock(status_code=200)
+            response.json.return_value = {'data': [{'id': 1}]}
+            return response
+        mock_post.side_effect = slow_post
+
+        query = APIRequests.build_century_query('19th Century')
+        results = self.run_together(lambda: APIRequests.request_page(query))
+        self.assertEqual(results, [([{'id': 1}], None, None)] * 5)
+        self.assertEqual(mock_post.call_count, 1)
@@ -17,7 +17,7 @@ logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
 
 #set up the environmenta database
 
-os.environ['DATABASE_URL'] = "postgresql:///test_aic_capstone"
+os.environ['APP_ENV'] = "testing"
 
 #import the app
 from app import app, CURR_USER_KEY
@@ -68,7 +68,7 @@ class SurpriseViewTestCase(TestCase):
             self.assertEqual(res.status_code, 200)
             self.assertIn("Access unauthorized.", html)
 
-    @patch('app.APIRequests.surprise_me')
+    @patch('app.ArtworkCatalog.surprise_me')
     def test_suprise_me(self, mock_surprise_me):
         """Test accessing Surprise Me route with a logged-in user."""
         # Setup mock
@@ -83,7 +83,7 @@ class SurpriseViewTestCase(TestCase):
             self.assertEqual(res.status_code, 200)
             self.assertIn("Mona Lisa", html)
 
-    @patch('app.APIRequests.surprise_me')
+    @patch('app.ArtworkCatalog.surprise_me')
     def test_surprise_me_favorite(self, mock_surprise_me):
         """Test POST action for favoriting an artwork via the Surprise me route"""
         #setup mock
@@ -103,19 +103,19 @@ class SurpriseViewTestCase(TestCase):
                 db.session.add(new_artwork)
                 db.session.commit()
             # Sending POST request to the route
-                res = c.post('/users/surprise', data={'action': 'favorite', 'artwork_id': 1}, follow_redirects=True)
-                html = res.get_data(as_text=True)
+            res = c.post('/users/surprise', data={'action': 'favorite', 'artwork_id': 1}, follow_redirects=True)
+            html = res.get_data(as_text=True)
 
-                self.assertEqual(res.status_code, 200)
-                
-                # Fetch the favorite from the database
-                f = Favorite.query.filter_by(artwork_id = 1)
-                
-                #check db to see if favorite is added
-                self.assertIsNotNone(f)
-                self.assertIn("Mona Lisa", html)
+            self.assertEqual(res.status_code, 200)
+            
+            # Fetch the favorite from the database
+            f = Favorite.query.filter_by(artwork_id = 1)
+            
+            #check db to see if favorite is added
+            self.assertIsNotNone(f)
+            self.assertIn("Mona Lisa", html)
                 
-    @patch('app.APIRequests.surprise_me')
+    @patch('app.ArtworkCatalog.surprise_me')
     def test_surprise_me_not_favorite(self, mock_surprise_me):
         """Test POST action for un-favoriting/disliking an artwork via the suprise me route"""
         #setup mock
@@ -134,10 +134,11 @@ class SurpriseViewTestCase(TestCase):
                 db.session.add(new_dislike)
                 db.session.commit()
 
-                #send POST request including new action
-                res = c.post('/users/surprise', data={'action': 'not_favorite', 'artwork_id': 2}, follow_redirects=True)
-                
-                self.assertEqual(res.status_code, 200)
+            #send POST request including new action
+            res = c.post('/users/surprise', data={'action': 'not_favorite', 'artwork_id': 2}, follow_redirects=True)
+
+            self.assertEqual(res.status_code, 200)
 
-                nf = NotFavorite.query.filter_by(artwork_id=2)
-                self.assertIsNotNone(nf)
\ No newline at end of file
+            #the button records a dislike, as it does with JS on
+            nf = NotFavorite.query.filter_by(user_id=self.u1.id, artwork_id=2).first()
+            self.assertIsNotNone(nf)
\ No newline at end of file
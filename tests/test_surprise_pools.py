@@ -0,0 +1,79 @@
+#tests surprise_pools.py
+#tests the shared per-century candidate pools behind the surprise page
+
+import os
+from unittest import TestCase
+from models import db, User, Century, Favorite, Artwork, Artist
+from surprise_pools import SurprisePools
+os.environ['APP_ENV'] = "testing"
+from app import app
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_surprise_pools.py
+
+class TestSurprisePools(TestCase):
+    """Tests the SurprisePools class"""
+    def setUp(self):
+        """Create test client add sample data"""
+        self.app_context = app.app_context()
+        self.app_context.push()
+        SurprisePools.reset()
+        db.drop_all()
+        db.create_all()
+
+        c_18 = Century(id=1, century_name='18th Century')
+        c_19 = Century(id=2, century_name='19th Century')
+        db.session.add_all([c_18, c_19])
+        db.session.commit()
+
+        user = User(id=1, username='testuser', password='testpassword', email='test@example.com',
+                    first_name='Test', last_name='User', century_id=c_19.id)
+        artist = Artist(id=1, artist_title='Stacy Smith')
+        db.session.add_all([user, artist])
+        db.session.commit()
+
+        db.session.add_all([Artwork(id=i, title=f"Art {i}", artist_id=artist.id, image_url="www.sample.jpg",
+                                    century_id=c_18.id) for i in range(1, 4)])
+        db.session.add(Favorite(user_id=1, artist_id=1, artwork_id=1))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        SurprisePools.reset()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_pool_shared_until_stale(self):
+        """The pool is built once and then served from memory"""
+        self.assertEqual(sorted(SurprisePools.pool(1)), [1, 2, 3])
+        SurprisePools.pool(1)
+
+        metrics = SurprisePools.metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"]), (1, 1))
+        self.assertEqual(metrics["pool_sizes"], {1: 3})
+
+        SurprisePools.invalidate(1)
+        SurprisePools.pool(1)
+        self.assertEqual(SurprisePools.metrics()["misses"], 2)
+
+    def test_sample_applies_exclusions(self):
+        """Artworks the user has rated are never sampled"""
+        artworks = SurprisePools.sample(1, 1, limit=10)
+        self.assertEqual(sorted(a.id for a in artworks), [2, 3])
+
+    def test_exhausted_pool_counted(self):
+        """A pool with nothing left for the user comes back empty and is counted"""
+        self.assertEqual(SurprisePools.sample(2, 1), [])
+        self.assertEqual(SurprisePools.metrics()["exhausted"], 1)
@@ -0,0 +1,84 @@
+#tests user_loader.py
+#tests the lazily loaded g.user and the optional user cache
+
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from models import db, User, Century
+from user_loader import UserCache
+os.environ['APP_ENV'] = "testing"
+from app import app, CURR_USER_KEY
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to reduce output, or ERROR to make it even less verbose
+
+# Adjust logging level for SQLAlchemy specifically if needed
+logging.getLogger('sqlalchemy.engine').setLevel(logging.CRITICAL)
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+# run these tests like:
+#
+#    FLASK_ENV=production python3 -m unittest tests/test_user_loader.py
+
+class TestUserLoader(TestCase):
+    """Tests loading g.user"""
+    def setUp(self):
+        """Create test client add sample data"""
+        self.client = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+        century = Century(id=1, century_name='19th Century')
+        db.session.add(century)
+        db.session.commit()
+        db.session.add(User(id=1, username='testuser', password='testpassword', email='test@example.com',
+                            first_name='Test', last_name='User', century_id=century.id))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        UserCache.TTL = 0
+        UserCache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    @patch('user_loader.UserCache.load')
+    def test_user_not_loaded_unless_read(self, mock_load):
+        """Static files and image redirects never look up the user"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = 1
+            c.get('/static/images/Sunday.png').close()
+            c.get('/images/abc/thumb')
+        mock_load.assert_not_called()
+
+    def test_user_loaded_per_request(self):
+        """Each request sees the user currently in its session"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = 1
+            res = c.get('/users/surprise')
+            self.assertNotIn('Access unauthorized', res.get_data(as_text=True))
+
+            c.get('/logout')
+            res = c.get('/users/surprise', follow_redirects=True)
+            self.assertIn('Access unauthorized', res.get_data(as_text=True))
+
+    def test_cached_user_skips_db(self):
+        """Within USER_CACHE_TTL the cached row is reused, until it's invalidated"""
+        UserCache.TTL = 60
+        self.assertEqual(UserCache.load(1).username, 'testuser')
+        db.session.execute(db.update(User).where(User.id == 1).values(username='renamed'))
+        db.session.commit()
+        db.session.remove()
+
+        self.assertEqual(UserCache.load(1).username, 'testuser')
+        db.session.remove()
+        UserCache.invalidate(1)
+        self.assertEqual(UserCache.load(1).username, 'renamed')
@@ -0,0 +1,68 @@
+#Lazily loaded current user for g.user.
+#The user is only looked up the first time a view or template reads g.user, so requests that
+#never touch it (static files, image redirects) don't query the db at all. With USER_CACHE_TTL
+#set, user rows are also kept in memory for that many seconds, keyed by the user id in the session.
+
+import threading
+import time
+from flask import session, has_request_context
+from flask.ctx import _AppCtxGlobals
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, User
+
+CURR_USER_KEY = "curr_user"
+
+
+class RequestGlobals(_AppCtxGlobals):
+    """g, with `user` loaded from the session on first access"""
+    def __getattr__(self, name):
+        if name == "user":
+            user_id = session.get(CURR_USER_KEY) if has_request_context() else None
+            self.user = UserCache.load(user_id) if user_id is not None else None
+            return self.__dict__["user"]
+        return super().__getattr__(name)
+
+
+class UserCache:
+    #seconds a user row is reused across requests; 0 loads it fresh on every request
+    TTL = 0
+
+    _users = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        """Make g load the user lazily"""
+        cls.TTL = app.config.get("USER_CACHE_TTL", cls.TTL)
+        app.app_ctx_globals_class = RequestGlobals
+        cls.clear()
+
+    @classmethod
+    def load(cls, user_id):
+        """The user with `user_id`, attached to the current db session"""
+        if cls.TTL > 0:
+            with cls._lock:
+                entry = cls._users.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                #rebuild the row from the cached columns without going back to the db
+                user = User(**entry[1])
+                make_transient_to_detached(user)
+                return db.session.merge(user, load=False)
+
+        user = db.session.get(User, user_id)
+        if user and cls.TTL > 0:
+            columns = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+            with cls._lock:
+                cls._users[user_id] = (time.monotonic() + cls.TTL, columns)
+        return user
+
+    @classmethod
+    def invalidate(cls, user_id):
+        """Forget a cached user, e.g. after their profile changed"""
+        with cls._lock:
+            cls._users.pop(user_id, None)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._users = {}